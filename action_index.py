@@ -0,0 +1,163 @@
+from functools import lru_cache
+import numpy as np
+
+from globals import *
+from actions import *
+
+#pairs of resources (by index into RESOURCE_TYPES_LIST)
+#invention takes any 2 resources, a bank trade gives one resource for another
+INVENTION_PAIRS = [(i, j) for i in range(5) for j in range(i, 5)]
+TRADE_PAIRS = [(i, j) for i in range(5) for j in range(5) if i != j]
+
+#playable dev cards, victory points are last in DEV_TYPES_LIST and cant be played
+PLAYABLE_DEV_TYPES = DEV_TYPES_LIST[:4]
+
+'''
+fixed integer index over every fully specified action, for a given number of players
+blocks in order:
+    end_turn, roll, buy_dev: 1 each
+    settlement: 54 nodes
+    city: 54 nodes
+    road: 72 edges
+    move_robber: 19 tiles
+    steal: 1 per player (by player index)
+    play_dev: knight, monopoly, road_build, invention
+    monopoly: 5 resources
+    invention: 15 resource pairs (INVENTION_PAIRS)
+    bank_trade: 20 ordered resource pairs (TRADE_PAIRS), trading in the player's rate of the first for 1 of the second
+    discard: 5 resources, 1 card at a time
+'''
+class ActionIndex:
+    BLOCKS = [
+        (ActionType.end_turn, 1),
+        (ActionType.roll, 1),
+        (ActionType.buy_dev, 1),
+        (ActionType.settlement, 54),
+        (ActionType.city, 54),
+        (ActionType.road, 72),
+        (ActionType.move_robber, 19),
+        (ActionType.steal, None),
+        (ActionType.play_dev, len(PLAYABLE_DEV_TYPES)),
+        (ActionType.monopoly, 5),
+        (ActionType.invention, len(INVENTION_PAIRS)),
+        (ActionType.bank_trade, len(TRADE_PAIRS)),
+        (ActionType.discard, 5),
+    ]
+
+    def __init__(self, num_players: int):
+        self.num_players = num_players
+
+        self.offsets: dict[ActionType, int] = dict()
+        self.sizes: dict[ActionType, int] = dict()
+        types = []
+        args = []
+        for action_type, size in ActionIndex.BLOCKS:
+            size = num_players if size is None else size
+            self.offsets[action_type] = len(types)
+            self.sizes[action_type] = size
+            types += [action_type] * size
+            args += list(range(size))
+
+        self.size = len(types)
+        #decode tables, types[i] and args[i] describe action i
+        self.types: list[ActionType] = types
+        self.args: list[int] = args
+        self.type_ids = np.array([ACTION_TYPES.index(t) for t in types], dtype=np.int8)
+        self.arg_ids = np.array(args, dtype=np.int8)
+
+        self.invention_ids = {pair: i for i, pair in enumerate(INVENTION_PAIRS)}
+        self.trade_ids = {pair: i for i, pair in enumerate(TRADE_PAIRS)}
+
+        #resources taken from the bank by each invention
+        self.invention_counts = np.zeros((len(INVENTION_PAIRS), 5), dtype=np.int32)
+        for k, (i, j) in enumerate(INVENTION_PAIRS):
+            self.invention_counts[k][i] += 1
+            self.invention_counts[k][j] += 1
+        #resource given and resource taken by each bank trade
+        self.trade_give = np.array([i for i, _ in TRADE_PAIRS])
+        self.trade_take = np.array([j for _, j in TRADE_PAIRS])
+
+    #slice of the index taken by an action type
+    def block(self, action_type: ActionType) -> slice:
+        offset = self.offsets[action_type]
+        return slice(offset, offset + self.sizes[action_type])
+
+    def decode(self, idx: int, game) -> Action:
+        action_type = self.types[idx]
+        arg = self.args[idx]
+        action_class = ACTION_TYPES_DICT[action_type]
+        match action_type:
+            case ActionType.settlement | ActionType.city | ActionType.road | ActionType.move_robber:
+                return action_class(arg)
+            case ActionType.steal:
+                return action_class(game.players[arg])
+            case ActionType.play_dev:
+                return action_class(PLAYABLE_DEV_TYPES[arg])
+            case ActionType.monopoly:
+                return action_class(RESOURCE_TYPES_LIST[arg])
+            case ActionType.invention:
+                resources = dict.fromkeys(RESOURCE_TYPES_LIST, 0)
+                for i in INVENTION_PAIRS[arg]:
+                    resources[RESOURCE_TYPES_LIST[i]] += 1
+                return action_class(resources)
+            case ActionType.bank_trade:
+                give, take = TRADE_PAIRS[arg]
+                trade_in = dict.fromkeys(RESOURCE_TYPES_LIST, 0)
+                trade_for = dict.fromkeys(RESOURCE_TYPES_LIST, 0)
+                trade_in[RESOURCE_TYPES_LIST[give]] = int(game.cur_player.bank_trade_rates[give])
+                trade_for[RESOURCE_TYPES_LIST[take]] = 1
+                return action_class(trade_in, trade_for)
+            case ActionType.discard:
+                resources = dict.fromkeys(RESOURCE_TYPES_LIST, 0)
+                resources[RESOURCE_TYPES_LIST[arg]] = 1
+                return action_class(resources)
+            case _:
+                return action_class()
+
+    #index of an action, or -1 if the action has no index (e.g. a multi card trade or discard)
+    #game is the one the action is for, a bank trade only has an index at the current player's rate
+    def encode(self, action: Action, game) -> int:
+        offset = self.offsets.get(action.type)
+        if offset is None:
+            return -1
+        match action.type:
+            case ActionType.settlement | ActionType.city:
+                return offset + int(action.node_idx)
+            case ActionType.road:
+                return offset + int(action.edge_idx)
+            case ActionType.move_robber:
+                return offset + int(action.tile_idx)
+            case ActionType.steal:
+                return offset + action.player.index
+            case ActionType.play_dev:
+                if action.dev_type not in PLAYABLE_DEV_TYPES:
+                    return -1
+                return offset + PLAYABLE_DEV_TYPES.index(action.dev_type)
+            case ActionType.monopoly:
+                return offset + RESOURCE_TYPES_LIST.index(action.resource)
+            case ActionType.invention:
+                pair = []
+                for i, resource in enumerate(RESOURCE_TYPES_LIST):
+                    pair += [i] * int(action.resources.get(resource, 0))
+                return offset + self.invention_ids[tuple(pair)] if tuple(pair) in self.invention_ids else -1
+            case ActionType.bank_trade:
+                give = [i for i, r in enumerate(RESOURCE_TYPES_LIST) if action.trade_in.get(r, 0) > 0]
+                take = [i for i, r in enumerate(RESOURCE_TYPES_LIST) if action.trade_for.get(r, 0) > 0]
+                if len(give) != 1 or len(take) != 1 or (give[0], take[0]) not in self.trade_ids:
+                    return -1
+                if action.trade_in[RESOURCE_TYPES_LIST[give[0]]] != game.cur_player.bank_trade_rates[give[0]]:
+                    return -1
+                if action.trade_for[RESOURCE_TYPES_LIST[take[0]]] != 1:
+                    return -1
+                return offset + self.trade_ids[(give[0], take[0])]
+            case ActionType.discard:
+                counts = [int(action.resources.get(r, 0)) for r in RESOURCE_TYPES_LIST]
+                if sum(counts) != 1:
+                    return -1
+                return offset + counts.index(1)
+            case _:
+                return offset
+
+@lru_cache(maxsize=None)
+def get_action_index(num_players: int) -> ActionIndex:
+    return ActionIndex(num_players)
@@ -0,0 +1,125 @@
+import numpy as np
+
+from globals import *
+from actions import ActionType, ACTION_TYPES
+
+TRADE_AMOUNTS = np.arange(20)
+
+#preallocated buffers behind Game.get_action_mask()
+#only two sub-masks are kept up to date by the transitions, the robber and steal masks
+#    move_robber() and steal() write them through the journal, so undo restores them
+#the road, settlement and city masks are not buffers of their own, they are the player's availability arrays
+#the action type, dev card and trade masks are not incremental, they are recomputed from the hand, the queue and the turn
+#    (in place, no allocation) the first time the mask is read after any step or undo, later reads of the same state are free
+class ActionMask:
+    BUFFERS = ('action_type', 'move_robber', 'dev_card', 'steal', 'monopoly', 'trade_for', 'trade_in')
+
+    def __init__(self, num_players: int, robber: int):
+        self.action_type = np.zeros(len(ACTION_TYPES), dtype=np.int8)
+        self.move_robber = np.ones(19, dtype=np.int8)
+        self.move_robber[robber] = False
+        self.dev_card = np.zeros(4, dtype=np.int8)
+        self.steal = np.zeros(num_players, dtype=np.int8)
+        self.monopoly = np.ones(5, dtype=np.int8)
+        self.trade_for = np.ones((5, 20), dtype=np.int8)
+        self.trade_in = np.zeros((5, 20), dtype=np.int8)
+
+        #the recomputed masks are stale, set by every step and undo, kept out of the undo journal on purpose
+        self.dirty = True
+        self.views = None
+
+    #get() hands out read-only views, so a caller writing into a mask can never change the game
+    #they are made on the first get(), clones that are never asked for a mask dont pay for them
+    def make_views(self):
+        self.views = {name: readonly(getattr(self, name)) for name in ActionMask.BUFFERS}
+        self.trade_views = list(readonly(self.trade_for)) + list(readonly(self.trade_in))
+
+    def copy(self):
+        mask = ActionMask.__new__(ActionMask)
+        for name in ActionMask.BUFFERS:
+            setattr(mask, name, getattr(self, name).copy())
+        mask.dirty = self.dirty
+        mask.views = None
+        return mask
+
+    #only the incrementally written buffers are game state, the refilled ones are a cache
+    def __getstate__(self):
+        return {'move_robber': self.move_robber.copy(), 'steal': self.steal.copy()}
+
+    def __setstate__(self, state):
+        self.__init__(len(state['steal']), 0)
+        self.move_robber[:] = state['move_robber']
+        self.steal[:] = state['steal']
+
+    def refill(self, game):
+        cur_player = game.get_cur_player()
+        queued = game.action_queue[0] if len(game.action_queue) > 0 else None
+
+        action_type_mask = self.action_type
+        action_type_mask[:] = False
+        if queued is None:
+            action_type_mask[0] = game.can_end_turn()
+            action_type_mask[1] = game.can_place_settlement(starting=game.starting)
+            action_type_mask[2] = game.can_place_city()
+            action_type_mask[3] = game.can_place_road(starting=game.starting)
+            action_type_mask[4] = game.can_play_dev()
+            action_type_mask[5] = game.can_buy_dev()
+            action_type_mask[6] = game.can_roll()
+            action_type_mask[7] = game.can_bank_trade()
+            action_type_mask[8] = game.can_player_trade()
+            #9 - 13 are all false, they can only be forced by the action queue
+        else:
+            action_type_mask[ACTION_TYPES.index(queued)] = True
+
+        np.greater(cur_player.dev_cards[:4], cur_player.dev_cards_cur_turn[:4], out=self.dev_card)
+
+        #per resource masks cant say which amounts go together, so they only rule out amounts that are never legal
+        #the exact sets are enumerated by Game.legal_bank_trades(), legal_discards() and legal_inventions()
+        hand = cur_player.resources
+        bank = game.resources
+
+        #cant only trade in what you have
+        np.less_equal(TRADE_AMOUNTS, hand[:, None], out=self.trade_in)
+        if queued == ActionType.discard:
+            #never more than what is owed
+            self.trade_in &= (TRADE_AMOUNTS <= game.discard_owed[0])[None, :]
+        if queued is None:
+            #the bank only takes whole multiples of the trade rate and gives 1 resource per trade rate traded in
+            rates = cur_player.bank_trade_rates
+            self.trade_in &= (TRADE_AMOUNTS % rates[:, None] == 0)
+            n_tradeable = np.sum(hand // rates)
+            np.less_equal(TRADE_AMOUNTS, np.minimum(n_tradeable, bank)[:, None], out=self.trade_for)
+        elif queued == ActionType.invention:
+            #invention takes exactly 2 resources from the bank
+            np.less_equal(TRADE_AMOUNTS, np.minimum(2, bank)[:, None], out=self.trade_for)
+        else:
+            #no trade_for mask, you can technically be very greedy and player trade nothing for 19 of everything
+            self.trade_for[:] = True
+
+        self.dirty = False
+
+    def get(self, game):
+        if self.dirty:
+            self.refill(game)
+        if self.views is None:
+            self.make_views()
+
+        cur_player = game.get_cur_player()
+        settlement_mask = game.board.node_available if game.starting else cur_player.available_settlements
+        views = self.views
+        #the road, settlement and city masks are the game's own arrays
+        return tuple([
+            views['action_type'],
+            views['move_robber'],
+            readonly(cur_player.available_roads),
+            readonly(settlement_mask),
+            readonly(cur_player.available_cities),
+            views['dev_card'],
+            views['steal'],
+            views['monopoly']
+        ] + self.trade_views)
+
+def readonly(array: np.ndarray) -> np.ndarray:
+    view = array.view()
+    view.flags.writeable = False
+    return view
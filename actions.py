@@ -1,4 +1,4 @@
-from globals import DevType, Resource
+from globals import DevType, Resource, RESOURCE_TYPES_LIST, DEV_TYPES_LIST
 from player import Player
 from enum import Enum
 
@@ -110,10 +110,61 @@ ACTION_TYPES_DICT = {
 
 ACTION_TYPES = list(ACTION_TYPES_DICT.keys())
 ACTION_CLASSES = list(ACTION_TYPES_DICT.values())
+ACTION_TYPE_IDS = {action_type: i for i, action_type in enumerate(ACTION_TYPES)}
 
 def create_action(type: str | ActionType, kwargs: dict[str]):
     try:
         action_class = ACTION_TYPES_DICT[ActionType(type)]
         return action_class(**kwargs)
     except Exception as e:
-        return None
\ No newline at end of file
+        return None
+
+#lossless encoding of an action as a short tuple of small ints
+#(action type index followed by its arguments), used by the action log in history.py
+def encode_action(action: Action) -> tuple[int, ...]:
+    t = ACTION_TYPES.index(action.type)
+    match action.type:
+        case ActionType.settlement | ActionType.city:
+            return (t, int(action.node_idx))
+        case ActionType.road:
+            return (t, int(action.edge_idx))
+        case ActionType.play_dev:
+            return (t, DEV_TYPES_LIST.index(action.dev_type))
+        case ActionType.bank_trade | ActionType.player_trade:
+            return (t,) + encode_resources(action.trade_in) + encode_resources(action.trade_for)
+        case ActionType.move_robber:
+            return (t, int(action.tile_idx))
+        case ActionType.steal:
+            return (t, action.player.index)
+        case ActionType.monopoly:
+            return (t, RESOURCE_TYPES_LIST.index(action.resource))
+        case ActionType.invention | ActionType.discard:
+            return (t,) + encode_resources(action.resources)
+        case _:
+            return (t,)
+
+#inverse of encode_action, players are needed to resolve steal targets
+def decode_action(values: tuple[int, ...], players: list[Player]) -> Action:
+    action_type = ACTION_TYPES[values[0]]
+    action_class = ACTION_TYPES_DICT[action_type]
+    match action_type:
+        case ActionType.settlement | ActionType.city | ActionType.road | ActionType.move_robber:
+            return action_class(values[1])
+        case ActionType.play_dev:
+            return action_class(DEV_TYPES_LIST[values[1]])
+        case ActionType.bank_trade | ActionType.player_trade:
+            return action_class(decode_resources(values[1:6]), decode_resources(values[6:11]))
+        case ActionType.steal:
+            return action_class(players[values[1]])
+        case ActionType.monopoly:
+            return action_class(RESOURCE_TYPES_LIST[values[1]])
+        case ActionType.invention | ActionType.discard:
+            return action_class(decode_resources(values[1:6]))
+        case _:
+            return action_class()
+
+def encode_resources(resources: dict[Resource, int]) -> tuple[int, ...]:
+    return tuple(int(resources.get(resource, 0)) for resource in RESOURCE_TYPES_LIST)
+
+def decode_resources(values) -> dict[Resource, int]:
+    return dict(zip(RESOURCE_TYPES_LIST, values))
@@ -0,0 +1,269 @@
+import numpy as np
+
+from globals import *
+from actions import ActionType
+from game import Game
+from board import Board
+from action_index import get_action_index
+from rng import spawn_seeds
+
+'''
+lockstep batch of games for data collection
+every game's array state lives in a row of a stacked (games, ...) buffer, the games themselves only hold views into their row
+the rules are the ones in game.py and board.py, they write in place so the stacked buffers are always up to date
+decks, action queues and the discard queue stay per game python containers
+
+the common cases run over the whole batch in numpy, on the stacked buffers:
+    the mask of every game in the main phase with nothing queued (the state most steps start from)
+    production of every game that rolled something other than 7
+    end_turn, which only moves the turn on
+everything else (placements, robber, dev cards, trades, the starting phase) goes through Game.step one game at a time
+
+step(actions) takes one action index (see action_index.py) per game, for whoever has to act in that game
+finished games are replaced by a fresh game straight away, the step still reports their reward and done flag
+out: arrays step() writes mask, rewards and dones into (any of them), e.g. a worker's rows of shared memory (see pool.py)
+'''
+class BatchGame:
+    #stacked as (games, players, ...)
+    PLAYER_BUFFERS = (
+        'available_roads',
+        'available_settlements',
+        'available_cities',
+        'bank_trade_rates',
+        'resources',
+        'dev_cards',
+        'dev_cards_cur_turn'
+    )
+    #stacked as (games, ...), resources is the bank
+    GAME_BUFFERS = (
+        'resources',
+        'resources_gen',
+        'resources_block'
+    )
+
+    def __init__(self, num_games: int, player_names: list[str], seed=None, out: dict[str, np.ndarray] | None = None):
+        self.num_games = num_games
+        self.player_names = player_names
+        self.num_players = len(player_names)
+        self.index = get_action_index(self.num_players)
+        #game seeds are spawned from one seed sequence, so a batch is reproducible from its own seed
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+        #shapes and dtypes come from a game, so the stacks always match what the rules write
+        template = Game(player_names, seed=0)
+        self.board_state = {
+            name: self.stack(getattr(template.board, name))
+            for name in Board.STATE_BUFFERS
+        }
+        self.player_state = {
+            name: self.stack(np.stack([getattr(player, name) for player in template.players]))
+            for name in BatchGame.PLAYER_BUFFERS
+        }
+        self.game_state = {
+            name: self.stack(getattr(template, name))
+            for name in BatchGame.GAME_BUFFERS
+        }
+        self.robber = np.zeros((num_games,), dtype=np.int8)
+        self.cur_player = np.zeros((num_games,), dtype=np.int8)
+        self.victory_points = np.zeros((num_games, self.num_players), dtype=np.int8)
+
+        #turn state of every game, gathered by fill()
+        #main: in the main phase with nothing queued, these games get their mask and end_turn / roll in numpy
+        self.main = np.zeros((num_games,), dtype=bool)
+        self.has_rolled = np.zeros((num_games,), dtype=bool)
+        self.has_played_dev = np.zeros((num_games,), dtype=bool)
+        self.deck = np.zeros((num_games,), dtype=np.int8)
+        #rem_settlements, rem_cities and rem_roads of the current player
+        self.rem = np.zeros((num_games, 3), dtype=np.int8)
+
+        #outputs of step(), overwritten in place every step
+        out = dict() if out is None else out
+        self.mask = output(out, 'mask', (num_games, self.index.size), bool)
+        self.rewards = output(out, 'rewards', (num_games, self.num_players), np.float32)
+        self.dones = output(out, 'dones', (num_games,), bool)
+        self.accepted = np.zeros((num_games,), dtype=bool)
+
+        self.seeds = np.zeros((num_games,), dtype=np.int64)
+        self.games: list[Game] = [None] * num_games
+        for i in range(num_games):
+            self.reset_game(i)
+        self.fill()
+
+    def stack(self, buffer: np.ndarray):
+        return np.zeros((self.num_games,) + buffer.shape, dtype=buffer.dtype)
+
+    #replace game i with a fresh game and move its state into row i of the stacks
+    def reset_game(self, i: int):
+        seed = spawn_seeds(self.seed_seq, 1)[0]
+        game = Game(self.player_names, seed=seed)
+        self.seeds[i] = seed
+        self.games[i] = game
+
+        board = game.board
+        for name, stack in self.board_state.items():
+            stack[i] = getattr(board, name)
+            setattr(board, name, stack[i])
+        for name, stack in self.player_state.items():
+            for j, player in enumerate(game.players):
+                stack[i, j] = getattr(player, name)
+                setattr(player, name, stack[i, j])
+        for name, stack in self.game_state.items():
+            stack[i] = getattr(game, name)
+            setattr(game, name, stack[i])
+        #players hold views into the production tensors
+        for j, player in enumerate(game.players):
+            player.resources_gen = game.resources_gen[j]
+            player.resources_block = game.resources_block[j]
+        return game
+
+    #refresh the per game scalars and the legal action masks
+    def fill(self):
+        for i, game in enumerate(self.games):
+            player = game.get_cur_player()
+            self.robber[i] = game.board.robber
+            self.cur_player[i] = player.index
+            for j, other in enumerate(game.players):
+                self.victory_points[i, j] = other.victory_points
+            #games that are watched or play forced actions themselves always take the full path
+            main = not game.starting and game.winner is None and len(game.action_queue) == 0 and \
+                game.events is None and not game.auto_forced and game.profiler is None
+            self.main[i] = main
+            if main:
+                self.has_rolled[i] = game.has_rolled
+                self.has_played_dev[i] = game.has_played_dev
+                self.deck[i] = len(game.dev_cards)
+                self.rem[i] = (player.rem_settlements, player.rem_cities, player.rem_roads)
+            else:
+                game.legal_action_mask(out=self.mask[i])
+        self.fill_main(np.flatnonzero(self.main))
+
+    #legal_action_mask() with nothing queued, for the games g at once
+    def fill_main(self, g: np.ndarray):
+        index = self.index
+        c = self.cur_player[g]
+        players = self.player_state
+        hand = players['resources'][g, c]
+        has_rolled = self.has_rolled[g]
+        rem = self.rem[g]
+        mask = self.mask
+        mask[g] = False
+
+        def afford(cost):
+            return (hand >= cost).all(axis=1) & has_rolled
+
+        mask[g, index.offsets[ActionType.end_turn]] = has_rolled
+        mask[g, index.offsets[ActionType.roll]] = ~has_rolled
+        mask[g, index.offsets[ActionType.buy_dev]] = afford(Game.DEV_CARD_COST) & (self.deck[g] > 0)
+        for action_type, name, k, cost in [
+            (ActionType.settlement, 'available_settlements', 0, Game.SETTLEMENT_COST),
+            (ActionType.city, 'available_cities', 1, Game.CITY_COST),
+            (ActionType.road, 'available_roads', 2, Game.ROAD_COST)
+        ]:
+            allowed = afford(cost) & (rem[:, k] > 0)
+            mask[g, index.block(action_type)] = players[name][g, c] & allowed[:, None]
+
+        playable = players['dev_cards'][g, c, :4] > players['dev_cards_cur_turn'][g, c, :4]
+        playable &= ~self.has_played_dev[g, None]
+        #road building needs somewhere to build
+        playable[:, DEV_IDX[DevType.road_build]] &= (rem[:, 2] > 0) & players['available_roads'][g, c].any(axis=1)
+        mask[g, index.block(ActionType.play_dev)] = playable
+
+        rates = players['bank_trade_rates'][g, c]
+        mask[g, index.block(ActionType.bank_trade)] = has_rolled[:, None] & \
+            (hand >= rates)[:, index.trade_give] & (self.game_state['resources'][g] > 0)[:, index.trade_take]
+
+    '''
+    actions: one index into the action index per game
+    returns (observations, mask, rewards, dones)
+        mask: (games, actions) exact legal actions of whoever acts next in each game
+        rewards: (games, players) 1 for the winner of a game that ended on this step
+        dones: (games,) the game ended on this step and was replaced
+    accepted[i] says whether game i took its action, a rejected action leaves the game unchanged
+    the returned arrays are reused by the next step
+    '''
+    def step(self, actions: np.ndarray):
+        self.rewards[:] = 0
+        self.dones[:] = False
+        actions = np.asarray(actions)
+        offsets = self.index.offsets
+        #legal end_turn and roll actions of games in the main phase (the mask of these games was filled by fill_main)
+        end_turn = self.main & self.has_rolled & (actions == offsets[ActionType.end_turn])
+        roll = self.main & ~self.has_rolled & (actions == offsets[ActionType.roll])
+
+        for i in np.flatnonzero(~(end_turn | roll)):
+            game = self.games[i]
+            self.accepted[i] = game.step(self.index.decode(int(actions[i]), game))
+            if game.winner is not None:
+                self.rewards[i, game.winner.index] = 1
+                self.dones[i] = True
+                self.reset_game(i)
+
+        self.end_turns(np.flatnonzero(end_turn))
+        self.rolls(np.flatnonzero(roll))
+        self.accepted[end_turn | roll] = True
+
+        self.fill()
+        return self.observations(), self.mask, self.rewards, self.dones
+
+    def end_turns(self, g: np.ndarray):
+        for i in g:
+            game = self.games[i]
+            game.mask.dirty = True
+            game.advance_player()
+
+    #rolls for the games g, production of all of them at once
+    def rolls(self, g: np.ndarray):
+        roll_n = np.zeros((len(g),), dtype=np.int64)
+        for k, i in enumerate(g):
+            game = self.games[i]
+            game.mask.dirty = True
+            roll_n[k] = game.start_roll()
+            if roll_n[k] == 7:
+                game.resolve_roll(7)
+        produce = roll_n != 7
+        g = g[produce]
+        if len(g) == 0:
+            return
+        rows = ROLL_ROWS[roll_n[produce]]
+
+        #same rules as Game.gen_resources(), (games, players, resources)
+        gen = self.game_state['resources_gen'][g, :, rows] - self.game_state['resources_block'][g, :, rows]
+        bank = self.game_state['resources'][g]
+        short = bank < gen.sum(axis=1)
+        single = short & (np.count_nonzero(gen > 0, axis=1) == 1)
+        give = np.where(short[:, None], 0, gen)
+        give = np.where(single[:, None] & (gen > 0), bank[:, None], give)
+
+        hands = self.player_state['resources']
+        old_hands = hands[g]
+        hands[g] = old_hands + give
+        self.game_state['resources'][g] = bank - give.sum(axis=1)
+        #the per game counts and hashes
+        for k, i in enumerate(g):
+            game = self.games[i]
+            game.bank_written(bank[k])
+            for j in np.flatnonzero(give[k].any(axis=1)):
+                game.players[j].resources_written(old_hands[k, j])
+
+    #the full state of every game as stacked arrays (views, not copies)
+    #this is not a per player observation, opponents hands and dev cards are included
+    def observations(self):
+        obs = dict(self.board_state)
+        obs.update(self.player_state)
+        obs['bank'] = self.game_state['resources']
+        obs['resources_gen'] = self.game_state['resources_gen']
+        obs['resources_block'] = self.game_state['resources_block']
+        obs['robber'] = self.robber
+        obs['cur_player'] = self.cur_player
+        obs['victory_points'] = self.victory_points
+        return obs
+
+#out[name] cleared, or a new array if there is none
+def output(out: dict[str, np.ndarray], name: str, shape: tuple[int, ...], dtype) -> np.ndarray:
+    if name not in out:
+        return np.zeros(shape, dtype=dtype)
+    array = out[name]
+    if array.shape != shape or array.dtype != dtype:
+        raise ValueError(f'{name} has to be {np.dtype(dtype)} of shape {shape}, got {array.dtype} of shape {array.shape}')
+    array[...] = 0
+    return array
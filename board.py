@@ -3,41 +3,12 @@ from entities import *
 import numpy as np
 from copy import copy
 from player import Player
+from topology import TOPOLOGY
+from journal import NULL_JOURNAL
+from zobrist import ZOBRIST
+from profiler import Profiler
 
 class Board:
-    BOARD_SIZE = 3
-    TILE_OFFSETS = [
-        Direction.RS * 2,
-        Direction.NQR * 2,
-        Direction.SQ * 2,
-        Direction.NRS * 2,
-        Direction.QR * 2,
-        Direction.NSQ * 2,
-    ]
-    EDGE_OFFSETS = [
-        Direction.QR,
-        Direction.NSQ,
-        Direction.RS,
-        Direction.NQR,
-        Direction.SQ,
-        Direction.NRS
-    ]
-    NODE_OFFESTS = [
-        Direction.Q,
-        Direction.NS,
-        Direction.R,
-        Direction.NQ,
-        Direction.S,
-        Direction.NR
-    ]
-    PORT_DIRS = [
-        (Direction.NQ, Direction.R),
-        (Direction.S, Direction.NQ),
-        (Direction.NR, Direction.S),
-        (Direction.Q, Direction.NR),
-        (Direction.NS, Direction.Q),
-        (Direction.R, Direction.NS)
-    ]
     RESOURCES = [Resource.brick] * 3 + [Resource.wood] * 4 + [Resource.wool] * 4 \
         + [Resource.wheat] * 4 + [Resource.ore] * 3
     NUMBERS = [
@@ -51,331 +22,388 @@ class Board:
         [(0, None), (2, Resource.wheat)],
         [(1, Resource.ore)]
     ]
-    
-    adj_lists_set = False
 
+    RESOURCE_IDXS = [RESOURCE_TYPES_LIST.index(resource) for resource in RESOURCES]
+
+    #the graph is shared by every board, see topology.py
+    #only the per game state below is owned by a board
+    topology = TOPOLOGY
+    tiles: list[Tile] = TOPOLOGY.tiles
+    edges: list[Edge] = TOPOLOGY.edges
+    nodes: list[Node] = TOPOLOGY.nodes
+
+    #per game state is kept in small contiguous buffers indexed by entity index
+    #owners are player indices (-1 for nobody), tile resources index RESOURCE_TYPES_LIST (-1 for the desert)
+    STATE_BUFFERS = (
+        'node_owner',
+        'node_level',
+        'node_available',
+        'edge_owner',
+        'tile_resource',
+        'tile_number',
+        'tile_weights'
+    )
+
+    #seed: a seed or a generator to draw the layout from (a game passes its board stream, see rng.py)
     def __init__(self, players: list[Player], seed=None):
-        self.build_board()
-        self.build_dicts()
-        self.build_adj_lists()
-
         self.players = players
+        #set by the game for the length of a recorded step, the board's buffer writes go through it
+        self.journal = NULL_JOURNAL
         self.reset(seed)
-        
+
+    #only touches per game state, the graph itself is never rebuilt
     def reset(self, seed):
+        topology = self.topology
+
         #reset player entities
-        for edge in self.edges:
-            edge.player = None
-        for node in self.nodes:
-            node.player = None
-            node.value = 0
-            node.adj_port = None
+        self.node_owner = np.full((topology.n_nodes,), -1, dtype=np.int8)
+        self.node_level = np.zeros((topology.n_nodes,), dtype=np.int8)
+        self.node_available = np.ones((topology.n_nodes,), dtype=np.int8)
+        self.edge_owner = np.full((topology.n_edges,), -1, dtype=np.int8)
+        self.node_port: list[Port | None] = [None] * topology.n_nodes
+        #production weight of every player around every tile, settlement = 1, city = 2
+        #tile_weights[tile] is what the robber blocks on that tile
+        self.tile_weights = np.zeros((topology.n_tiles, len(self.players)), dtype=np.int8)
+
+        #per player connected road networks as (edges, longest road length) pairs
+        #only the network touched by a placement is ever recomputed
+        self.road_components: list[list[tuple[frozenset[int], int]]] = [[] for _ in self.players]
 
         #generate tile resources and numbers
-        self.seed = seed
-        self.random = np.random.default_rng(seed=seed)
+        random = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed=seed)
+        resources = np.array(Board.RESOURCE_IDXS, dtype=np.int8)
+        numbers = np.array(Board.NUMBERS, dtype=np.int8)
 
-        resources = np.array(Board.RESOURCES)
-        numbers = np.array(Board.NUMBERS)
+        random.shuffle(resources)
+        random.shuffle(numbers)
 
-        self.random.shuffle(resources)
-        self.random.shuffle(numbers)
+        desert_idx = random.integers(19)
+        self.tile_resource = np.insert(resources, desert_idx, -1)
+        self.tile_number = np.insert(numbers, desert_idx, -1)
 
-        desert_idx = self.random.integers(19)
-        resources = np.insert(resources, desert_idx, None)
-        numbers = np.insert(numbers, desert_idx, -1)
+        self.robber = int(desert_idx)
+        #hash of the board state, kept up to date by the mutators below (see zobrist.py)
+        self.zobrist = ZOBRIST.robber[self.robber]
 
-        for i, tile in enumerate(self.tiles):
-            tile.resource = resources[i]
-            tile.number = numbers[i]
-        
-        self.robber_tile = self.tiles[desert_idx]
+        #the layout never changes during a game, so its observation is only encoded once
+        self.tile_types_obs = np.zeros((topology.n_tiles, 6), dtype=np.int32)
+        self.tile_types_obs[np.arange(topology.n_tiles), self.tile_resource + 1] = 1
+        self.tile_nums_obs = np.maximum(self.tile_number, 0).astype(np.int32)
+        #chance of each tile producing on a roll
+        self.tile_probs = np.array([ROLL_P[n] if n > 0 else 0 for n in self.tile_number])
 
         #add ports
         port_data = copy(Board.PORTS)
-        self.random.shuffle(port_data)
+        random.shuffle(port_data)
         self.ports: list[Port] = []
         port_idx = 0
-        cur_tile_coords = Direction.QR * 2 * 3
-        for i, tile_offset in enumerate(Board.TILE_OFFSETS):
+        for i in range(len(port_data)):
             for port_pos, port_resource in port_data[i]:
-                self.ports.append(Port(
-                    cur_tile_coords + tile_offset * port_pos,
-                    port_idx,
-                    port_resource,
-                    Board.PORT_DIRS[i if port_pos != 2 else (i + 1) % 6]
-                ))
+                coords, dirs, node_idxs = topology.port_slots[(i, port_pos)]
+                port = Port(coords, port_idx, port_resource, dirs)
+                self.ports.append(port)
+                for node_idx in node_idxs:
+                    self.node_port[node_idx] = port
                 port_idx += 1
 
-        for port in self.ports:
-            for dir in port.dirs:
-                node: Node = self.node_dict.get(Board.coords_hash(port.coords + dir))
-                if node:
-                    node.adj_port = port
-    
-    #the build functions should only be called once
-    #to reset the board for a new game, call reset()
-    #this method builds the board graph structure
-    #it does not set resources or numbers on tiles
-    def build_board(self):
-        #add initial tiles, edges and nodes
-        cur_tile_coords = np.array([0, 0, 0])
-
-        self.tiles = [ Tile(cur_tile_coords.copy(), 0, None, None) ]
-        self.robber_tile = self.tiles[0]
-
-        self.edges = [
-            Edge(
-                cur_tile_coords + edge_offset, 
-                idx,
-            ) for idx, edge_offset in enumerate(Board.EDGE_OFFSETS)
-        ]
-        self.nodes: list[Node] = [
-            Node(cur_tile_coords + node_offset, idx) for idx, node_offset in enumerate(Board.NODE_OFFESTS)
-        ]
-
-        tile_idx = len(self.tiles)
-        edge_idx = len(self.edges)
-        node_idx = len(self.nodes)
-
-        #add tiles, edges, and nodes in order, spiraling out from center
-        for rad in range(1, Board.BOARD_SIZE):
-            cur_tile_coords += Direction.QR * 2
-            for i, tile_offset in enumerate(Board.TILE_OFFSETS):
-                for j in range(rad):
-                    cur_tile_coords += tile_offset
-                    #place tile
-                    self.tiles.append(Tile(
-                        cur_tile_coords.copy(),
-                        tile_idx,
-                        None,
-                        None
-                    ))
-
-                    tile_idx += 1
-                    
-                    #place edges and nodes
-                    for k in range(i, i + (4 if j == rad - 1 else 3)):
-                        self.edges.append(Edge(
-                            cur_tile_coords + Board.EDGE_OFFSETS[k % 6], edge_idx,
-                        ))
-                        edge_idx += 1
-                    for k in range(i, i + (3 if j == rad - 1 else 2)):
-                        self.nodes.append(Node(
-                            cur_tile_coords + Board.NODE_OFFESTS[k % 6], node_idx,
-                        ))
-                        node_idx += 1
-        #end for
-
-    def build_dicts(self):
-        self.tile_dict = dict()
-        self.edge_dict = dict()
-        self.node_dict = dict()
-    
-        for tile in self.tiles:
-            self.tile_dict[Board.coords_hash(tile.coords)] = tile
-        for edge in self.edges:
-            self.edge_dict[Board.coords_hash(edge.coords)] = edge
-        for node in self.nodes:
-            self.node_dict[Board.coords_hash(node.coords)] = node
-
-
-    def build_adj_lists(self):
-        for edge in self.edges:
-            for node_coords in edge.adj_node_coords():
-                node: Node = self.node_dict[Board.coords_hash(node_coords)]
-                for edge_coords in node.adj_edge_coords():
-                    adj_edge = self.edge_dict.get(Board.coords_hash(edge_coords))
-                    if adj_edge and adj_edge != edge:
-                        edge.adj_edges.append(adj_edge)
-                edge.adj_nodes.append(node)
-
-        for node in self.nodes:
-            for edge_coords in node.adj_edge_coords():                
-                adj_edge = self.edge_dict.get(Board.coords_hash(edge_coords))
-                if adj_edge:
-                    node.adj_edges.append(adj_edge)
-            for node_coords in node.adj_node_coords():
-                adj_node = self.node_dict.get(Board.coords_hash(node_coords))
-                if adj_node:
-                    node.adj_nodes.append(adj_node)
-            for tile_coords in node.adj_tile_coords():
-                adj_tile = self.tile_dict.get(Board.coords_hash(tile_coords))
-                if adj_tile:
-                    node.adj_tiles.append(adj_tile)
-
-        for tile in self.tiles:
-            for node_coords in tile.adj_node_coords():
-                adj_node = self.node_dict.get(Board.coords_hash(node_coords))
-                if adj_node:
-                    tile.adj_nodes.append(adj_node)
+    #copy of the per game state for the given (already copied) players
+    #the topology, tile layout and ports never change during a game and are shared
+    def copy(self, players: list[Player]):
+        board = Board.__new__(Board)
+        board.__dict__.update(self.__dict__)
+        board.players = players
+        board.journal = NULL_JOURNAL
+
+        for name in Board.STATE_BUFFERS:
+            setattr(board, name, getattr(self, name).copy())
+        #networks are replaced, never modified in place
+        board.road_components = copy(self.road_components)
+        return board
+
+    #the timed methods of a profiled game are not pickled (see profiler.py)
+    def __getstate__(self):
+        if Profiler.BOARD_METHODS[0] not in self.__dict__:
+            return self.__dict__
+        state = self.__dict__.copy()
+        for name in Profiler.BOARD_METHODS:
+            del state[name]
+        return state
 
     def place_settlement(self, node_idx: int, cur_player: Player, starting=False):
+        topology = self.topology
+        journal = self.journal
         #check move legality for board
-        if node_idx < 0 or node_idx >= len(self.nodes):
+        if node_idx < 0 or node_idx >= topology.n_nodes:
             return False
-        node = self.nodes[node_idx]
-        if not node.available:
+        if not self.node_available[node_idx]:
             return False
         if not cur_player.available_settlements[node_idx] and not starting:
             return False
         
         #update board
-        node.player = cur_player
-        node.value = 1
+        journal.set(self.node_owner, node_idx, cur_player.index)
+        journal.set(self.node_level, node_idx, 1)
+        self.zobrist ^= ZOBRIST.node[node_idx][cur_player.index][1]
 
         #player allowed move updates
-        node.available = False
+        journal.set(self.node_available, node_idx, False)
         for player in self.players:
-            player.available_settlements[node_idx] = False
+            journal.set(player.available_settlements, node_idx, False)
 
-        for adj_node in node.adj_nodes:
+        for adj_node in topology.adj_nodes[node_idx]:
             for player in self.players:
-                player.available_settlements[adj_node.index] = False
-            adj_node.available = False
+                journal.set(player.available_settlements, adj_node, False)
+            journal.set(self.node_available, adj_node, False)
         
-        for adj_edge in node.adj_edges:
-            if not adj_edge.player:
-                cur_player.available_roads[adj_edge.index] = True
+        for adj_edge in topology.adj_node_edges[node_idx]:
+            if self.edge_owner[adj_edge] < 0:
+                journal.set(cur_player.available_roads, adj_edge, True)
 
-        cur_player.available_cities[node_idx] = True
+        journal.set(cur_player.available_cities, node_idx, True)
         cur_player.rem_settlements -= 1
         cur_player.n_settlements += 1
         #player resource generation update
-        for tile in node.adj_tiles:
-            if tile.resource:
-                cur_player.resources_gen[tile.number][tile.resource] += 1
+        self.add_production(node_idx, cur_player)
         
+        #a settlement can cut through another player's road
+        self.split_roads(node_idx, cur_player.index)
+
         #player bank trade rate / port update
-        port = node.adj_port
+        port = self.node_port[node_idx]
         if port:
             if port.resource:
-                cur_player.bank_trade_rates[port.resource] = 2
+                journal.set(cur_player.bank_trade_rates, RESOURCE_IDX[port.resource], 2)
             else:
-                for resource in Resource:
-                    cur_player.bank_trade_rates[resource] = min(3, cur_player.bank_trade_rates[resource])
+                for resource in range(5):
+                    journal.set(cur_player.bank_trade_rates, resource, min(3, cur_player.bank_trade_rates[resource]))
         return True
 
     def place_city(self, node_idx: int, cur_player: Player):
         #check move legality for board
-        if node_idx < 0 or node_idx >= len(self.nodes):
+        if node_idx < 0 or node_idx >= self.topology.n_nodes:
             return False
-        node = self.nodes[node_idx]
         if not cur_player.available_cities[node_idx]:
             return False
 
         #update board
-        node.value = 2
+        self.journal.set(self.node_level, node_idx, 2)
+        self.zobrist ^= ZOBRIST.node[node_idx][cur_player.index][1] ^ ZOBRIST.node[node_idx][cur_player.index][2]
 
         #player allowed move update
-        cur_player.available_cities[node_idx] = False
+        self.journal.set(cur_player.available_cities, node_idx, False)
         cur_player.rem_cities -= 1
         cur_player.n_settlements -= 1
         cur_player.n_cities += 1
 
         #player resource generation update
-        for tile in node.adj_tiles:
-            if tile.resource:
-                cur_player.resources_gen[tile.number][tile.resource] += 1
+        self.add_production(node_idx, cur_player)
 
         #no need for bank trade rate update
         #upgrading to a city doesnt access new ports
         return True
 
     def place_road(self, edge_idx: int, cur_player: Player, starting=False):
-        if edge_idx < 0 or edge_idx >= len(self.edges):
+        topology = self.topology
+        journal = self.journal
+        if edge_idx < 0 or edge_idx >= topology.n_edges:
             return False
         if not cur_player.available_roads[edge_idx]:
             return False
-        edge = self.edges[edge_idx]
         
-        edge.player = cur_player
+        journal.set(self.edge_owner, edge_idx, cur_player.index)
+        self.zobrist ^= ZOBRIST.edge[edge_idx][cur_player.index]
+        journal.append(cur_player.roads, edge_idx)
 
         for player in self.players:
-            player.available_roads[edge.index] = False
+            journal.set(player.available_roads, edge_idx, False)
 
-        for i, adj_edge in enumerate(edge.adj_edges):
-            if adj_edge.player:
+        for adj_edge, via in topology.adj_edge_edges[edge_idx]:
+            if self.edge_owner[adj_edge] >= 0:
                 continue
-            if edge.adj_nodes[i // 2].player is None or edge.adj_nodes[i // 2].player == cur_player:
-                cur_player.available_roads[adj_edge.index] = True
+            if self.node_owner[via] < 0 or self.node_owner[via] == cur_player.index:
+                journal.set(cur_player.available_roads, adj_edge, True)
             
-        for adj_node in edge.adj_nodes:
-            if adj_node.available:
-                cur_player.available_settlements[adj_node.index] = True
+        for adj_node in topology.adj_edge_nodes[edge_idx]:
+            if self.node_available[adj_node]:
+                journal.set(cur_player.available_settlements, adj_node, True)
 
+        self.add_road(edge_idx, cur_player.index)
         return True
             
     def move_robber(self, tile_idx: int):
-        if tile_idx < 0 or tile_idx >= len(self.tiles):
+        if tile_idx < 0 or tile_idx >= self.topology.n_tiles:
             return False
-        if self.robber_tile.index == tile_idx:
+        if self.robber == tile_idx:
             return False
-        self.robber_tile = self.tiles[tile_idx]
+        self.set_block(self.robber, False)
+        self.zobrist ^= ZOBRIST.robber[self.robber] ^ ZOBRIST.robber[tile_idx]
+        self.robber = int(tile_idx)
+        self.set_block(self.robber, True)
         return True
+
+    #one more weight (a settlement, or a settlement upgraded to a city) on every tile around the node
+    def add_production(self, node_idx: int, cur_player: Player):
+        journal = self.journal
+        for tile in self.topology.adj_node_tiles[node_idx]:
+            journal.add(self.tile_weights, (tile, cur_player.index), 1)
+            resource = self.tile_resource[tile]
+            if resource >= 0:
+                row = ROLL_ROWS[self.tile_number[tile]]
+                journal.add(cur_player.resources_gen, (row, resource), 1)
+                if tile == self.robber:
+                    journal.add(cur_player.resources_block, (row, resource), 1)
+
+    #expected cards per roll every player would lose with the robber on each tile, shape (tiles, players)
+    def robber_impact(self):
+        return self.tile_weights * self.tile_probs[:, None]
+
+    #block (or unblock) the production of every player around a tile
+    def set_block(self, tile_idx: int, blocked: bool):
+        resource = self.tile_resource[tile_idx]
+        if resource < 0:
+            #nothing blocked if robber is on desert
+            return
+        row = ROLL_ROWS[self.tile_number[tile_idx]]
+        weights = self.tile_weights[tile_idx]
+        for owner in np.flatnonzero(weights):
+            self.journal.set(self.players[owner].resources_block, (row, resource), weights[owner] if blocked else 0)
         
-    def check_longest_road(self, player: Player):
-        visited = [False] * len(self.edges)
-        def dfs(u: int, l: int):
-            visited[u] = True
-            edge = self.edges[u]
-            for i, adj_edge in enumerate(edge.adj_edges):
-                if edge.adj_nodes[i // 2].player != player and edge.adj_nodes[i // 2]:
+    #merge the new road into every network of the owner it connects to
+    #and recompute the longest road of the merged network only
+    def add_road(self, edge_idx: int, owner: int):
+        node_owner = self.node_owner
+        merged = {edge_idx}
+        components = []
+        for component in self.road_components[owner]:
+            edges = component[0]
+            for adj_edge, via in self.topology.adj_edge_edges[edge_idx]:
+                if adj_edge in edges and (node_owner[via] < 0 or node_owner[via] == owner):
+                    merged |= edges
+                    break
+            else:
+                components.append(component)
+
+        components.append((frozenset(merged), self.longest_road(merged, owner)))
+        self.set_road_components(owner, components)
+
+    #a settlement only shortens roads that pass through its node
+    #i.e. networks of other players with at least 2 roads touching it
+    def split_roads(self, node_idx: int, owner: int):
+        for player in self.players:
+            if player.index == owner:
+                continue
+            n_roads = 0
+            for edge in self.topology.adj_node_edges[node_idx]:
+                if self.edge_owner[edge] == player.index:
+                    n_roads += 1
+                    split_edge = edge
+            if n_roads < 2:
+                continue
+
+            components = []
+            for component in self.road_components[player.index]:
+                if split_edge in component[0]:
+                    components += self.find_road_components(component[0], player.index)
+                else:
+                    components.append(component)
+            self.set_road_components(player.index, components)
+
+    def set_road_components(self, owner: int, components: list[tuple[frozenset[int], int]]):
+        self.journal.set(self.road_components, owner, components)
+        self.players[owner].longest_road_len = max([length for _, length in components], default=0)
+
+    #connected networks of the given roads, roads are not connected through another player's settlement
+    def find_road_components(self, edges, owner: int):
+        node_owner = self.node_owner.tolist()
+        adj_edge_edges = self.topology.adj_edge_edges
+        remaining = set(edges)
+        components = []
+        while remaining:
+            start = remaining.pop()
+            component = {start}
+            stack = [start]
+            while stack:
+                edge = stack.pop()
+                for adj_edge, via in adj_edge_edges[edge]:
+                    if adj_edge in remaining and (node_owner[via] < 0 or node_owner[via] == owner):
+                        remaining.remove(adj_edge)
+                        component.add(adj_edge)
+                        stack.append(adj_edge)
+            components.append((frozenset(component), self.longest_road(component, owner)))
+        return components
+
+    #longest trail (no road used twice) within a single network
+    #a trail may end at another player's settlement but not pass through it
+    def longest_road(self, edges, owner: int):
+        node_owner = self.node_owner.tolist()
+        adj_node_edges = self.topology.adj_node_edges
+        adj_edge_nodes = self.topology.adj_edge_nodes
+        used = set()
+
+        def dfs(node: int):
+            best = 0
+            for edge in adj_node_edges[node]:
+                if edge not in edges or edge in used:
                     continue
-                if not visited[adj_edge.index] and adj_edge.player == player:
-                    l = max(l, dfs(adj_edge.index, l + 1))
-            visited[u] = False
-            return l
-        
-        max_len = -1
-        for edge_idx in player.roads:
-            max_len = max(max_len, dfs(edge_idx, 0))
-        
-        player.longest_road_len = max_len
+                a, b = adj_edge_nodes[edge]
+                other = b if a == node else a
+                length = 1
+                if node_owner[other] < 0 or node_owner[other] == owner:
+                    used.add(edge)
+                    length += dfs(other)
+                    used.remove(edge)
+                best = max(best, length)
+            return best
+
+        #a longest trail can always be extended if it starts at an open node with an even number of roads,
+        #so only odd or blocked nodes need to be tried. with none of those every road fits in one trail
+        degree = dict()
+        for edge in edges:
+            for node in adj_edge_nodes[edge]:
+                degree[node] = degree.get(node, 0) + 1
+        starts = [
+            node for node, n in degree.items()
+            if n % 2 == 1 or (node_owner[node] >= 0 and node_owner[node] != owner)
+        ]
+        if not starts:
+            return len(edges)
+        return max(dfs(node) for node in starts)
+
+    #full recompute from scratch, the incremental updates above keep this up to date already
+    def check_longest_road(self, player: Player):
+        self.set_road_components(player.index, self.find_road_components(player.roads, player.index))
 
     def to_json_obj(self):
         obj = dict()
 
         obj['tiles'] = [
             {
-                'resource': tile.resource.value if tile.resource else 'desert',
-                'number': int(tile.number)
+                'resource': RESOURCE_TYPES_LIST[resource].value if resource >= 0 else 'desert',
+                'number': int(number)
             }
-            for tile in self.tiles
+            for resource, number in zip(self.tile_resource, self.tile_number)
         ]
-        obj['edges'] = [ edge.player.name if edge.player else None for edge in self.edges ]
+        obj['edges'] = [ self.players[owner].name if owner >= 0 else None for owner in self.edge_owner ]
         obj['nodes'] = [
-            { 'player': node.player.name if node.player else None, 'value': node.value } for node in self.nodes
+            { 'player': self.players[owner].name if owner >= 0 else None, 'value': int(level) }
+            for owner, level in zip(self.node_owner, self.node_level)
         ]
-        obj['robber_tile'] = int(self.robber_tile.index)
+        obj['robber_tile'] = self.robber
         
         return obj
     
     def get_obs(self, player_idx, num_players):
         obs = dict()
+        #owners are rotated so that the observing player is always 0
         obs['nodes'] = np.zeros((54, num_players), dtype=np.int32)
-        for node in self.nodes:
-            if node.player:
-                obs['nodes'][node.index][(node.player.index - player_idx) % num_players] = node.value
+        nodes = np.flatnonzero(self.node_owner >= 0)
+        obs['nodes'][nodes, (self.node_owner[nodes] - player_idx) % num_players] = self.node_level[nodes]
         obs['edges'] = np.zeros((72, num_players), dtype=np.int32)
-        for edge in self.edges:
-            if edge.player:
-                obs['edges'][edge.index][(edge.player.index - player_idx) % num_players] = 1
-        obs['tile_types'] = np.zeros((19, 6), dtype=np.int32)
-        obs['tile_nums'] = np.zeros((19,), dtype=np.int32)
-        for tile in self.tiles:
-            if tile.resource:
-                obs['tile_types'][tile.index][RESOURCE_TYPES_DICT[tile.resource]] = 1
-                obs['tile_nums'][tile.index] = tile.number
-            else:
-                obs['tile_types'][tile.index][0] = 1
-                obs['tile_nums'][tile.index] = 0
+        edges = np.flatnonzero(self.edge_owner >= 0)
+        obs['edges'][edges, (self.edge_owner[edges] - player_idx) % num_players] = 1
+        obs['tile_types'] = self.tile_types_obs.copy()
+        obs['tile_nums'] = self.tile_nums_obs.copy()
         obs['robber_tile'] = np.zeros((19,), dtype=np.int32)
-        obs['robber_tile'][self.robber_tile.index] = 1
+        obs['robber_tile'][self.robber] = 1
         
         return obs
-
-    @staticmethod
-    def coords_hash(coords):
-        return coords[0] * 256 + coords[1]
-    
\ No newline at end of file
@@ -2,66 +2,29 @@ from pettingzoo import AECEnv
 from gymnasium.spaces import *
 from gymnasium.spaces.utils import flatten_space, flatten, unflatten
 from game import Game
+from batch import BatchGame, output
+from observation import get_obs_space, get_obs_writer
+from action_index import get_action_index
+from history import GameHistory
 import numpy as np
 from actions import *
 from globals import RESOURCE_TYPES_LIST, DEV_TYPES_LIST
-from copy import deepcopy
 
 class CatanEnv(AECEnv):
     metadata = {
         'name': 'catan_env_v0'
     }
 
-    def __init__(self, player_names: list[str]):
+    '''
+    flat_actions: use a Discrete action space over the action index (see action_index.py) instead of the MultiDiscrete one
+        every index is one fully specified action and action_mask() is exact
+    '''
+    def __init__(self, player_names: list[str], flat_actions=False):
         self.possible_agents = player_names
         self.agents = self.possible_agents
+        self.flat_actions = flat_actions
 
-
-        #every obs with a value for each player has the order
-        #0 = current player
-        #1 = next player
-        #2 = next next player
-        #...
-        self._obs_space = Dict({
-            'nodes': MultiDiscrete([[3] * self.num_agents] * 54),
-            'edges': MultiBinary([72, self.num_agents]),
-            'tile_types': MultiBinary([19, 6]),
-            'tile_nums': MultiDiscrete([13] * 19),
-            'robber_tile': MultiBinary(19),
-            'player': Dict({
-                'bank_trade_rates': MultiDiscrete([5] * 5),
-                'resources': MultiDiscrete([20] * 5),
-                'resources_gen': MultiDiscrete([[11] * 5] * 10),
-                'resources_block': MultiDiscrete([[7] * 5] * 10),
-                'rem_settlements': Discrete(6),
-                'rem_cities': Discrete(5),
-                'rem_roads': Discrete(16),
-                'dev_cards': MultiDiscrete([15, 3, 3, 3, 6]),
-                'dev_cards_cur_turn': MultiDiscrete([15, 3, 3, 3, 6]),
-                'victory_points': Discrete(11),
-                'longest_road_len': Discrete(16),
-                'num_knights_played': Box(0, np.inf),
-                'has_longest_road': Discrete(2),
-                'has_largest_army': Discrete(2)
-            }),
-            # each element in 'opponents' is a dict very similar to 'player', but no 'dev_cards' or 'dev_cards_cur_turn',
-            # instead 'num_dev_cards' replaces both of them (can't see dev cards of other players)
-            'opponents': Tuple([Dict({
-                'bank_trade_rates': MultiDiscrete([5] * 5),
-                'resources': MultiDiscrete([20] * 5),
-                'resources_gen': MultiDiscrete([[11] * 5] * 10),
-                'resources_block': MultiDiscrete([[7] * 5] * 10),
-                'rem_settlements': Discrete(6),
-                'rem_cities': Discrete(5),
-                'rem_roads': Discrete(16),
-                'num_dev_cards': Discrete(26), # <<< replaces 'dev_cards' and 'dev_cards_cur_turn'
-                'victory_points': Discrete(11), # <<< victory points from dev cards not counted
-                'longest_road_len': Discrete(16),
-                'num_knights_played': Box(0, np.inf),
-                'has_longest_road': Discrete(2),
-                'has_largest_army': Discrete(2)
-            })] * (self.num_agents - 1))
-        })
+        self._obs_space = get_obs_space(self.num_agents)
         self._flat_obs_space = flatten_space(self._obs_space)
 
         '''
@@ -95,6 +58,10 @@ class CatanEnv(AECEnv):
         used for trades, discarding
         '''
         self._act_space = MultiDiscrete([len(ACTION_TYPES), 19, 72, 54, 54, 4, self.num_agents, 5] + [20] * 10)
+        if self.flat_actions:
+            self._act_space = Discrete(get_action_index(self.num_agents).size)
+            #int8 like gymnasium's masks, filled by action_mask()
+            self._flat_mask = np.zeros((self._act_space.n,), dtype=np.int8)
 
     def seed(self, seed=None):
         self.game_seed = seed
@@ -102,14 +69,23 @@ class CatanEnv(AECEnv):
     '''
     seed: game seed
     options:
-        record_history: record the game history. massive overhead (!!!) due to the sheer amount of deepcopy() calls
-
+        record_history: record the game history, one Game.clone() per step
+        record_actions: record the seed and the accepted actions instead (see history.py),
+            any step can be rebuilt with replay(env.history, upto=k)
+        checkpoint_every: with record_actions, keep a clone every this many actions (default 100, None for no checkpoints)
+        auto_forced: the game plays actions that are the only legal choice by itself (see Game),
+            after every step infos[agent]['forced_actions'] lists the actions it played
     '''
 
     def reset(self, seed=None, options=None): 
         self.seed(seed)
         
-        self.game = Game(player_names=self.agents, seed=self.game_seed)
+        if options is None:
+            options = {}
+
+        self.options = options
+
+        self.game = Game(player_names=self.agents, seed=self.game_seed, auto_forced=bool(self.options.get('auto_forced')))
         self.agent_selection = self.agents[0]
         self.terminations = {name: False for name in self.agents}
         self.truncations = {name: False for name in self.agents}
@@ -117,20 +93,24 @@ class CatanEnv(AECEnv):
         self.rewards = {name: 0 for name in self.agents}
         self._cumulative_rewards = {name: 0 for name in self.agents}
 
-        if options is None:
-            options = {}
-
-        self.options = options
-
         if self.options.get('record_history'):
-            self.game_history = [deepcopy(self.game)]
+            self.game_history = [self.game.clone()]
+        if self.options.get('record_actions'):
+            self.history = GameHistory(self.game, checkpoint_every=self.options.get('checkpoint_every', 100))
 
     def step(self, action):
         game_action = self.get_action(action)
-        self.game.step(game_action)
+        r = self.game.step(game_action)
+
+        if r and self.options.get('record_actions'):
+            self.history.record(self.game, game_action)
 
         if self.options.get('record_history'):
-            self.game_history.append(deepcopy(self.game))
+            self.game_history.append(self.game.clone())
+
+        if self.game.auto_forced:
+            for name in self.agents:
+                self.infos[name]['forced_actions'] = self.game.forced_actions
 
         if self.game.winner:
             for name in self.agents:
@@ -141,7 +121,13 @@ class CatanEnv(AECEnv):
 
         
     def observe(self, agent):
-        return flatten(self._obs_space, self.game.get_obs(self.agents.index(agent)))
+        buffer = np.zeros(self._flat_obs_space.shape, dtype=self._flat_obs_space.dtype)
+        return self.observe_into(buffer, agent)
+
+    #writes what flatten(obs space, game.get_obs(agent)) would give into buffer, without building the obs dicts
+    def observe_into(self, buffer: np.ndarray, agent):
+        get_obs_writer(self.num_agents).write(buffer, self.game, self.agents.index(agent))
+        return buffer
 
     def observation_space(self, agent):
         return self._flat_obs_space
@@ -151,9 +137,19 @@ class CatanEnv(AECEnv):
         return self._act_space
 
 
+    #with flat_actions the exact legal action mask for the current player, as a live buffer
+    #otherwise the per component masks of game.get_action_mask()
+    def action_mask(self):
+        if self.flat_actions:
+            return self.game.legal_action_mask(out=self._flat_mask)
+        return self.game.get_action_mask()
+
     #TODO: this function is hideous
     #clean it up
     def get_action(self, action: np.ndarray):
+        if self.flat_actions:
+            return self.game.action_from_index(int(action))
+
         action_class = ACTION_CLASSES[action[0]]
         action_type = ACTION_TYPES[action[0]]
 
@@ -188,3 +184,42 @@ class CatanEnv(AECEnv):
                 trade_in = dict(zip(RESOURCE_TYPES_LIST, action[13:]))
                 return action_class(trade_in)
 
+
+'''
+vectorized env over a lockstep batch of games (see batch.py)
+every step each game takes one action of whoever has to act in it, as an index into the game's action index (see action_index.py)
+observations have the layout of CatanEnv.observe(), for the player that acts next in each game, and are written in place
+step() returns (obs[games, obs size], mask[games, action index size], rewards[games, players], dones[games])
+the returned arrays are preallocated and overwritten by the next step, finished games are reset automatically
+out: arrays to use as obs, mask, rewards and dones (any of them), they are written in place and returned
+'''
+class CatanVecEnv:
+    def __init__(self, num_envs: int, player_names: list[str], seed=None, out: dict[str, np.ndarray] | None = None):
+        self.num_envs = num_envs
+        self.player_names = player_names
+        self.out = dict() if out is None else out
+        self._obs_space = get_obs_space(len(player_names))
+        self._flat_obs_space = flatten_space(self._obs_space)
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        self.batch = BatchGame(self.num_envs, self.player_names, seed=seed, out=self.out)
+        self.obs = output(self.out, 'obs', (self.num_envs,) + self._flat_obs_space.shape, self._flat_obs_space.dtype)
+        self.fill_obs()
+        return self.obs, self.batch.mask
+
+    def step(self, actions: np.ndarray):
+        _, mask, rewards, dones = self.batch.step(actions)
+        self.fill_obs()
+        return self.obs, mask, rewards, dones
+
+    def fill_obs(self):
+        writer = get_obs_writer(len(self.player_names))
+        for i, game in enumerate(self.batch.games):
+            writer.write(self.obs[i], game, game.get_cur_player().index)
+
+    def observation_space(self):
+        return self._flat_obs_space
+
+    def action_space(self):
+        return Discrete(self.batch.index.size)
@@ -1,5 +1,4 @@
 from globals import *
-from player import Player
 import numpy as np
 
 class Entity:
@@ -20,18 +19,11 @@ class Node(Entity):
     ]
     def __init__(self, coords, index):
         super().__init__(coords, index)
-        self.player: Player | None = None
-        self.value = 0
-
-        self.available = True
-        
         #adj_nodes[i] is connected through adj_edges[i]
         self.adj_edges: list[Edge] = []
         self.adj_nodes: list[Node] = []
 
         self.adj_tiles: list[Tile] = []
-        self.adj_port: Port = None
-
 
         if np.all(self.coords % 6 == 2):
             self.top = True
@@ -73,19 +65,15 @@ class Edge(Entity):
     ]
     def __init__(self, coords, index):
         super().__init__(coords, index)
-        self.player = None
-
         i = np.where(self.coords % 6 == 0)
         assert len(i[0]) == 1, f'Invalid edge coordinates: {self.coords}'
         self.dir = i[0][0]
 
-        #self.adj_edges[i] is connected through self.adj_nodes[i // 2]
+        #self.adj_edges[i] is connected through self.adj_edges_via[i]
         self.adj_edges: list[Edge] = []
+        self.adj_edges_via: list[Node] = []
         self.adj_nodes: list[Node] = []
 
-    def place_road(self, player: Player):
-        self.player = player
-
     def adj_edge_coords(self):
         adj_coords = []
         for i, offset in enumerate(Edge.EDGE_OFFSETS):
@@ -113,11 +101,8 @@ class Tile(Entity):
         Direction.NR
     ]
 
-    def __init__(self, coords, index, resource: Resource, number: int):
+    def __init__(self, coords, index):
         super().__init__(coords, index)
-        self.resource = resource
-        self.number = number
-
         self.adj_nodes: list[Node] = []
 
     def adj_node_coords(self):
@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Callable, NamedTuple
+
+from globals import *
+
+'''
+typed events of a game, see Game.subscribe() and Game.events
+events are small named tuples of ints and strings, players are their index and resources their index in RESOURCE_TYPES_LIST
+a game only builds events when something listens (logging=True or a subscriber), otherwise it skips them with a single check
+text is only made when the log is read (Game.info, format_event())
+
+events are not game state, undoing a step does not take its events back
+'''
+class Roll(NamedTuple):
+    player: int
+    roll: int
+
+#source is 'roll' or 'invention'
+class Produce(NamedTuple):
+    player: int
+    resource: int
+    amount: int
+    source: str
+
+class Steal(NamedTuple):
+    player: int
+    victim: int
+    resource: int
+
+#what is 'settlement', 'city', 'road' or 'dev_card', where is the node or edge (-1 for a dev card)
+class Build(NamedTuple):
+    player: int
+    what: str
+    where: int
+
+#with the bank, counts indexed like RESOURCE_TYPES_LIST
+class Trade(NamedTuple):
+    player: int
+    given: tuple[int, ...]
+    taken: tuple[int, ...]
+
+#owed is set when a 7 makes the player discard, resources when cards are actually discarded
+class Discard(NamedTuple):
+    player: int
+    owed: int
+    resources: tuple[int, ...]
+
+class Robber(NamedTuple):
+    player: int
+    tile: int
+
+class PlayDev(NamedTuple):
+    player: int
+    dev_type: str
+
+class Monopoly(NamedTuple):
+    player: int
+    resource: int
+    amount: int
+
+class Victory(NamedTuple):
+    player: int
+
+Event = Roll | Produce | Steal | Build | Trade | Discard | Robber | PlayDev | Monopoly | Victory
+
+#listeners of one game
+#    last_step: the events of the last Game.step() (forced actions included), Game.info formats these
+#    history: the last capacity events, older ones are dropped
+#    subscribers: called with every event as it happens
+class EventStream:
+    def __init__(self, capacity: int = 1024):
+        self.last_step: list[Event] = []
+        self.history: deque[Event] = deque(maxlen=capacity)
+        self.subscribers: list[Callable[[Event], None]] = []
+
+    def start_step(self):
+        self.last_step = []
+
+    def emit(self, event: Event):
+        self.last_step.append(event)
+        self.history.append(event)
+        for subscriber in self.subscribers:
+            subscriber(event)
+
+    def drain(self) -> list[Event]:
+        events = list(self.history)
+        self.history.clear()
+        return events
+
+    def copy(self):
+        stream = EventStream(self.history.maxlen)
+        stream.last_step = list(self.last_step)
+        stream.history.extend(self.history)
+        return stream
+
+    #subscribers belong to whoever subscribed, like a websocket, they are not pickled
+    def __getstate__(self):
+        return {'last_step': self.last_step, 'history': self.history, 'subscribers': []}
+
+def resource_text(resources: tuple[int, ...]) -> str:
+    return ', '.join(f'{amount} {resource.value}' for resource, amount in zip(RESOURCE_TYPES_LIST, resources) if amount > 0)
+
+def format_event(event: Event, player_names: list[str]) -> str:
+    name = player_names[event.player]
+    match event:
+        case Roll():
+            return f'{name} rolled a {event.roll}'
+        case Produce(source='invention'):
+            return f'{name} got {event.amount} {RESOURCE_TYPES_LIST[event.resource].value} from invention'
+        case Produce():
+            return f'{name} got {event.amount} {RESOURCE_TYPES_LIST[event.resource].value}'
+        case Steal():
+            return f'{name} stole {RESOURCE_TYPES_LIST[event.resource].value} from {player_names[event.victim]}'
+        case Build(what='dev_card'):
+            return f'{name} bought a dev card'
+        case Build():
+            return f'{name} built a {event.what}'
+        case Trade():
+            return f'{name} gave bank {resource_text(event.given)} for {resource_text(event.taken)}'
+        case Discard(resources=()):
+            return f'{name} must discard {event.owed}'
+        case Discard():
+            return f'{name} discarded {resource_text(event.resources)}'
+        case Robber():
+            return f'{name} moved the robber'
+        case PlayDev():
+            return f'{name} played {event.dev_type}'
+        case Monopoly():
+            return f'{name} monopolized {RESOURCE_TYPES_LIST[event.resource].value} ({event.amount})'
+        case Victory():
+            return f'{name} has won'
+
+def event_json(event: Event) -> dict:
+    return {'type': type(event).__name__.lower()} | event._asdict()
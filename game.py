@@ -8,49 +8,75 @@ from entities import *
 from actions import *
 from board import Board
 from player import Player
+from journal import Journal, NULL_JOURNAL
+from action_index import get_action_index
+from action_mask import ActionMask
+from profiler import Profiler
+from zobrist import ZOBRIST, game_hash, queue_hash
+from rng import GameRandom
+from events import *
 
 class Game:
-    roll_p = np.convolve(np.full((6,), 1 / 6), np.full((6,), 1 / 6))
-    DEV_CARD_COST = {
+    #costs are count vectors indexed like RESOURCE_TYPES_LIST
+    DEV_CARD_COST = resource_vector({
         Resource.wool: 1,
         Resource.wheat: 1,
         Resource.ore: 1
-    }
+    })
     DEV_CARDS = [DevType.knight] * 14 + [DevType.victory_point] * 5 + [DevType.monopoly] * 2 + \
-        [DevType.road_build] * 2 + [DevType.monopoly] * 2
-    SETTLEMENT_COST = {
+        [DevType.road_build] * 2 + [DevType.invention] * 2
+    #action types that can only be played when the action queue asks for them
+    FORCED_ACTION_TYPES = (
+        ActionType.move_robber,
+        ActionType.steal,
+        ActionType.monopoly,
+        ActionType.invention,
+        ActionType.discard
+    )
+    SETTLEMENT_COST = resource_vector({
         Resource.brick: 1,
         Resource.wood: 1,
         Resource.wool: 1,
         Resource.wheat: 1
-    }
-    CITY_COST = {
+    })
+    CITY_COST = resource_vector({
         Resource.wheat: 2,
         Resource.ore: 3,
-    }
-    ROAD_COST = {
+    })
+    ROAD_COST = resource_vector({
         Resource.brick: 1,
         Resource.wood: 1
-    }
+    })
 
-    def __init__(self, player_names: list[str], seed=None, logging=False):
+    '''
+    auto_forced: after every accepted step, keep playing the only legal action for as long as there is exactly one
+        (a lone roll, a steal with one candidate, the only open road, discarding the only resource left, ...)
+        the actions played this way are in forced_actions until the next step
+    '''
+    def __init__(self, player_names: list[str], seed=None, logging=False, auto_forced=False):
         self.player_names = player_names
         self.seed = seed
         if self.seed == None:
             self.seed = time.time_ns()
 
-        self.random = np.random.default_rng(seed=self.seed)
+        #independent streams for the layout, the dev deck, the dice and steals (see rng.py)
+        self.random = GameRandom(self.seed)
        
         #start, prod, or action
         self.step_fn = self.step_start
         self.action_queue = deque([ActionType.settlement, ActionType.road] * len(self.player_names) * 2)
         self.to_discard: deque[Player] = deque()
+        #number of cards still owed by each player in to_discard
+        self.discard_owed: deque[int] = deque()
         self.starting = True
 
         #player info
-        self.players = [Player(name, i) for i, name in enumerate(player_names)]
+        #production per player, roll (see ROLL_ROWS) and resource, players hold views of their own slice
+        self.resources_gen = np.zeros((len(player_names), 11, 5), dtype=np.int32)
+        self.resources_block = np.zeros((len(player_names), 11, 5), dtype=np.int32)
+        self.players = [Player(name, i, self.resources_gen[i], self.resources_block[i]) for i, name in enumerate(player_names)]
         self.cur_player = self.players[0]
-        self.board = Board(self.players, seed=self.seed)
+        self.board = Board(self.players, self.random.board)
 
         #current player info for current turn
         self.has_played_dev = False
@@ -63,26 +89,172 @@ class Game:
         self.winner: Player | None = None
 
         #game resources and dev cards
-        self.resources = dict()
-        for resource in Resource:
-            self.resources[resource] = 19
+        self.resources = np.full((5,), 19, dtype=np.int32)
 
         self.dev_cards = copy(Game.DEV_CARDS)
-        self.random.shuffle(self.dev_cards)
+        self.random.dev.shuffle(self.dev_cards)
 
-        #used for logging
-        self.info: list[str] = []
+        #typed events (see events.py), None while nothing listens so emitting them costs a single check
+        #logging keeps the events of the last step for info
         self.logging = logging
-
-    def log_info(self, msg: str):
-        if self.logging:
-            self.info.append(msg)
-
-    def step(self, action: Action):
-        self.info = []
+        self.events: EventStream | None = EventStream() if logging else None
+
+        self.auto_forced = auto_forced
+        self.forced_actions: list[Action] = []
+
+        #NULL_JOURNAL except during step(record=True), which sets a Journal on the game and board (set_journal())
+        self.journal = NULL_JOURNAL
+
+        #buffers behind get_action_mask()
+        self.mask = ActionMask(len(self.players), self.board.robber)
+
+        #off unless enable_profiling() is called, see profiler.py
+        self.profiler: Profiler | None = None
+
+        #hash of the game's own state, kept up to date by the mutators (see zobrist.py and zobrist_hash())
+        self.zobrist = game_hash(self)
+
+    #copy of the game that evolves exactly like the original
+    #only the mutable state is copied, the board topology, tile layout and ports are shared
+    def clone(self):
+        game = Game.__new__(Game)
+        game.__dict__.update(self.__dict__)
+
+        game.resources_gen = self.resources_gen.copy()
+        game.resources_block = self.resources_block.copy()
+        game.players = [player.copy(game.resources_gen[i], game.resources_block[i]) for i, player in enumerate(self.players)]
+        game.board = self.board.copy(game.players)
+        if self.profiler is not None:
+            #the timed methods belong to this game and its board, clones are not profiled
+            Profiler.detach(game)
+            game.profiler = None
+        game.cur_player = game.players[self.cur_player.index]
+        game.to_discard = deque(game.players[player.index] for player in self.to_discard)
+        game.discard_owed = copy(self.discard_owed)
+        game.p_longest_road = Game.same_player(game.players, self.p_longest_road)
+        game.p_largest_army = Game.same_player(game.players, self.p_largest_army)
+        game.winner = Game.same_player(game.players, self.winner)
+
+        game.step_fn = getattr(game, self.step_fn.__name__)
+        game.action_queue = copy(self.action_queue)
+        game.resources = self.resources.copy()
+        game.dev_cards = copy(self.dev_cards)
+        #subscribers stay with the original
+        game.events = None if self.events is None else self.events.copy()
+        game.mask = self.mask.copy()
+
+        game.random = self.random.copy()
+        game.journal = NULL_JOURNAL
+        return game
+
+    #the profiler is not pickled, its timed methods belong to this game
+    def __getstate__(self):
+        if self.profiler is None:
+            return self.__dict__
+        state = self.__dict__.copy()
+        for name in Profiler.METHODS + Profiler.STEP_FNS:
+            del state[name]
+        state['profiler'] = None
+        state['step_fn'] = getattr(Game, self.step_fn.__name__).__get__(self)
+        return state
+
+    #players hold views into the production tensors, pickling copies them apart
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for i, player in enumerate(self.players):
+            player.resources_gen = self.resources_gen[i]
+            player.resources_block = self.resources_block[i]
+
+    @staticmethod
+    def same_player(players: list[Player], player: Player | None):
+        return None if player is None else players[player.index]
+
+    #calls fn(event) with every event of the game from now on
+    def subscribe(self, fn):
+        if self.events is None:
+            self.events = EventStream()
+        self.events.subscribers.append(fn)
+
+    def unsubscribe(self, fn):
+        self.events.subscribers.remove(fn)
+        if not self.events.subscribers and not self.logging:
+            self.events = None
+
+    #the events of the last step as text
+    @property
+    def info(self) -> list[str]:
+        if self.events is None:
+            return []
+        return [format_event(event, self.player_names) for event in self.events.last_step]
+
+    #with record=True returns (result, undo record) instead of just the result
+    #passing the record to undo() restores the exact state from before the step, without copying the game
+    def step(self, action: Action, record=False):
+        self.mask.dirty = True
+        if self.events is not None:
+            self.events.start_step()
+        if not record:
+            return self.step_and_resolve(action)
+
+        journal = Journal([self, self.board, self.random] + self.players)
+        self.set_journal(journal)
+        try:
+            r = self.step_and_resolve(action)
+        finally:
+            self.set_journal(NULL_JOURNAL)
+        return r, journal
+
+    def step_and_resolve(self, action: Action):
         r = self.step_fn(action)
+        if self.auto_forced:
+            #a new list, the journal restores the old one on undo
+            self.forced_actions = []
+            if r:
+                self.resolve_forced()
         return r
 
+    #plays the only legal action until there is a real choice (or a winner)
+    def resolve_forced(self):
+        while True:
+            legal = self.legal_actions()
+            if len(legal) != 1:
+                return
+            forced = self.action_from_index(legal[0])
+            self.mask.dirty = True
+            #the state would not change, the same action would be forced forever
+            if not self.step_fn(forced):
+                raise RuntimeError(f'forced {forced.type.value} was rejected, legal_actions() and step() disagree')
+            self.forced_actions.append(forced)
+
+    #records have to be undone in the reverse order of the steps that made them
+    def undo(self, record: Journal):
+        record.undo()
+        self.mask.dirty = True
+
+    #times every dispatched action and the hot helpers, and counts rejected actions (see profiler.py)
+    #a game that was never profiled runs the plain methods, profiling costs nothing until it is enabled
+    def enable_profiling(self):
+        if self.profiler is None:
+            self.profiler = Profiler()
+            self.profiler.attach(self)
+        return self.profiler
+
+    def disable_profiling(self):
+        if self.profiler is not None:
+            Profiler.detach(self)
+            self.profiler = None
+
+    #{'calls': {name: count}, 'ns': {name: total nanoseconds}, 'rejected': {reason: count}}
+    #names are action types (by value) and method names, all empty when profiling is off
+    def stats(self):
+        if self.profiler is None:
+            return Profiler().stats()
+        return self.profiler.stats()
+
+    def set_journal(self, journal: Journal):
+        self.journal = journal
+        self.board.journal = journal
+
     def step_start(self, action: Action):
         if action.type != self.action_queue[0]:
             #invalid action, returns false
@@ -91,15 +263,16 @@ class Game:
         if action.type == ActionType.settlement:
             r = self.place_settlement(action, starting=True)
             if r:
-                self.action_queue.popleft()
+                self.journal.popleft(self.action_queue)
 
         if action.type == ActionType.road:
             r = self.place_road(action, starting=True)
             if r:
-                self.action_queue.popleft()
+                self.journal.popleft(self.action_queue)
                 if len(self.action_queue) == 0:
                     self.step_fn = self.step_main
                     self.starting = False
+                    self.zobrist ^= ZOBRIST.starting
                 elif len(self.action_queue) < len(self.players) * 2:
                     #exactly halfway, reverse order
                     self.advance_player(increment=-1)
@@ -114,6 +287,9 @@ class Game:
         if use_queue:
             if action.type != self.action_queue[0]:
                 return False
+        elif action.type in Game.FORCED_ACTION_TYPES:
+            #only allowed when forced by the action queue
+            return False
 
         r = False
         
@@ -145,8 +321,9 @@ class Game:
             case ActionType.discard:
                 r = self.discard(action)
         
-        if r and use_queue:
-            self.action_queue.popleft()
+        #a discard can take several steps, it pops the queue itself once everything owed is discarded
+        if r and use_queue and action.type != ActionType.discard:
+            self.journal.popleft(self.action_queue)
         return r
     
     def end_turn(self, action: EndTurnAction):
@@ -169,8 +346,11 @@ class Game:
         if not starting:
             self.pay_cost(self.cur_player, Game.SETTLEMENT_COST)
 
-        self.log_info('built a settlement')
+        if self.events is not None:
+            self.events.emit(Build(self.cur_player.index, 'settlement', action.node_idx))
 
+        #might have cut someone else's longest road
+        self.check_longest_road()
         self.check_victory()
         return True
 
@@ -195,7 +375,8 @@ class Game:
         
         self.pay_cost(self.cur_player, Game.CITY_COST)
 
-        self.log_info('built a city')
+        if self.events is not None:
+            self.events.emit(Build(self.cur_player.index, 'city', action.node_idx))
 
         self.check_victory()
         return True
@@ -219,13 +400,19 @@ class Game:
     
         self.cur_player.rem_roads -= 1
         if self.cur_player.road_dev_count > 0:
-            self.cur_player.road_dev_count -= 1
+            self.cur_player.set_road_dev_count(self.cur_player.road_dev_count - 1)
+            if self.cur_player.road_dev_count > 0 and not self.cur_player.available_roads.any():
+                #nowhere to put the second free road, drop it
+                #(step_main pops the queue entry of this road after returning, so popping here removes both)
+                self.cur_player.set_road_dev_count(0)
+                self.journal.popleft(self.action_queue)
         elif not starting:
             self.pay_cost(self.cur_player, Game.ROAD_COST)
 
-        self.log_info('built a road')
+        if self.events is not None:
+            self.events.emit(Build(self.cur_player.index, 'road', action.edge_idx))
 
-        self.check_longest_road(self.cur_player)
+        self.check_longest_road()
         return True
     
     def can_place_road(self, starting=False):
@@ -247,28 +434,37 @@ class Game:
             return False
         dev_type = action.dev_type
         #cant play dev cards on the turn they were bought
-        if self.cur_player.dev_cards[dev_type] - self.cur_player.dev_cards_cur_turn[dev_type] <= 0:
+        if not self.cur_player.can_play_dev_card(DEV_IDX[dev_type]):
+            return False
+        #cant play victory point dev card
+        if dev_type == DevType.victory_point:
+            return False
+        #cant play road building with nowhere to build
+        if dev_type == DevType.road_build and \
+            (self.cur_player.rem_roads <= 0 or not self.cur_player.available_roads.any()):
             return False
 
         match action.dev_type:
             case DevType.knight:
-                self.action_queue.append(ActionType.move_robber)
+                self.journal.append(self.action_queue, ActionType.move_robber)
                 self.played_knight = True
+                self.zobrist ^= ZOBRIST.played_knight
             case DevType.monopoly:
-                self.action_queue.append(ActionType.monopoly)
+                self.journal.append(self.action_queue, ActionType.monopoly)
             case DevType.road_build:
-                self.cur_player.road_dev_count = min(2, self.cur_player.rem_roads)
+                self.cur_player.set_road_dev_count(min(2, self.cur_player.rem_roads))
                 
                 for _ in range(self.cur_player.road_dev_count):
-                    self.action_queue.append(ActionType.road)
+                    self.journal.append(self.action_queue, ActionType.road)
 
             case DevType.invention:
-                self.action_queue.append(ActionType.invention)
-            case _:
-                #cant play victory point dev card
-                return False
-            
+                self.journal.append(self.action_queue, ActionType.invention)
+
+        self.cur_player.add_dev_card(DEV_IDX[dev_type], -1, self.journal)
         self.has_played_dev = True
+        self.zobrist ^= ZOBRIST.has_played_dev
+        if self.events is not None:
+            self.events.emit(PlayDev(self.cur_player.index, dev_type.value))
         return True
     
     def can_play_dev(self):
@@ -277,13 +473,17 @@ class Game:
     def buy_dev(self, action: BuyDevAction):
         if not self.can_buy_dev():
             return False
-        dev_card = self.dev_cards.pop()
-        self.cur_player.dev_cards[dev_card] += 1
-        self.cur_player.dev_cards_cur_turn[dev_card] += 1
+        dev_type = self.journal.pop(self.dev_cards)
+        dev_card = DEV_IDX[dev_type]
+        left = self.dev_cards.count(dev_type)
+        self.zobrist ^= ZOBRIST.deck[dev_card][left + 1] ^ ZOBRIST.deck[dev_card][left]
+        self.cur_player.add_dev_card(dev_card, 1, self.journal)
+        self.cur_player.add_dev_card_cur_turn(dev_card, 1, self.journal)
 
         self.pay_cost(self.cur_player, Game.DEV_CARD_COST)
 
-        self.log_info('bought a dev card')
+        if self.events is not None:
+            self.events.emit(Build(self.cur_player.index, 'dev_card', -1))
         self.check_victory()
         return True
     
@@ -300,17 +500,26 @@ class Game:
         if not self.can_roll():
             return False
         
+        roll_n = self.start_roll()
+        self.resolve_roll(roll_n)
+        return True
+
+    #roll() in two halves, BatchGame produces for many games at once in between
+    def start_roll(self):
         self.has_rolled = True
+        self.zobrist ^= ZOBRIST.has_rolled
         roll_n = self.get_roll_n()
         
-        self.log_info(f'rolled a {roll_n}')
+        if self.events is not None:
+            self.events.emit(Roll(self.cur_player.index, roll_n))
+        return roll_n
 
+    def resolve_roll(self, roll_n: int):
         if roll_n == 7:
             self.handle_discards()
-            self.action_queue.append(ActionType.move_robber)
+            self.journal.append(self.action_queue, ActionType.move_robber)
         else:
             self.gen_resources(roll_n)
-        return True
     
     def can_roll(self):
         return not self.has_rolled
@@ -319,11 +528,12 @@ class Game:
         idx = self.cur_player.index
         for i in range(idx, idx + len(self.players)):
             player = self.players[i % len(self.players)]
-            if np.sum(list(player.resources.values())) >= 7:
-                self.action_queue.append(ActionType.discard)
-                self.to_discard.append(player)
-                
-                self.log_info(f'{player.name} must discard')
+            if player.n_resources >= 7:
+                self.journal.append(self.action_queue, ActionType.discard)
+                self.journal.append(self.to_discard, player)
+                self.journal.append(self.discard_owed, player.n_resources // 2)
+                if self.events is not None:
+                    self.events.emit(Discard(player.index, player.n_resources // 2, ()))
         
     
     def discard(self, action: DiscardAction):
@@ -334,153 +544,156 @@ class Game:
             return False
 
         player = self.to_discard[0]
-        if np.sum(list(action.resources.values())) < np.sum(list(player.resources.values())) // 2:
+        #cards can be discarded a few at a time, but never more than what is owed
+        resources = resource_vector(action.resources)
+        n_discard = int(resources.sum())
+        if n_discard <= 0 or n_discard > self.discard_owed[0]:
+            return False
+        if resources.min() < 0:
             return False
         
-        if not player.can_afford(action.resources):
+        if not player.can_afford(resources):
             return False
         
-        self.pay_cost(player, action.resources)
-        self.to_discard.popleft()
+        self.pay_cost(player, resources)
+        if self.events is not None:
+            self.events.emit(Discard(player.index, int(self.discard_owed[0]), tuple(resources.tolist())))
+        if n_discard < self.discard_owed[0]:
+            self.journal.add(self.discard_owed, 0, -n_discard)
+        else:
+            self.journal.popleft(self.discard_owed)
+            self.journal.popleft(self.to_discard)
+            self.journal.popleft(self.action_queue)
 
         return True
 
     def gen_resources(self, roll_n):
-        total_gen = dict()
-        gen_players: dict[str, list[Player]] = dict()
-        for resource in Resource:
-            total_gen[resource] = 0
-            gen_players[resource] = []
-
-        for player in self.players:
-            for resource in Resource:
-                gen = player.resources_gen[roll_n][resource] - player.resources_block[roll_n][resource]
-                if gen > 0:
-                    total_gen[resource] += gen
-                    gen_players[resource].append(player)
-
-        for resource in Resource:
-            if self.resources[resource] < total_gen[resource]:
-                #if less than required resources, only give the resources if only one player can generate them
-                if len(gen_players[resource]) == 1:
-                    player = gen_players[resource][0]
-                    #give all that remains
-
-                    self.log_info(f'{player.name} got {self.resources[resource]} {resource.value}')
-
-                    player.resources[resource] += self.resources[resource]
-                    self.resources[resource] = 0
-            else:
-                for player in gen_players[resource]:
-                    gen = player.resources_gen[roll_n][resource] - player.resources_block[roll_n][resource]
-
-                    self.log_info(f'{player.name} got {gen} {resource.value}')
+        row = ROLL_ROWS[roll_n]
+        #(players, resources)
+        gen = self.resources_gen[:, row] - self.resources_block[:, row]
+        total_gen = gen.sum(axis=0)
+        n_gen_players = np.count_nonzero(gen > 0, axis=0)
+        bank = self.resources
+
+        #if less than required resources, only give the resources if only one player can generate them
+        short = bank < total_gen
+        give = np.where(short, 0, gen)
+        single = short & (n_gen_players == 1)
+        #give all that remains
+        give[:, single] = np.where(gen[:, single] > 0, bank[single], 0)
+
+        #by resource, then by player
+        receives = (gen > 0) & (~short | single)[None, :]
+        events = self.events
+        for j, i in zip(*np.nonzero(receives.T)):
+            self.players[i].add_resource(j, int(give[i, j]), self.journal)
+            if events is not None:
+                events.emit(Produce(int(i), int(j), int(give[i, j]), 'roll'))
+        self.add_bank(-give.sum(axis=0))
 
-                    player.resources[resource] += gen
-                    self.resources[resource] -= gen
-
-            
     def move_robber(self, action: MoveRobberAction):
+        prev_robber = self.board.robber
         r = self.board.move_robber(action.tile_idx)
         if not r:
             return False
+        self.journal.set(self.mask.move_robber, prev_robber, True)
+        self.journal.set(self.mask.move_robber, self.board.robber, False)
         
-        self.log_info('moved the robber')
+        if self.events is not None:
+            self.events.emit(Robber(self.cur_player.index, self.board.robber))
         steal_candidates = self.get_steal_candidates()
 
         if self.played_knight:
-            self.cur_player.num_knights_played += 1
+            #counted once, a 7 rolled later in the turn moves the robber without a knight
+            self.played_knight = False
+            self.zobrist ^= ZOBRIST.played_knight
+            #largest army is not scored yet, check_largest_army() is not called
+            self.cur_player.add_knight()
 
         #only add steal action if more than 1 eligible player to steal from
         if len(steal_candidates) > 1:
-            self.action_queue.append(ActionType.steal)
+            self.journal.append(self.action_queue, ActionType.steal)
+            for player in steal_candidates:
+                self.journal.set(self.mask.steal, player.index, True)
         elif len(steal_candidates) == 1:
             self.steal(StealAction(steal_candidates[0]))
 
-        #recalculate blocked resources
-        for player in self.players:
-            player.reset_resource_block()
-
-        robber_tile = self.board.robber_tile
-        if robber_tile.resource is None:
-            #nothing blocked if robber is on desert
-            return True
-
-        for node in robber_tile.adj_nodes:
-            if node.player:
-                node.player.resources_block[robber_tile.number][robber_tile.resource] += node.value
-
         return True
     
     def get_steal_candidates(self):
-        robber_tile = self.board.robber_tile
+        weights = self.board.tile_weights[self.board.robber]
         candidates: list[Player] = []
-        for node in robber_tile.adj_nodes:
-            #must have a player and must not be self
-            if node.player and node.player != self.cur_player and node.player not in candidates:
+        for player in self.players:
+            #must have a settlement/city on the robber tile and must not be self
+            if weights[player.index] and player != self.cur_player:
                 #and must have at least 1 resource
-                if np.any(list(node.player.resources.values())):
-                    candidates.append(node.player)
+                if player.n_resources:
+                    candidates.append(player)
         
         return candidates
     
     def steal(self, action: StealAction):
-        if action.player is None:
+        #actions can come straight from json (see create_action()), only players of this game can be stolen from
+        if not isinstance(action.player, Player):
+            return False
+        if action.player.index >= len(self.players) or action.player is not self.players[action.player.index]:
             return False
         #cant steal from yourself
         if action.player == self.cur_player:
             return False
     
 
-        robber_tile = self.board.robber_tile
-        for node in robber_tile.adj_nodes:
-            if node.player == action.player:
-                if np.any(list(node.player.resources.values())):
-                    resource_arr = np.array(list(node.player.resources.values()))
-                    total = np.sum(resource_arr)
-                    stolen: Resource = self.random.choice(list(node.player.resources.keys()), p=resource_arr / total)
+        player = action.player
+        if not self.board.tile_weights[self.board.robber, player.index]:
+            #player has no settlement/city on robber tile
+            return False
+        if not player.n_resources:
+            #player has no resources to steal from
+            return False
 
-                    node.player.resources[stolen] -= 1
-                    self.cur_player.resources[stolen] += 1
+        stolen = self.random.steal_from(player.resources, self.journal)
 
-                    self.log_info(f'{self.cur_player.name} stole {stolen.value} from {action.player.name}')
+        player.add_resource(stolen, -1, self.journal)
+        self.cur_player.add_resource(stolen, 1, self.journal)
+        for i in np.flatnonzero(self.mask.steal):
+            self.journal.set(self.mask.steal, i, False)
 
-                    return True
-                else:
-                    #player has no resources to steal from
-                    return False
-        
-        #player has no settlement/city on robber tile
-        return False
+        if self.events is not None:
+            self.events.emit(Steal(self.cur_player.index, player.index, stolen))
+
+        return True
 
     def monopoly(self, action: MonopolyAction):
-        if self.resources[action.resource] == 19:
-            #no one has wanted resource
-            #might still be allowed if player is dumb
-            return False
-        
+        #allowed even if no one has the resource
+        resource = RESOURCE_IDX[action.resource]
+        total = 0
         for player in self.players:
             if player != self.cur_player:
-                self.cur_player.resources[action.resource] += player.resources[action.resource]
-                player.resources[action.resource] = 0
+                amount = int(player.resources[resource])
+                self.cur_player.add_resource(resource, amount, self.journal)
+                player.add_resource(resource, -amount, self.journal)
+                total += amount
 
-        self.log_info(f'{self.cur_player.name} monopolized {action.resource.value}')
+        if self.events is not None:
+            self.events.emit(Monopoly(self.cur_player.index, resource, total))
 
         return True
     
     def invention(self, action: InventionAction):
-        if np.sum(list(action.resources.values())) != 2:
+        resources = resource_vector(action.resources)
+        if resources.sum() != 2:
+            return False
+        if resources.min() < 0:
+            return False
+        if (resources > self.resources).any():
+            #not enough resources
             return False
-
-        for resource in Resource:
-            if action.resources[resource] > self.resources[resource]:
-                #not enough resources
-                return False
         
-        for resource in Resource:
-            self.cur_player.resources[resource] += action.resources[resource]
-            self.resources[resource] -= action.resources[resource]
-            self.log_info(f'{self.cur_player.name} got {action.resources[resource]} {resource.value} from invention')
+        self.cur_player.add_resources(resources, self.journal)
+        self.add_bank(-resources)
+        if self.events is not None:
+            for resource in np.flatnonzero(resources):
+                self.events.emit(Produce(self.cur_player.index, int(resource), int(resources[resource]), 'invention'))
 
         return True
 
@@ -489,39 +702,30 @@ class Game:
         if not self.can_bank_trade():
             return False
         
-        for resource in Resource:
-            if action.trade_for[resource] > self.resources[resource]:
-                return False
-            if action.trade_in[resource] < self.cur_player.resources[resource]:
-                return False
-        
-        total_for = np.sum(list(action.trade_for.values()))
-        
-        total_in = 0
-        n_tradeable = dict()
-
-        for resource in Resource:
-            n_tradeable[resource] = action.trade_in[resource] // self.cur_player.bank_trade_rates[resource]
-            total_in += n_tradeable[resource]
-
-        if total_in < total_for:
-            #not giving enough for trade
+        player = self.cur_player
+        trade_in = resource_vector(action.trade_in)
+        trade_for = resource_vector(action.trade_for)
+        if trade_in.min() < 0 or trade_for.min() < 0:
+            return False
+        #cant trade a resource for itself
+        if (trade_in * trade_for).any():
+            return False
+        if (trade_in > player.resources).any():
+            return False
+        if (trade_for > self.resources).any():
+            return False
+        #every resource traded in is traded at the player's rate, the bank gives no change
+        if (trade_in % player.bank_trade_rates).any():
+            return False
+        total_for = trade_for.sum()
+        if total_for <= 0 or (trade_in // player.bank_trade_rates).sum() != total_for:
+            #not giving exactly enough for trade
             return False
         
-        total_in = 0
-        for resource in Resource:
-            amt = max(n_tradeable[resource], total_for - total_in)
-            total_in += amt
-            self.cur_player.resources[resource] -= amt
-
-            self.log_info(f'{self.cur_player.name} gave bank {amt} {resource.value}')
-
-            if total_in >= total_for:
-                break
-    
-        for resource in Resource:
-            self.cur_player.resources[resource] += action.trade_for[resource]
-            self.log_info(f'{self.cur_player.name} took {action.trade_for[resource]} {resource.value} from bank')
+        player.add_resources(trade_for - trade_in, self.journal)
+        self.add_bank(trade_in - trade_for)
+        if self.events is not None:
+            self.events.emit(Trade(player.index, tuple(trade_in.tolist()), tuple(trade_for.tolist())))
         
         return True
     
@@ -531,29 +735,43 @@ class Game:
     def can_player_trade(self):
         return self.has_rolled
     
-    def pay_cost(self, player: Player, cost: dict[Resource, int]):
-        player.pay_cost(cost)
-
-        for resource in Resource:
-            self.resources[resource] += cost.get(resource, 0)
+    def pay_cost(self, player: Player, cost: np.ndarray):
+        player.pay_cost(cost, self.journal)
+        self.add_bank(cost)
+
+    #brings the hash up to date after the bank was written directly (by BatchGame), old is the bank before
+    def bank_written(self, old: np.ndarray):
+        for resource in np.flatnonzero(self.resources != old):
+            self.zobrist ^= ZOBRIST.bank[resource][old[resource]] ^ ZOBRIST.bank[resource][self.resources[resource]]
+
+    def add_bank(self, resources: np.ndarray):
+        for resource in np.flatnonzero(resources):
+            count = int(self.resources[resource])
+            self.zobrist ^= ZOBRIST.bank[resource][count] ^ ZOBRIST.bank[resource][count + int(resources[resource])]
+        self.journal.add_array(self.resources, resources)
     
-    def check_longest_road(self, player: Player):
-        self.board.check_longest_road(player)
-        
-        flag = False
-        for player in self.players:
-            if player.longest_road_len < 5:
-                continue
-            
-            if self.p_longest_road is None:
-                self.p_longest_road = player
-                flag = True
-            elif self.p_longest_road.longest_road_len < player.longest_road_len:
-                self.p_longest_road = player
-                flag = True
-        
-        if flag:
-            self.check_victory()
+    #road lengths are kept up to date by the board, this only moves the title
+    def check_longest_road(self):
+        holder = self.p_longest_road
+        longest = max(player.longest_road_len for player in self.players)
+        if holder is not None and holder.longest_road_len == longest and longest >= 5:
+            return
+
+        #the title only moves to a single strictly longest road
+        #(a broken road that leaves a tie gives it to nobody)
+        leaders = [player for player in self.players if player.longest_road_len == longest]
+        new_holder = leaders[0] if longest >= 5 and len(leaders) == 1 else None
+        if new_holder == holder:
+            return
+
+        if holder is not None:
+            holder.has_longest_road = False
+            self.zobrist ^= ZOBRIST.longest_road[holder.index]
+        if new_holder is not None:
+            new_holder.has_longest_road = True
+            self.zobrist ^= ZOBRIST.longest_road[new_holder.index]
+        self.p_longest_road = new_holder
+        self.check_victory()
     
     def check_largest_army(self):
         flag = False
@@ -563,12 +781,16 @@ class Game:
             
             if self.p_largest_army is None:
                 self.p_largest_army = player
+                self.zobrist ^= ZOBRIST.largest_army[player.index]
                 flag = True
             elif self.p_largest_army.num_knights_played < player.num_knights_played:
+                self.p_largest_army.has_largest_army = False
+                self.zobrist ^= ZOBRIST.largest_army[self.p_largest_army.index] ^ ZOBRIST.largest_army[player.index]
                 self.p_largest_army = player
                 flag = True
         
         if flag:
+            self.p_largest_army.has_largest_army = True
             self.check_victory()
             
 
@@ -576,25 +798,32 @@ class Game:
         for player in self.players:
             player.calculate_victory_points()
             if player.victory_points >= 10:
-                self.log_info(f'{player.name} was won')
+                if self.events is not None and self.winner is None:
+                    self.events.emit(Victory(player.index))
                 self.winner = player
                 return True
         return False
     
     def advance_player(self, increment=1):
+        if self.has_rolled:
+            self.zobrist ^= ZOBRIST.has_rolled
+        if self.has_played_dev:
+            self.zobrist ^= ZOBRIST.has_played_dev
+        if self.played_knight:
+            self.zobrist ^= ZOBRIST.played_knight
         self.has_rolled = False
         self.has_played_dev = False
         self.played_knight = False
-        for dev_type in DevType:
-            self.cur_player.dev_cards_cur_turn[dev_type] = 0
+        self.cur_player.clear_dev_cards_cur_turn(self.journal)
 
         idx = self.cur_player.index
         idx += 1
         idx %= len(self.players)
+        self.zobrist ^= ZOBRIST.cur_player[self.cur_player.index] ^ ZOBRIST.cur_player[idx]
         self.cur_player = self.players[idx]
 
     def get_roll_n(self):
-        return self.random.choice([i for i in range(2, 13)], p=Game.roll_p)
+        return self.random.roll(self.journal)
     
     '''
     json obj format:
@@ -619,6 +848,7 @@ class Game:
         obj['board'] = self.board.to_json_obj()
         obj['players'] = {player.name: player.to_json_obj() for player in self.players}
         obj['info'] = self.info
+        obj['events'] = [] if self.events is None else [event_json(event) for event in self.events.last_step]
 
         return obj
     
@@ -631,75 +861,123 @@ class Game:
         obs['opponents'] = tuple(opponent_obs)
         return obs
     
+    #64 bit zobrist hash of the state (see zobrist.py), equal states hash equal whatever the order of the steps to get there
+    #covers the board, hands, dev cards (held and bought this turn), knights, free roads, bank, dev deck, current player,
+    #turn flags, the longest road and largest army holders and the action and discard queues
+    def zobrist_hash(self) -> int:
+        h = self.zobrist ^ self.board.zobrist ^ queue_hash(self)
+        for player in self.players:
+            h ^= player.zobrist
+        return h
+
     def get_cur_player(self):
         if len(self.to_discard) > 0:
             return self.to_discard[0]
         return self.cur_player
 
-    #get the action mask for the current player
-    #the other players obviously cant do anything
-    def get_action_mask(self):
-        cur_player = self.get_cur_player()
-
-        action_type_mask = np.zeros(len(ACTION_TYPES), dtype=np.int8)
-        if len(self.action_queue) == 0:
-            action_type_mask[0] = self.can_end_turn()
-            action_type_mask[1] = self.can_place_settlement(starting=self.starting)
-            action_type_mask[2] = self.can_place_city()
-            action_type_mask[3] = self.can_place_road(starting=self.starting)
-            action_type_mask[4] = self.can_play_dev()
-            action_type_mask[5] = self.can_buy_dev()
-            action_type_mask[6] = self.can_roll()
-            action_type_mask[7] = self.can_bank_trade()
-            action_type_mask[8] = self.can_player_trade()
-            #9 - 13 are all false, they can only be forced by the action queue
+    #indices of exactly the actions the current player can take, see action_index.py
+    #empty once the game has a winner
+    def legal_actions(self):
+        return np.flatnonzero(self.legal_action_mask())
+
+    #legal_actions() as a bool mask over the action index, written into out if given
+    def legal_action_mask(self, out: np.ndarray | None = None):
+        index = get_action_index(len(self.players))
+        if out is None:
+            out = np.zeros(index.size, dtype=bool)
         else:
-            action_type_mask[ACTION_TYPES.index(self.action_queue[0])] = True
+            out[:] = False
+        legal = out
+        if self.winner is not None:
+            return legal
 
-        move_robber_mask = np.ones(19, dtype=np.int8)
-        move_robber_mask[self.board.robber_tile.index] = False
+        player = self.get_cur_player()
+        queued = self.action_queue[0] if len(self.action_queue) > 0 else None
 
-        road_mask = cur_player.available_roads.copy()
-        settlement_mask = cur_player.available_settlements.copy()
         if self.starting:
-            for i, node in enumerate(self.board.nodes):
-                settlement_mask[i] = node.available
-        city_mask = cur_player.available_cities.copy()
-
-        dev_card_mask = np.zeros(4, dtype=np.int8)
-        for i, dev_type in enumerate(DevType):
-            if dev_type == DevType.victory_point:
-                break
-            dev_card_mask[i] = (cur_player.dev_cards[dev_type] - cur_player.dev_cards_cur_turn[dev_type]) > 0
-
-        steal_mask = np.zeros(len(self.players), dtype=np.int8)
-        for player in self.get_steal_candidates():
-            steal_mask[player.index] = True
-
-        monopoly_mask = np.zeros(5, dtype=np.int8)
-        for i, res in enumerate(Resource):
-            monopoly_mask[i] = self.resources[res] + cur_player.resources[res] < 19
-
-        #due to the complicated check for trading a good mask (in mask guarantees legality) cant be generated
-        #instead only disallow stupid turbo illegal moves
-
-        #no trade_for mask, you can technically be very greedy and player trade nothing for 19 of everything
-        trade_for_masks = [np.ones(20, dtype=np.int8)] * 5
-
-        trade_in_masks = []
-        for res in Resource:
-            mask = np.zeros(20, dtype=np.int8)
-            #cant only trade in what you have
-            mask[:cur_player.resources[res] + 1] = True
-            trade_in_masks.append(mask)
-
-        return tuple([
-            action_type_mask,
-            move_robber_mask,
-            road_mask,
-            settlement_mask,
-            city_mask,
-            dev_card_mask,
-            steal_mask,
-            monopoly_mask
-        ] + trade_for_masks + trade_in_masks)
\ No newline at end of file
+            if queued == ActionType.settlement:
+                legal[index.block(ActionType.settlement)] = self.board.node_available
+            else:
+                legal[index.block(ActionType.road)] = player.available_roads
+            return legal
+
+        match queued:
+            case None:
+                legal[index.offsets[ActionType.end_turn]] = self.can_end_turn()
+                legal[index.offsets[ActionType.roll]] = self.can_roll()
+                legal[index.offsets[ActionType.buy_dev]] = self.can_buy_dev()
+                if self.can_place_settlement():
+                    legal[index.block(ActionType.settlement)] = player.available_settlements
+                if self.can_place_city():
+                    legal[index.block(ActionType.city)] = player.available_cities
+                if self.can_place_road():
+                    legal[index.block(ActionType.road)] = player.available_roads
+                if self.can_play_dev():
+                    offset = index.offsets[ActionType.play_dev]
+                    for i, dev_type in enumerate(DEV_TYPES_LIST[:4]):
+                        if not player.can_play_dev_card(i):
+                            continue
+                        if dev_type == DevType.road_build and \
+                            (player.rem_roads <= 0 or not player.available_roads.any()):
+                            continue
+                        legal[offset + i] = True
+                if self.can_bank_trade():
+                    legal[index.block(ActionType.bank_trade)] = \
+                        (player.resources >= player.bank_trade_rates)[index.trade_give] & (self.resources > 0)[index.trade_take]
+            case ActionType.road:
+                #free roads from a road building card
+                if self.can_place_road():
+                    legal[index.block(ActionType.road)] = player.available_roads
+            case ActionType.move_robber:
+                legal[index.block(ActionType.move_robber)] = True
+                legal[index.offsets[ActionType.move_robber] + self.board.robber] = False
+            case ActionType.steal:
+                for candidate in self.get_steal_candidates():
+                    legal[index.offsets[ActionType.steal] + candidate.index] = True
+            case ActionType.monopoly:
+                legal[index.block(ActionType.monopoly)] = True
+            case ActionType.invention:
+                legal[index.block(ActionType.invention)] = (index.invention_counts <= self.resources).all(axis=1)
+            case ActionType.discard:
+                legal[index.block(ActionType.discard)] = player.resources > 0
+
+        return legal
+
+    #every legal bank trade of the current player as rows of count vectors (trade_in, trade_for)
+    #each unit traded takes the player's rate of one resource and gives 1 of another from the bank
+    def legal_bank_trades(self):
+        trade_in = [np.zeros((0, 5), dtype=np.int32)]
+        trade_for = [np.zeros((0, 5), dtype=np.int32)]
+        if self.winner is None and not self.starting and len(self.action_queue) == 0 and self.can_bank_trade():
+            player = self.cur_player
+            units = player.resources // player.bank_trade_rates
+            for total in range(1, min(units.sum(), self.resources.sum()) + 1):
+                for give in compositions(total, units):
+                    #cant take back a resource that is traded in
+                    takes = compositions(total, np.where(give > 0, 0, self.resources))
+                    trade_in.append(np.broadcast_to(give * player.bank_trade_rates, takes.shape))
+                    trade_for.append(takes)
+        return np.concatenate(trade_in), np.concatenate(trade_for)
+
+    #every way of discarding all the cards owed by the player that has to discard, one count vector per row
+    def legal_discards(self):
+        if self.winner is not None or len(self.action_queue) == 0 or self.action_queue[0] != ActionType.discard:
+            return np.zeros((0, 5), dtype=np.int32)
+        return compositions(self.discard_owed[0], self.to_discard[0].resources)
+
+    #every pair of resources an invention can take from the bank, one count vector per row
+    def legal_inventions(self):
+        if self.winner is not None or len(self.action_queue) == 0 or self.action_queue[0] != ActionType.invention:
+            return np.zeros((0, 5), dtype=np.int32)
+        return compositions(2, np.minimum(self.resources, 2))
+
+    #the action with index idx in legal_actions()
+    def action_from_index(self, idx: int) -> Action:
+        return get_action_index(len(self.players)).decode(idx, self)
+
+    #get the action mask for the current player
+    #the other players obviously cant do anything
+    #the masks are live buffers that change with the game, copy them to keep them across steps
+    #the first read after a step recomputes the action type, dev card and trade masks (see action_mask.py)
+    def get_action_mask(self):
+        return self.mask.get(self)
@@ -24,6 +24,39 @@ RESOURCE_TYPES_DICT = {
     Resource.ore: 5
 }
 
+#index of each resource in RESOURCE_TYPES_LIST, the index used by every resource count array
+RESOURCE_IDX = {resource: i for i, resource in enumerate(RESOURCE_TYPES_LIST)}
+
+#count array of a resource dict (as used by actions)
+def resource_vector(resources: dict[Resource, int]) -> np.ndarray:
+    return np.array([resources.get(resource, 0) for resource in RESOURCE_TYPES_LIST], dtype=np.int32)
+
+#every count vector v with 0 <= v <= upper and sum(v) == total, one per row
+def compositions(total: int, upper: np.ndarray) -> np.ndarray:
+    #the empty vector is the only (and only when total is 0) composition of nothing
+    rows = np.zeros((1 if total == 0 else 0, 0), dtype=np.int32)
+    if len(upper) > 0:
+        rows = np.zeros((1, 0), dtype=np.int32)
+    for i, bound in enumerate(upper):
+        used = rows.sum(axis=1)
+        rest = int(np.sum(upper[i + 1:]))
+        parts = []
+        for c in range(int(bound) + 1):
+            keep = (used + c <= total) & (used + c + rest >= total)
+            if keep.any():
+                parts.append(np.column_stack([rows[keep], np.full(np.count_nonzero(keep), c, dtype=np.int32)]))
+        if len(parts) == 0:
+            return np.zeros((0, len(upper)), dtype=np.int32)
+        rows = np.concatenate(parts)
+    return rows
+
+#row of each roll in the (11, 5) production matrices, 7 produces nothing and is kept last
+#so the first 10 rows are the rolls 2 - 6 and 8 - 12 in order
+ROLL_ROWS = np.array([-1, -1, 0, 1, 2, 3, 4, 10, 5, 6, 7, 8, 9])
+
+#chance of rolling each number with 2 dice, by number
+ROLL_P = np.concatenate([np.zeros(2), np.convolve(np.full((6,), 1 / 6), np.full((6,), 1 / 6))])
+
 class Direction():
     #dirs from center of tile to corner of tile
     Q = np.array([4, -2, -2])
@@ -57,4 +90,6 @@ DEV_TYPES_LIST = [
 
     #needs to be last, see get_action_mask() in game.py
     DevType.victory_point
-]
\ No newline at end of file
+]
+DEV_IDX = {dev_type: i for i, dev_type in enumerate(DEV_TYPES_LIST)}
+DEV_VICTORY_POINT = DEV_IDX[DevType.victory_point]
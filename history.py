@@ -0,0 +1,60 @@
+from array import array
+
+from actions import Action, encode_action, decode_action
+from game import Game
+
+#compact game history: the seed, the player names and the accepted actions
+#every game is fully determined by its seed and its actions, so any step can be rebuilt with replay()
+#actions are stored back to back as small ints (see encode_action() in actions.py)
+#a clone of the game is kept every checkpoint_every actions so replaying never starts more than that far back
+class GameHistory:
+    def __init__(self, game: Game, checkpoint_every: int | None = 100):
+        self.seed = game.seed
+        self.player_names = list(game.player_names)
+        self.logging = game.logging
+        #forced actions are played by the game itself and never recorded
+        self.auto_forced = game.auto_forced
+
+        self.data = array('B')
+        #offsets[i] is where action i starts in data
+        self.offsets = array('I', [0])
+
+        self.checkpoint_every = checkpoint_every
+        self.checkpoints: dict[int, Game] = {0: game.clone()} if checkpoint_every else dict()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    #call after game.step(action) accepted the action, rejected actions dont change the game
+    def record(self, game: Game, action: Action):
+        self.data.extend(encode_action(action))
+        self.offsets.append(len(self.data))
+        if self.checkpoint_every and len(self) % self.checkpoint_every == 0:
+            self.checkpoints[len(self)] = game.clone()
+
+    def action(self, i: int, players) -> Action:
+        return decode_action(self.data[self.offsets[i]:self.offsets[i + 1]], players)
+
+    def nbytes(self):
+        return self.data.itemsize * len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+#the game after the first upto actions of the history (all of them by default)
+def replay(history: GameHistory, upto: int | None = None) -> Game:
+    if upto is None:
+        upto = len(history)
+    if upto < 0 or upto > len(history):
+        raise IndexError(f'history has {len(history)} actions, cant replay {upto}')
+
+    start = 0
+    if history.checkpoint_every:
+        start = upto - upto % history.checkpoint_every
+    if start in history.checkpoints:
+        game = history.checkpoints[start].clone()
+    else:
+        start = 0
+        game = Game(history.player_names, seed=history.seed, logging=history.logging, auto_forced=history.auto_forced)
+
+    for i in range(start, upto):
+        r = game.step(history.action(i, game.players))
+        assert r, f'replayed action {i} was rejected, history does not match its seed'
+    return game
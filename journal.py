@@ -0,0 +1,94 @@
+from operator import setitem, attrgetter
+
+#undo record of a single Game.step(), see Game.step(record=True) and Game.undo()
+#every in-place write to game state goes through the journal of its owner (NULL_JOURNAL when nothing records)
+#plain attributes of the game, board and players (__dict__ or __slots__) are snapshotted when the step starts,
+#writes into containers (numpy arrays, dicts, lists, deques) are logged one by one as they happen
+#so undoing never copies any game state
+class Journal:
+    def __init__(self, objects: list):
+        self.attrs = [(obj, snapshot(obj)) for obj in objects]
+        self.entries = []
+
+    def set(self, container, key, value):
+        self.entries.append((setitem, container, key, container[key]))
+        container[key] = value
+
+    def add(self, container, key, amount):
+        old = container[key]
+        self.entries.append((setitem, container, key, old))
+        container[key] = old + amount
+
+    #whole numpy array at once
+    def add_array(self, array, amount):
+        self.entries.append((setitem, array, Ellipsis, array.copy()))
+        array += amount
+
+    def append(self, container, item):
+        self.entries.append((container.pop,))
+        container.append(item)
+
+    def pop(self, container):
+        item = container.pop()
+        self.entries.append((container.append, item))
+        return item
+
+    def popleft(self, container):
+        item = container.popleft()
+        self.entries.append((container.appendleft, item))
+        return item
+
+    #call before drawing from rng
+    def save_random(self, rng):
+        self.entries.append((setattr, rng.bit_generator, 'state', rng.bit_generator.state))
+
+    def undo(self):
+        for fn, *args in reversed(self.entries):
+            fn(*args)
+        self.entries = []
+        for obj, attrs in self.attrs:
+            restore(obj, attrs)
+
+#slotted objects are read with one attrgetter per class
+SLOT_GETTERS = dict()
+
+def snapshot(obj):
+    getter = SLOT_GETTERS.get(type(obj))
+    if getter is not None:
+        return getter(obj)
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__.copy()
+    getter = SLOT_GETTERS[type(obj)] = attrgetter(*type(obj).__slots__)
+    return getter(obj)
+
+def restore(obj, attrs):
+    if isinstance(attrs, dict):
+        obj.__dict__.update(attrs)
+    else:
+        for name, value in zip(type(obj).__slots__, attrs):
+            setattr(obj, name, value)
+
+#used when no step is being recorded, every write goes straight through
+class NullJournal:
+    def set(self, container, key, value):
+        container[key] = value
+
+    def add(self, container, key, amount):
+        container[key] += amount
+
+    def add_array(self, array, amount):
+        array += amount
+
+    def append(self, container, item):
+        container.append(item)
+
+    def pop(self, container):
+        return container.pop()
+
+    def popleft(self, container):
+        return container.popleft()
+
+    def save_random(self, rng):
+        pass
+
+NULL_JOURNAL = NullJournal()
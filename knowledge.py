@@ -0,0 +1,194 @@
+import numpy as np
+
+from globals import *
+from game import Game
+from events import Event, Steal, Monopoly
+from zobrist import game_hash
+
+'''
+what every player publicly knows about the others, and determinized games for search on hidden information
+    knowledge = Knowledge(game)   #at the start of the game, it follows the game through its events
+    ...
+    game_for_search = knowledge.determinize(observer, random)
+
+hands: every resource move is public except a steal between two other players, where only the count is seen
+known[o, p] is a lower bound on player p's hand from what o has seen, the rest of the hand is unknown to o
+    public changes are added to it, losses come out of the known cards first (whatever is left was unknown)
+    a hidden steal lowers every known count of the victim by one, unless only one resource could have been stolen
+most[o, p] is the matching upper bound, what o cant rule out player p holding
+    public changes are added to it, and no count is over the size of the hand
+    a hidden steal lets the thief hold one more of every resource the victim could have had
+    a monopoly leaves every other player without the resource
+dev cards: how many each player holds and has bought this turn is public, and so is every played card,
+    so from o's view the unplayed cards of the others and the deck are one shuffled pool
+    except that nobody holds enough victory point cards to have won, o can see the game isnt over
+
+the tracker reads the true hands of the game it follows, but only keeps what the observers could have deduced
+it is not undone with the game and does not follow clones
+'''
+class Knowledge:
+    DEAL_TRIES = 100
+
+    def __init__(self, game: Game):
+        self.game = game
+        n = len(game.players)
+        #the true hands the last time known was brought up to date
+        self.hands = self.true_hands()
+        self.known = np.repeat(self.hands[None], n, axis=0)
+        self.most = self.known.copy()
+        self.diag = np.arange(n)
+        game.subscribe(self.on_event)
+
+    def true_hands(self) -> np.ndarray:
+        return np.array([player.resources for player in self.game.players], dtype=np.int64)
+
+    def on_event(self, event: Event):
+        #everything else is public, it is picked up from the hands
+        if isinstance(event, Steal):
+            self.sync(event)
+        elif isinstance(event, Monopoly):
+            self.sync()
+            victims = np.arange(len(self.hands)) != event.player
+            self.most[:, victims, event.resource] = 0
+
+    #applies the public changes since the last sync, then the steal that was just made (if any)
+    def sync(self, steal: Steal | None = None):
+        hands = self.true_hands()
+        public = hands - self.hands
+        if steal is not None:
+            public[steal.player, steal.resource] -= 1
+            public[steal.victim, steal.resource] += 1
+        np.maximum(self.known + public[None], 0, out=self.known)
+        self.most += public[None]
+        if steal is not None:
+            self.hidden_steal(steal, hands)
+        self.hands = hands
+        np.minimum(self.most, hands.sum(axis=1)[None, :, None], out=self.most)
+        np.maximum(self.most, self.known, out=self.most)
+        #everyone knows their own hand
+        self.known[self.diag, self.diag] = hands
+        self.most[self.diag, self.diag] = hands
+
+    def hidden_steal(self, steal: Steal, hands: np.ndarray):
+        thief, victim, resource = steal
+        known = self.known
+        most = self.most
+        for observer in range(len(known)):
+            victim_known = known[observer, victim]
+            #the victim's hand before the steal, all of it known and of one resource
+            certain = hands[victim].sum() + 1 == victim_known.sum() and np.count_nonzero(victim_known) == 1
+            if observer == thief or observer == victim or certain:
+                victim_known[resource] = max(victim_known[resource] - 1, 0)
+                known[observer, thief, resource] += 1
+                most[observer, victim, resource] -= 1
+                most[observer, thief, resource] += 1
+            else:
+                np.maximum(victim_known - 1, 0, out=victim_known)
+                most[observer, thief] += most[observer, victim] > 0
+
+    #cards of player that observer is sure of, and how many more player holds
+    def hand(self, observer: int, player: int) -> tuple[np.ndarray, int]:
+        self.sync()
+        known = self.known[observer, player].copy()
+        return known, int(self.hands[player].sum() - known.sum())
+
+    '''
+    a copy of the game that observer cant tell apart from the real one
+        every hand has its true size and holds the cards observer is sure of,
+        the unknown cards of all hands are dealt from the cards not in the bank or known to observer,
+        no hand gets more of a resource than observer thinks it could hold (see deal())
+        the others' unplayed dev cards and the deck are dealt from the cards observer hasn't seen played or holds,
+        no one gets enough victory point cards to reach 10 points (see deal_dev_cards())
+        the dice and steals get new streams, future rolls are hidden as well
+    random: numpy Generator the determinization is drawn from
+    '''
+    def determinize(self, observer: int, random: np.random.Generator) -> Game:
+        self.sync()
+        game = self.game.clone()
+        players = game.players
+        known = self.known[observer]
+
+        dealt = self.deal(observer, random)
+        for player in players:
+            player.add_resources(known[player.index] + dealt[player.index] - player.resources)
+
+        cards = self.deal_dev_cards(game, observer, random)
+        k = 0
+        for player in players:
+            if player.index == observer or player.n_dev_cards == 0:
+                continue
+            dealt = cards[k:k + player.n_dev_cards]
+            k += player.n_dev_cards
+            #the cards bought this turn are the first ones dealt
+            n_new = int(player.dev_cards_cur_turn.sum())
+            cur_turn = np.bincount(dealt[:n_new], minlength=len(DEV_TYPES_LIST))
+            for dev_type, count in enumerate(cur_turn - player.dev_cards_cur_turn):
+                player.add_dev_card_cur_turn(dev_type, int(count))
+            for dev_type, count in enumerate(np.bincount(dealt, minlength=len(DEV_TYPES_LIST))):
+                player.add_dev_card(dev_type, int(count - player.dev_cards[dev_type]))
+            player.calculate_victory_points()
+        game.dev_cards = [DEV_TYPES_LIST[dev_type] for dev_type in cards[k:]]
+
+        game.random.scramble(random)
+        game.zobrist = game_hash(game)
+        game.mask.dirty = True
+        return game
+
+    '''
+    the unknown cards of every hand from observer's view, dealt out of the cards not in the bank or known to observer
+    so no hand goes over what observer thinks it could hold
+    the pool is shuffled and the hands, in a random order, take the first cards they have room for,
+    a shuffle where some hand gets stuck is drawn again
+    the true hands always fit, they are the fallback if DEAL_TRIES shuffles get stuck
+    '''
+    def deal(self, observer: int, random: np.random.Generator) -> np.ndarray:
+        known = self.known[observer]
+        pool = 19 - self.game.resources - known.sum(axis=0)
+        unknown = self.hands.sum(axis=1) - known.sum(axis=1)
+        room = self.most[observer] - known
+        n = len(unknown)
+        for _ in range(Knowledge.DEAL_TRIES):
+            cards = random.permutation(np.repeat(np.arange(5), pool)).tolist()
+            dealt = np.zeros((n, 5), dtype=np.int64)
+            for p in random.permutation(n):
+                need = unknown[p]
+                rest = []
+                for card in cards:
+                    if need > 0 and dealt[p, card] < room[p, card]:
+                        dealt[p, card] += 1
+                        need -= 1
+                    else:
+                        rest.append(card)
+                if need > 0:
+                    break
+                cards = rest
+            else:
+                return dealt
+        return self.hands - known
+
+    '''
+    the others' dev cards and then the deck, shuffled from observer's view
+    every hand is n_dev_cards long and the cards bought this turn come first in it
+    a shuffle that gives someone 10 points with its victory point cards is drawn again,
+    the true cards are the fallback if DEAL_TRIES shuffles all do
+    '''
+    def deal_dev_cards(self, game: Game, observer: int, random: np.random.Generator) -> np.ndarray:
+        others = [player for player in game.players if player.index != observer and player.n_dev_cards > 0]
+        hidden = np.array([game.dev_cards.count(dev_type) for dev_type in DEV_TYPES_LIST])
+        for player in others:
+            hidden += player.dev_cards
+        #victory point cards each hand can take without reaching 10 points
+        most_vp = [9 - (player.victory_points - int(player.dev_cards[DEV_VICTORY_POINT])) for player in others]
+        ends = np.cumsum([player.n_dev_cards for player in others], dtype=np.int64)
+        cards = np.repeat(np.arange(len(DEV_TYPES_LIST)), hidden)
+        for _ in range(Knowledge.DEAL_TRIES):
+            cards = random.permutation(cards)
+            vp = np.add.reduceat(cards == DEV_VICTORY_POINT, np.r_[0, ends[:-1]]) if len(others) > 0 else []
+            if all(n <= most for n, most in zip(vp, most_vp)):
+                return cards
+
+        dealt = []
+        for player in others:
+            dealt += np.repeat(np.arange(len(DEV_TYPES_LIST)), player.dev_cards_cur_turn).tolist()
+            dealt += np.repeat(np.arange(len(DEV_TYPES_LIST)), player.dev_cards - player.dev_cards_cur_turn).tolist()
+        return np.array(dealt + [DEV_IDX[dev_type] for dev_type in game.dev_cards], dtype=np.int64)
@@ -0,0 +1,163 @@
+from functools import lru_cache
+import numpy as np
+from gymnasium.spaces import *
+from gymnasium.spaces.utils import flatdim
+
+from globals import *
+
+def get_obs_space(num_players: int):
+    #every obs with a value for each player has the order
+    #0 = current player
+    #1 = next player
+    #2 = next next player
+    #...
+    return Dict({
+        'nodes': MultiDiscrete([[3] * num_players] * 54),
+        'edges': MultiBinary([72, num_players]),
+        'tile_types': MultiBinary([19, 6]),
+        'tile_nums': MultiDiscrete([13] * 19),
+        'robber_tile': MultiBinary(19),
+        'player': Dict({
+            'bank_trade_rates': MultiDiscrete([5] * 5),
+            'resources': MultiDiscrete([20] * 5),
+            'resources_gen': MultiDiscrete([[11] * 5] * 10),
+            'resources_block': MultiDiscrete([[7] * 5] * 10),
+            'rem_settlements': Discrete(6),
+            'rem_cities': Discrete(5),
+            'rem_roads': Discrete(16),
+            'dev_cards': MultiDiscrete([15, 3, 3, 3, 6]),
+            'dev_cards_cur_turn': MultiDiscrete([15, 3, 3, 3, 6]),
+            'victory_points': Discrete(11),
+            'longest_road_len': Discrete(16),
+            'num_knights_played': Box(0, np.inf),
+            'has_longest_road': Discrete(2),
+            'has_largest_army': Discrete(2)
+        }),
+        # each element in 'opponents' is a dict very similar to 'player', but no 'dev_cards' or 'dev_cards_cur_turn',
+        # instead 'num_dev_cards' replaces both of them (can't see dev cards of other players)
+        'opponents': Tuple([Dict({
+            'bank_trade_rates': MultiDiscrete([5] * 5),
+            'resources': MultiDiscrete([20] * 5),
+            'resources_gen': MultiDiscrete([[11] * 5] * 10),
+            'resources_block': MultiDiscrete([[7] * 5] * 10),
+            'rem_settlements': Discrete(6),
+            'rem_cities': Discrete(5),
+            'rem_roads': Discrete(16),
+            'num_dev_cards': Discrete(26), # <<< replaces 'dev_cards' and 'dev_cards_cur_turn'
+            'victory_points': Discrete(11), # <<< victory points from dev cards not counted
+            'longest_road_len': Discrete(16),
+            'num_knights_played': Box(0, np.inf),
+            'has_longest_road': Discrete(2),
+            'has_largest_army': Discrete(2)
+        })] * (num_players - 1))
+    })
+
+'''
+writes the flattened observation (gymnasium flatten of CatanEnv's observation space) straight from the game state
+the position of every leaf of the space is worked out once per number of players
+    Discrete and MultiDiscrete leaves are one-hot, a value v of element k sets buffer[starts[k] + v]
+    MultiBinary and Box leaves are written as they are
+this has to follow get_obs_space() and the values in Board.get_obs() / Player.get_obs()
+'''
+class ObsWriter:
+    ARRAY_LEAVES = ('bank_trade_rates', 'resources', 'resources_gen', 'resources_block')
+    SCALAR_LEAVES = ('rem_settlements', 'rem_cities', 'rem_roads', 'longest_road_len', 'has_longest_road', 'has_largest_army', 'victory_points')
+    SELF_LEAVES = ('dev_cards', 'dev_cards_cur_turn')
+    OPPONENT_LEAVES = ('num_dev_cards',)
+
+    def __init__(self, obs_space: Dict, num_players: int):
+        self.num_players = num_players
+        self.size = flatdim(obs_space)
+        #path -> offset of the leaf, path -> start of every one-hot element of the leaf
+        self.offsets: dict[tuple, int] = dict()
+        self.starts: dict[tuple, np.ndarray] = dict()
+        self.add_space(obs_space, (), 0)
+
+        n = num_players
+        self.node_starts = self.starts[('nodes',)].reshape(54, n)
+        self.tile_num_starts = self.starts[('tile_nums',)]
+        #players in the order of the observation (the observing player first), all their one-hot leaves are written at once
+        #the starts are in the order of the values from player_values()
+        player_keys = [('player',)] + [('opponents', k) for k in range(n - 1)]
+        self.player_starts = np.concatenate([
+            self.starts[key + (leaf,)]
+            for k, key in enumerate(player_keys)
+            for leaf in ObsWriter.ARRAY_LEAVES + ObsWriter.SCALAR_LEAVES + (ObsWriter.SELF_LEAVES if k == 0 else ObsWriter.OPPONENT_LEAVES)
+        ])
+        self.knight_offsets = np.array([self.offsets[key + ('num_knights_played',)] for key in player_keys])
+
+    #follows the order of gymnasium's flatten, dict keys in the order of the space
+    def add_space(self, space, path: tuple, offset: int):
+        if isinstance(space, Dict):
+            for key, subspace in space.spaces.items():
+                offset = self.add_space(subspace, path + (key,), offset)
+            return offset
+        if isinstance(space, Tuple):
+            for k, subspace in enumerate(space.spaces):
+                offset = self.add_space(subspace, path + (k,), offset)
+            return offset
+
+        self.offsets[path] = offset
+        if isinstance(space, Discrete):
+            self.starts[path] = np.array([offset - space.start])
+        elif isinstance(space, MultiDiscrete):
+            nvec = space.nvec.flatten()
+            self.starts[path] = offset + np.concatenate([[0], np.cumsum(nvec)[:-1]]) - space.start.flatten()
+        return offset + flatdim(space)
+
+    def write(self, buffer: np.ndarray, game, player_idx: int):
+        n = self.num_players
+        board = game.board
+        buffer[:] = 0
+
+        #owners are rotated so that the observing player is always 0
+        nodes = np.flatnonzero(board.node_owner >= 0)
+        node_values = np.zeros((54, n), dtype=np.int64)
+        node_values[nodes, (board.node_owner[nodes] - player_idx) % n] = board.node_level[nodes]
+        buffer[self.node_starts + node_values] = 1
+
+        edges = np.flatnonzero(board.edge_owner >= 0)
+        buffer[self.offsets[('edges',)] + edges * n + (board.edge_owner[edges] - player_idx) % n] = 1
+
+        offset = self.offsets[('tile_types',)]
+        buffer[offset:offset + board.tile_types_obs.size] = board.tile_types_obs.ravel()
+        buffer[self.tile_num_starts + board.tile_nums_obs] = 1
+        buffer[self.offsets[('robber_tile',)] + board.robber] = 1
+
+        players = [game.players[(player_idx + k) % n] for k in range(n)]
+        values = []
+        for k, player in enumerate(players):
+            self.player_values(values, player, k == 0)
+        buffer[self.player_starts + np.concatenate(values)] = 1
+        buffer[self.knight_offsets] = [player.num_knights_played for player in players]
+
+    #values of the one-hot leaves of a player, in the order of ARRAY_LEAVES, SCALAR_LEAVES and then SELF_LEAVES or OPPONENT_LEAVES
+    def player_values(self, values: list, player, is_self: bool):
+        values += [
+            player.bank_trade_rates,
+            player.resources,
+            #the row for 7 is left out
+            player.resources_gen[:10].ravel(),
+            player.resources_block[:10].ravel()
+        ]
+        if is_self:
+            victory_points = min(player.victory_points, 10)
+        else:
+            victory_points = player.victory_points - int(player.dev_cards[DEV_VICTORY_POINT])
+        values.append([
+            player.rem_settlements,
+            player.rem_cities,
+            player.rem_roads,
+            player.longest_road_len,
+            1 if player.has_longest_road else 0,
+            1 if player.has_largest_army else 0,
+            victory_points
+        ])
+        if is_self:
+            values += [player.dev_cards, player.dev_cards_cur_turn]
+        else:
+            values.append([player.n_dev_cards])
+
+@lru_cache(maxsize=None)
+def get_obs_writer(num_players: int) -> ObsWriter:
+    return ObsWriter(get_obs_space(num_players), num_players)
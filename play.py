@@ -0,0 +1,163 @@
+import json
+import multiprocessing as mp
+from time import perf_counter, perf_counter_ns
+
+import click
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+from actions import *
+from game import Game
+from caten_env import CatanEnv
+from action_index import get_action_index
+
+'''
+throughput harness: plays seeded games with built-in agents and reports how fast the engine runs
+    catanatron-play --num 100 --players random,random,greedy,greedy --workers 4 --output summary.json
+game i is played with seed + i, so a run is reproducible from its options
+step latency is the time spent in Game.step only, the agents are not timed
+'''
+
+#uniformly random legal action
+class RandomAgent:
+    def __init__(self, seed):
+        self.random = np.random.default_rng(seed)
+
+    def act(self, game: Game):
+        return game.action_from_index(self.random.choice(game.legal_actions()))
+
+#samples the MultiDiscrete action space with the per component mask, like a policy on CatanEnv would
+#the mask is not exact, so some of these actions are rejected
+class MaskAgent:
+    def __init__(self, seed):
+        self.env = None
+        self.seed = seed
+
+    def act(self, game: Game):
+        if self.env is None:
+            self.env = CatanEnv(game.player_names)
+            self.space = self.env.action_space(game.player_names[0])
+            self.space.seed(self.seed)
+        self.env.game = game
+        return self.env.get_action(self.space.sample(game.get_action_mask()))
+
+#builds whenever it can, most valuable first, otherwise plays randomly
+class GreedyAgent(RandomAgent):
+    PRIORITY = [
+        ActionType.city,
+        ActionType.settlement,
+        ActionType.buy_dev,
+        ActionType.road,
+        ActionType.play_dev
+    ]
+
+    def act(self, game: Game):
+        legal = game.legal_actions()
+        types = get_action_index(len(game.players)).type_ids[legal]
+        for action_type in GreedyAgent.PRIORITY:
+            choices = legal[types == ACTION_TYPES.index(action_type)]
+            if len(choices) > 0:
+                return game.action_from_index(self.random.choice(choices))
+        return game.action_from_index(self.random.choice(legal))
+
+AGENTS = {
+    'random': RandomAgent,
+    'mask': MaskAgent,
+    'greedy': GreedyAgent
+}
+
+#plays one game, returns its stats and the latency of every step in ns
+def play_game(seed: int, agent_names: list[str], max_steps: int):
+    player_names = [f'{name}_{i}' for i, name in enumerate(agent_names)]
+    game = Game(player_names, seed=seed)
+    agents = [AGENTS[name](seed * len(agent_names) + i) for i, name in enumerate(agent_names)]
+    latencies = np.zeros((max_steps,), dtype=np.int64)
+    steps = 0
+    rejected = 0
+    while game.winner is None and steps < max_steps:
+        action = agents[game.get_cur_player().index].act(game)
+        start = perf_counter_ns()
+        r = game.step(action)
+        latencies[steps] = perf_counter_ns() - start
+        steps += 1
+        rejected += not r
+    return {
+        'seed': seed,
+        'steps': steps,
+        'rejected': rejected,
+        'winner': None if game.winner is None else game.winner.index,
+        'truncated': game.winner is None
+    }, latencies[:steps]
+
+def play_game_star(args):
+    return play_game(*args)
+
+def summarize(results, latencies, seconds: float, num_players: int):
+    steps = sum(result['steps'] for result in results)
+    rejected = sum(result['rejected'] for result in results)
+    latencies = np.concatenate(latencies) if len(latencies) > 0 else np.zeros((0,))
+    return {
+        'games': len(results),
+        'seconds': seconds,
+        'games_per_sec': len(results) / seconds,
+        'steps_per_sec': steps / seconds,
+        'steps': steps,
+        'rejected_share': rejected / steps if steps else 0.0,
+        'mean_game_length': steps / len(results) if results else 0.0,
+        'truncated': sum(result['truncated'] for result in results),
+        'step_latency_p50_us': float(np.percentile(latencies, 50)) / 1000 if len(latencies) else 0.0,
+        'step_latency_p99_us': float(np.percentile(latencies, 99)) / 1000 if len(latencies) else 0.0,
+        'wins': [sum(result['winner'] == i for result in results) for i in range(num_players)]
+    }
+
+def run(num: int, agent_names: list[str], seed: int, workers: int, max_steps: int):
+    jobs = [(seed + i, agent_names, max_steps) for i in range(num)]
+    start = perf_counter()
+    if workers > 1:
+        with mp.get_context().Pool(workers) as pool:
+            played = pool.map(play_game_star, jobs)
+    else:
+        played = [play_game(*job) for job in jobs]
+    seconds = perf_counter() - start
+
+    results = [result for result, _ in played]
+    summary = summarize(results, [latencies for _, latencies in played], seconds, len(agent_names))
+    summary.update({'players': agent_names, 'seed': seed, 'workers': workers, 'max_steps': max_steps})
+    return summary, results
+
+@click.command()
+@click.option('-n', '--num', default=10, show_default=True, help='number of games')
+@click.option('--players', default='random,random,random,random', show_default=True,
+    help=f'comma separated agents, one per seat ({", ".join(AGENTS)})')
+@click.option('--seed', default=0, show_default=True, help='seed of the first game, game i uses seed + i')
+@click.option('--workers', default=1, show_default=True, help='processes to spread the games over')
+@click.option('--max-steps', default=100000, show_default=True, help='steps after which a game is cut off')
+@click.option('--output', type=click.Path(dir_okay=False), default=None, help='write the summary (and every game) as json')
+def simulate(num, players, seed, workers, max_steps, output):
+    agent_names = players.split(',')
+    for name in agent_names:
+        if name not in AGENTS:
+            raise click.BadParameter(f'unknown agent {name}, pick from {", ".join(AGENTS)}', param_hint='--players')
+
+    summary, results = run(num, agent_names, seed, workers, max_steps)
+
+    table = Table(title=f'{num} games, {players}')
+    table.add_column('metric')
+    table.add_column('value', justify='right')
+    table.add_row('games/sec', f'{summary["games_per_sec"]:.2f}')
+    table.add_row('steps/sec', f'{summary["steps_per_sec"]:.0f}')
+    table.add_row('rejected steps', f'{summary["rejected_share"]:.1%}')
+    table.add_row('mean game length', f'{summary["mean_game_length"]:.1f}')
+    table.add_row('truncated games', str(summary['truncated']))
+    table.add_row('step latency p50', f'{summary["step_latency_p50_us"]:.1f} us')
+    table.add_row('step latency p99', f'{summary["step_latency_p99_us"]:.1f} us')
+    table.add_row('wins by seat', ' '.join(str(wins) for wins in summary['wins']))
+    Console().print(table)
+
+    if output is not None:
+        with open(output, 'w') as f:
+            json.dump({'summary': summary, 'games': results}, f, indent=2)
+
+if __name__ == '__main__':
+    simulate()
@@ -1,10 +1,43 @@
 from globals import *
-from copy import copy
 import numpy as np
+from journal import NULL_JOURNAL
+from zobrist import ZOBRIST
 
 
 class Player:
-    def __init__(self, name, index):
+    #every per player value lives in a slot, counts are fixed-index int arrays
+    #(resources and bank_trade_rates by RESOURCE_TYPES_LIST, dev cards by DEV_TYPES_LIST)
+    __slots__ = (
+        'name',
+        'index',
+        'available_roads',
+        'available_settlements',
+        'available_cities',
+        'bank_trade_rates',
+        'resources',
+        'resources_gen',
+        'resources_block',
+        'rem_settlements',
+        'rem_cities',
+        'rem_roads',
+        'n_settlements',
+        'n_cities',
+        'dev_cards',
+        'dev_cards_cur_turn',
+        'road_dev_count',
+        'victory_points',
+        'longest_road_len',
+        'num_knights_played',
+        'has_longest_road',
+        'has_largest_army',
+        'roads',
+        'n_resources',
+        'n_dev_cards',
+        'zobrist'
+    )
+    #resources_gen and resources_block are (11, 5) views into the game's per player production tensors (see ROLL_ROWS)
+    #a player made on its own gets its own matrices
+    def __init__(self, name, index, resources_gen=None, resources_block=None):
         self.name = name
         self.index = index
 
@@ -12,19 +45,14 @@ class Player:
         self.available_settlements = np.zeros((54,), dtype=np.int8)
         self.available_cities = np.zeros((54,), dtype=np.int8)
 
-        self.bank_trade_rates = dict()
-        self.resources: dict[Resource, int] = dict()
-        for resource in Resource:
-            self.bank_trade_rates[resource] = 4
-            self.resources[resource] = 0
-
-        self.resources_gen: dict[int, dict[Resource, int]] = dict()
-        self.resources_block: dict[int, dict[Resource, int]] = dict()
-        for roll in range(2, 13):
-            if roll == 7:
-                continue
-            self.resources_gen[roll] = copy(self.resources)
-            self.resources_block[roll] = copy(self.resources)
+        self.bank_trade_rates = np.full((5,), 4, dtype=np.int32)
+        self.resources = np.zeros((5,), dtype=np.int32)
+        #cached totals of resources and dev_cards
+        self.n_resources = 0
+        self.n_dev_cards = 0
+
+        self.resources_gen = np.zeros((11, 5), dtype=np.int32) if resources_gen is None else resources_gen
+        self.resources_block = np.zeros((11, 5), dtype=np.int32) if resources_block is None else resources_block
         
         self.rem_settlements = 5
         self.rem_cities = 4
@@ -33,11 +61,8 @@ class Player:
         self.n_settlements = 0
         self.n_cities = 0
 
-        self.dev_cards: dict[DevType, int] = dict()
-        self.dev_cards_cur_turn = dict()
-        for dev_type in DevType:
-            self.dev_cards[dev_type] = 0
-            self.dev_cards_cur_turn[dev_type] = 0
+        self.dev_cards = np.zeros((5,), dtype=np.int32)
+        self.dev_cards_cur_turn = np.zeros((5,), dtype=np.int32)
 
         self.road_dev_count = 0
 
@@ -50,37 +75,121 @@ class Player:
         #speeds up longest road computation
         self.roads = []
 
-    def can_afford(self, cost: dict[Resource, int]):
-        for resource in Resource:
-            if self.resources[resource] < cost.get(resource, 0):
-                return False
-        return True
-    
-    def pay_cost(self, cost: dict[Resource, int]):
-        for resource in Resource:
-            self.resources[resource] -= cost.get(resource, 0)
-
-    def reset_resource_block(self):
-        for roll in range(2, 13):
-            if roll == 7:
-                continue
-            for resource in Resource:
-                self.resources_block[roll][resource] = 0
-    
+        #hash of the hand and dev cards, kept up to date by the methods that change them (see zobrist.py)
+        self.zobrist = 0
+
+    #copy of the mutable state, used by Game.clone()
+    def copy(self, resources_gen=None, resources_block=None):
+        player = Player.__new__(Player)
+        player.name = self.name
+        player.index = self.index
+
+        player.available_roads = self.available_roads.copy()
+        player.available_settlements = self.available_settlements.copy()
+        player.available_cities = self.available_cities.copy()
+
+        player.bank_trade_rates = self.bank_trade_rates.copy()
+        player.resources = self.resources.copy()
+        player.n_resources = self.n_resources
+        player.n_dev_cards = self.n_dev_cards
+
+        player.resources_gen = self.resources_gen.copy() if resources_gen is None else resources_gen
+        player.resources_block = self.resources_block.copy() if resources_block is None else resources_block
+
+        player.rem_settlements = self.rem_settlements
+        player.rem_cities = self.rem_cities
+        player.rem_roads = self.rem_roads
+        player.n_settlements = self.n_settlements
+        player.n_cities = self.n_cities
+
+        player.dev_cards = self.dev_cards.copy()
+        player.dev_cards_cur_turn = self.dev_cards_cur_turn.copy()
+        player.road_dev_count = self.road_dev_count
+
+        player.victory_points = self.victory_points
+        player.longest_road_len = self.longest_road_len
+        player.num_knights_played = self.num_knights_played
+        player.has_longest_road = self.has_longest_road
+        player.has_largest_army = self.has_largest_army
+        player.roads = self.roads.copy()
+        player.zobrist = self.zobrist
+        return player
+
+    #cost is a vector indexed like resources
+    def can_afford(self, cost: np.ndarray):
+        return (self.resources >= cost).all()
+
+    def pay_cost(self, cost: np.ndarray, journal=NULL_JOURNAL):
+        self.add_resources(-cost, journal)
+
+    def add_resources(self, resources: np.ndarray, journal=NULL_JOURNAL):
+        keys = ZOBRIST.hand[self.index]
+        for resource in np.flatnonzero(resources):
+            count = int(self.resources[resource])
+            self.zobrist ^= keys[resource][count] ^ keys[resource][count + int(resources[resource])]
+        journal.add_array(self.resources, resources)
+        self.n_resources += int(resources.sum())
+
+    #brings n_resources and the hash up to date after resources was written directly (by BatchGame), old is the hand before
+    def resources_written(self, old: np.ndarray):
+        keys = ZOBRIST.hand[self.index]
+        for resource in np.flatnonzero(self.resources != old):
+            self.zobrist ^= keys[resource][old[resource]] ^ keys[resource][self.resources[resource]]
+        self.n_resources = int(self.resources.sum())
+
+    def add_resource(self, resource: int, amount: int, journal=NULL_JOURNAL):
+        keys = ZOBRIST.hand[self.index][resource]
+        count = int(self.resources[resource])
+        self.zobrist ^= keys[count] ^ keys[count + amount]
+        journal.add(self.resources, resource, amount)
+        self.n_resources += amount
+
+    def add_dev_card(self, dev_type: int, amount: int, journal=NULL_JOURNAL):
+        keys = ZOBRIST.dev[self.index][dev_type]
+        count = int(self.dev_cards[dev_type])
+        self.zobrist ^= keys[count] ^ keys[count + amount]
+        journal.add(self.dev_cards, dev_type, amount)
+        self.n_dev_cards += amount
+
+    def add_dev_card_cur_turn(self, dev_type: int, amount: int, journal=NULL_JOURNAL):
+        keys = ZOBRIST.cur_turn[self.index][dev_type]
+        count = int(self.dev_cards_cur_turn[dev_type])
+        self.zobrist ^= keys[count] ^ keys[count + amount]
+        journal.add(self.dev_cards_cur_turn, dev_type, amount)
+
+    def clear_dev_cards_cur_turn(self, journal=NULL_JOURNAL):
+        for dev_type in np.flatnonzero(self.dev_cards_cur_turn):
+            self.zobrist ^= ZOBRIST.cur_turn[self.index][dev_type][self.dev_cards_cur_turn[dev_type]]
+            journal.set(self.dev_cards_cur_turn, dev_type, 0)
+
+    def set_road_dev_count(self, count: int):
+        keys = ZOBRIST.road_dev[self.index]
+        self.zobrist ^= keys[self.road_dev_count] ^ keys[count]
+        self.road_dev_count = count
+
+    def add_knight(self):
+        keys = ZOBRIST.knights[self.index]
+        self.zobrist ^= keys[self.num_knights_played] ^ keys[self.num_knights_played + 1]
+        self.num_knights_played += 1
+
+    #playable now, cards bought this turn cant be played
+    def can_play_dev_card(self, dev_type: int):
+        return self.dev_cards[dev_type] > self.dev_cards_cur_turn[dev_type]
+
     def calculate_victory_points(self):
         victory_points = 0
         victory_points += self.n_settlements * 1
         victory_points += self.n_cities * 2
         victory_points += 2 if self.has_largest_army else 0
         victory_points += 2 if self.has_longest_road else 0
-        victory_points += self.dev_cards[DevType.victory_point] * 1
+        victory_points += int(self.dev_cards[DEV_VICTORY_POINT]) * 1
         
         self.victory_points = victory_points
 
     def to_json_obj(self):
         return {
-            'resources': {resource.value: count for resource, count in self.resources.items()},
-            'dev_cards': {card.value: count for card, count in self.dev_cards.items()},
+            'resources': {resource.value: int(count) for resource, count in zip(RESOURCE_TYPES_LIST, self.resources)},
+            'dev_cards': {card.value: int(count) for card, count in zip(DEV_TYPES_LIST, self.dev_cards)},
             'available_roads': [bool(i) for i in self.available_roads],
             'available_settlements': [bool(i) for i in self.available_settlements],
             'available_cities': [bool(i) for i in self.available_cities]
@@ -89,20 +198,11 @@ class Player:
     def get_obs(self, player_idx):
         obs = dict()
 
-        obs['bank_trade_rates'] = np.zeros((5,), dtype=np.int32)
-        for i, value in enumerate(self.bank_trade_rates.values()):
-            obs['bank_trade_rates'][i] = value
-        obs['resources'] = np.zeros((5,), dtype=np.int32)
-        for i, value in enumerate(self.resources.values()):
-            obs['resources'][i] = value
-        obs['resources_gen'] = np.zeros((10, 5), dtype=np.int32)
-        for i, values in enumerate(self.resources_gen.values()):
-            for j, value in enumerate(values.values()):
-                obs['resources_gen'][i][j] = value
-        obs['resources_block'] = np.zeros((10, 5), dtype=np.int32)
-        for i, values in enumerate(self.resources_block.values()):
-            for j, value in enumerate(values.values()):
-                obs['resources_block'][i][j] = value
+        obs['bank_trade_rates'] = self.bank_trade_rates.copy()
+        obs['resources'] = self.resources.copy()
+        #views, the row for 7 is left out
+        obs['resources_gen'] = self.resources_gen[:10]
+        obs['resources_block'] = self.resources_block[:10]
         obs['rem_settlements'] = self.rem_settlements
         obs['rem_cities'] = self.rem_cities
         obs['rem_roads'] = self.rem_roads
@@ -112,15 +212,11 @@ class Player:
         obs['has_largest_army'] = 1 if self.has_largest_army else 0
 
         if self.index == player_idx:
-            obs['dev_cards'] = np.zeros((5), dtype=np.int32)
-            for i, value in enumerate(self.dev_cards.values()):
-                obs['dev_cards'][i] = value
-            obs['dev_cards_cur_turn'] = np.zeros((5), dtype=np.int32)
-            for i, value in enumerate(self.dev_cards_cur_turn.values()):
-                obs['dev_cards_cur_turn'][i] = value
+            obs['dev_cards'] = self.dev_cards.copy()
+            obs['dev_cards_cur_turn'] = self.dev_cards_cur_turn.copy()
             obs['victory_points'] = min(self.victory_points, 10)
         else:
-            obs['num_dev_cards'] = sum(self.dev_cards.values())
-            obs['victory_points'] = self.victory_points - self.dev_cards[DevType.victory_point]
+            obs['num_dev_cards'] = self.n_dev_cards
+            obs['victory_points'] = self.victory_points - int(self.dev_cards[DEV_VICTORY_POINT])
         
-        return obs
\ No newline at end of file
+        return obs
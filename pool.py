@@ -0,0 +1,155 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import traceback
+import numpy as np
+
+from caten_env import CatanVecEnv
+
+'''
+pool of worker processes, each stepping its own CatanVecEnv
+observations, masks, rewards, dones and actions live in shared memory, a worker's env is built on its rows
+so the games write straight into them, nothing is copied
+the pipes only carry the commands ('reset', 'step', 'close') and an acknowledgement, nothing is pickled per step
+
+games are sharded by worker, worker w owns rows w * games_per_worker to (w + 1) * games_per_worker
+worker seeds are spawned from one SeedSequence and every reset spawns the next one, so a pool is reproducible from its own seed
+'''
+class CatanEnvPool:
+    def __init__(self, player_names: list[str], num_workers: int, games_per_worker: int, seed=None, context=None):
+        self.player_names = player_names
+        self.num_workers = num_workers
+        self.games_per_worker = games_per_worker
+        self.num_envs = num_workers * games_per_worker
+        self.seeds = np.random.SeedSequence(seed).spawn(num_workers)
+
+        #sizes of the shared buffers come from a local env
+        env = CatanVecEnv(1, player_names, seed=0)
+        self._flat_obs_space = env.observation_space()
+        self._action_space = env.action_space()
+        n = self.num_envs
+        self.specs = {
+            'obs': ((n,) + self._flat_obs_space.shape, self._flat_obs_space.dtype),
+            'mask': ((n, self._action_space.n), np.dtype(bool)),
+            'rewards': ((n, len(player_names)), np.dtype(np.float32)),
+            'dones': ((n,), np.dtype(bool)),
+            'actions': ((n,), np.dtype(np.int64))
+        }
+        self.shms: dict[str, shared_memory.SharedMemory] = dict()
+        self.buffers: dict[str, np.ndarray] = dict()
+        for name, (shape, dtype) in self.specs.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+            self.shms[name] = shm
+            self.buffers[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+        ctx = mp.get_context(context)
+        self.pipes = []
+        self.workers = []
+        for w in range(num_workers):
+            parent, child = ctx.Pipe()
+            shm_names = {name: shm.name for name, shm in self.shms.items()}
+            process = ctx.Process(
+                target=worker,
+                args=(child, player_names, games_per_worker, self.seeds[w], w, shm_names, self.specs),
+                daemon=True
+            )
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.workers.append(process)
+        self.closed = False
+        self.wait()
+        self.reset()
+
+    def observation_space(self):
+        return self._flat_obs_space
+
+    def action_space(self):
+        return self._action_space
+
+    def send(self, command: str):
+        for pipe in self.pipes:
+            pipe.send(command)
+
+    def wait(self):
+        for pipe in self.pipes:
+            r = pipe.recv()
+            if r != 'ok':
+                self.close()
+                raise RuntimeError(f'env pool worker failed:\n{r}')
+
+    #obs and mask of every game, the arrays are the shared buffers and change with every step
+    def reset(self):
+        self.send('reset')
+        self.wait()
+        return self.buffers['obs'], self.buffers['mask']
+
+    #actions: one action index per game, same layout as CatanVecEnv.step()
+    def step(self, actions: np.ndarray):
+        self.buffers['actions'][:] = actions
+        self.send('step')
+        self.wait()
+        buffers = self.buffers
+        return buffers['obs'], buffers['mask'], buffers['rewards'], buffers['dones']
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for pipe in self.pipes:
+            try:
+                pipe.send('close')
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for pipe in self.pipes:
+            pipe.close()
+        #views into the shared memory have to go before it can be closed
+        self.buffers = dict()
+        for shm in self.shms.values():
+            shm.close()
+            shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if hasattr(self, 'closed'):
+            self.close()
+
+def worker(pipe, player_names, num_games, seed, w, shm_names, specs):
+    shms = {name: shared_memory.SharedMemory(name=shm_name) for name, shm_name in shm_names.items()}
+    rows = slice(w * num_games, (w + 1) * num_games)
+    buffers = {
+        name: np.ndarray(shape, dtype=dtype, buffer=shms[name].buf)[rows]
+        for name, (shape, dtype) in specs.items()
+    }
+    out = {name: buffers[name] for name in ('obs', 'mask', 'rewards', 'dones')}
+    env = None
+    try:
+        pipe.send('ok')
+        while True:
+            command = pipe.recv()
+            if command == 'close':
+                break
+            if command == 'reset':
+                #every reset starts new games, drawn from the worker's own seed stream
+                env = CatanVecEnv(num_games, player_names, seed=seed.spawn(1)[0], out=out)
+            else:
+                env.step(buffers['actions'])
+            pipe.send('ok')
+    except (EOFError, KeyboardInterrupt):
+        pass
+    except Exception:
+        pipe.send(traceback.format_exc())
+    finally:
+        #the env writes into the shared memory too, so it has to go before it is closed
+        buffers = out = env = None
+        for shm in shms.values():
+            shm.close()
+        pipe.close()
@@ -0,0 +1,121 @@
+from collections import defaultdict
+from time import perf_counter_ns
+
+from actions import ActionType
+
+'''
+opt in profiler for a single game, see Game.enable_profiling() and Game.stats()
+profiling works by shadowing the game's methods with timed wrappers on the instance,
+so a game that is not profiled runs the plain class methods and pays nothing
+
+every action dispatched by step_start / step_main is counted and timed under its action type,
+the hot helpers under their method name, and every rejected action is counted under a reason
+the road search runs inside the board, its entry points are shadowed on the game's board the same way
+'''
+class Profiler:
+    METHODS = (
+        'get_action_mask',
+        'get_obs',
+        'check_longest_road',
+        'gen_resources',
+        'check_victory'
+    )
+    #merging a new road into its network and splitting the networks a settlement cuts through
+    BOARD_METHODS = (
+        'add_road',
+        'split_roads'
+    )
+    STEP_FNS = ('step_start', 'step_main')
+
+    def __init__(self):
+        self.calls: dict[str, int] = defaultdict(int)
+        self.ns: dict[str, int] = defaultdict(int)
+        self.rejected: dict[str, int] = defaultdict(int)
+
+    def attach(self, game):
+        for name in Profiler.METHODS:
+            setattr(game, name, self.timed(name, getattr(game, name)))
+        for name in Profiler.BOARD_METHODS:
+            setattr(game.board, name, self.timed(name, getattr(game.board, name)))
+        for name in Profiler.STEP_FNS:
+            setattr(game, name, self.timed_step(game, getattr(game, name)))
+        #step_fn still points at the plain method
+        game.step_fn = getattr(game, game.step_fn.__name__)
+
+    @staticmethod
+    def detach(game):
+        for name in Profiler.METHODS + Profiler.STEP_FNS:
+            game.__dict__.pop(name, None)
+        for name in Profiler.BOARD_METHODS:
+            game.board.__dict__.pop(name, None)
+        game.step_fn = getattr(game, game.step_fn.__name__)
+
+    def timed(self, name: str, method):
+        calls = self.calls
+        ns = self.ns
+        def wrapper(*args, **kwargs):
+            start = perf_counter_ns()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                ns[name] += perf_counter_ns() - start
+                calls[name] += 1
+        wrapper.__name__ = method.__name__
+        return wrapper
+
+    def timed_step(self, game, step_fn):
+        calls = self.calls
+        ns = self.ns
+        rejected = self.rejected
+        def wrapper(action):
+            start = perf_counter_ns()
+            r = step_fn(action)
+            name = action.type.value
+            ns[name] += perf_counter_ns() - start
+            calls[name] += 1
+            if not r:
+                rejected[rejection_reason(game, action)] += 1
+            return r
+        wrapper.__name__ = step_fn.__name__
+        return wrapper
+
+    def stats(self):
+        return {
+            'calls': dict(self.calls),
+            'ns': dict(self.ns),
+            'rejected': dict(self.rejected)
+        }
+
+#why an action was rejected, worked out after the fact (a rejected action leaves the game unchanged)
+#    queue: the action queue asks for another action
+#    not_forced: an action that can only be played when the queue asks for it
+#    <action type>:precondition: the action cant be taken at all right now (not rolled, cant afford, ...)
+#    <action type>:arguments: the action can be taken, but not with these arguments
+def rejection_reason(game, action):
+    queued = game.action_queue[0] if len(game.action_queue) > 0 else None
+    if queued is not None and action.type != queued:
+        return 'queue'
+    if queued is None and action.type in game.FORCED_ACTION_TYPES:
+        return 'not_forced'
+
+    starting = game.starting
+    match action.type:
+        case ActionType.end_turn:
+            allowed = game.can_end_turn()
+        case ActionType.settlement:
+            allowed = game.can_place_settlement(starting=starting)
+        case ActionType.city:
+            allowed = game.can_place_city()
+        case ActionType.road:
+            allowed = game.can_place_road(starting=starting)
+        case ActionType.play_dev:
+            allowed = game.can_play_dev()
+        case ActionType.buy_dev:
+            allowed = game.can_buy_dev()
+        case ActionType.roll:
+            allowed = game.can_roll()
+        case ActionType.bank_trade:
+            allowed = game.can_bank_trade()
+        case _:
+            allowed = True
+    return f'{action.type.value}:{"arguments" if allowed else "precondition"}'
@@ -0,0 +1,97 @@
+import numpy as np
+
+'''
+randomness of a game, one independent stream per kind of decision
+    board: tile, number and port layout
+    dev: order of the dev deck
+    dice: rolls, drawn DICE_BATCH at a time
+    steal: which card is stolen
+the streams are spawned from the game seed, so a draw from one never shifts the others
+two games with the same seed get the same layout, deck and rolls whatever is played in them,
+which makes agent comparisons on common random numbers possible
+
+the game records the GameRandom in its undo journal, the plain attributes (the roll buffer and its position)
+are snapshotted with the step, the generator states are saved before every draw from them
+
+a copy holds the dice and steal streams as their states (dice_state, steal_state) with the generator set to None,
+building a generator costs more than the rest of a Game.clone(), and most copies in a search never draw from both
+'''
+class GameRandom:
+    DICE_BATCH = 256
+
+    def __init__(self, seed: int | np.random.SeedSequence):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        board, dev, dice, steal = seed.spawn(4)
+        self.board = np.random.default_rng(board)
+        self.dev = np.random.default_rng(dev)
+        self.dice = np.random.default_rng(dice)
+        self.steal = np.random.default_rng(steal)
+        self.dice_state = None
+        self.steal_state = None
+
+        #pre-drawn rolls, replaced (never written in place) when used up so copies can share them
+        self.rolls: list[int] = []
+        self.roll_idx = 0
+
+    #the board and dev streams are only drawn from while the game is set up, copies share them
+    def copy(self):
+        random = GameRandom.__new__(GameRandom)
+        random.__dict__.update(self.__dict__)
+        random.dice = random.steal = None
+        random.dice_state = self.dice_state if self.dice is None else self.dice.bit_generator.state
+        random.steal_state = self.steal_state if self.steal is None else self.steal.bit_generator.state
+        return random
+
+    #the generator of the dice or steal stream, a copy builds it from the saved state the first time it is used
+    #(inside a recorded step the journal snapshot puts the None back on undo, the saved state never changes)
+    def stream(self, name: str) -> np.random.Generator:
+        rng = getattr(self, name)
+        if rng is None:
+            rng = generator_from_state(getattr(self, name + '_state'))
+            setattr(self, name, rng)
+        return rng
+
+    #moves the dice and steal streams to a point drawn from random and drops the pre-drawn rolls,
+    #for copies that must not know the future of the original (see knowledge.py)
+    def scramble(self, random: np.random.Generator):
+        self.stream('dice').bit_generator.advance(int(random.integers(2 ** 63)))
+        self.stream('steal').bit_generator.advance(int(random.integers(2 ** 63)))
+        self.rolls = []
+        self.roll_idx = 0
+
+    def roll(self, journal) -> int:
+        if self.roll_idx == len(self.rolls):
+            dice = self.stream('dice')
+            journal.save_random(dice)
+            self.rolls = dice.integers(1, 7, size=(GameRandom.DICE_BATCH, 2)).sum(axis=1).tolist()
+            self.roll_idx = 0
+        roll_n = self.rolls[self.roll_idx]
+        self.roll_idx += 1
+        return roll_n
+
+    #index of a card drawn uniformly from a hand of counts
+    def steal_from(self, counts: np.ndarray, journal) -> int:
+        steal = self.stream('steal')
+        journal.save_random(steal)
+        card = int(steal.integers(counts.sum()))
+        for i, count in enumerate(counts.tolist()):
+            card -= count
+            if card < 0:
+                return i
+
+#seeding a fresh bit generator from os entropy is slow, so copies start
+#from a fixed seed sequence and then take over the saved state
+CLONE_SEED_SEQ = np.random.SeedSequence(0)
+
+def generator_from_state(state: dict):
+    bit_generator = getattr(np.random, state['bit_generator'])(CLONE_SEED_SEQ)
+    bit_generator.state = state
+    return np.random.Generator(bit_generator)
+
+#n independent integer game seeds from one seed, for batches and worker pools
+#integers rather than SeedSequences so every game can still be replayed from its seed (see history.py)
+def spawn_seeds(seed: int | np.random.SeedSequence | None, n: int) -> list[int]:
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [int(child.generate_state(1, np.uint64)[0] >> 2) for child in seed.spawn(n)]
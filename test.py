@@ -1,9 +1,63 @@
 #worlds worst test cases
 
 import unittest
+import pickle
+import itertools
+import json
+import os
+import tempfile
+from click.testing import CliRunner
 from pettingzoo.test import api_test
+from gymnasium.spaces.utils import flatten
 
-from caten_env import CatanEnv
+from caten_env import CatanEnv, CatanVecEnv
+from game import Game
+from actions import *
+from history import GameHistory, replay
+from action_index import get_action_index
+from action_mask import ActionMask
+from batch import BatchGame
+from pool import CatanEnvPool
+from play import simulate, run
+from zobrist import full_hash
+from rng import GameRandom, spawn_seeds
+from journal import NULL_JOURNAL
+from events import Roll, Produce, Steal, Build, Robber, Monopoly, Victory
+from knowledge import Knowledge
+from board import Board
+from globals import *
+
+#random legal actions of whoever acts next in game, drawn from rng
+#stops after steps actions, once the game is won or once until(game) holds, the caller takes each action
+def random_actions(game: Game, rng: np.random.Generator, steps=100000, until=None):
+    for _ in range(steps):
+        if game.winner is not None or (until is not None and until(game)):
+            return
+        yield game.action_from_index(rng.choice(game.legal_actions()))
+
+def play_random(game: Game, rng: np.random.Generator, steps=100000, until=None):
+    for action in random_actions(game, rng, steps, until):
+        game.step(action)
+    return game
+
+#the same for an env, samples of space under env.action_mask()
+def random_env_actions(env: CatanEnv, space, steps: int):
+    for _ in range(steps):
+        if env.game.winner is not None:
+            return
+        yield space.sample(env.action_mask())
+
+def play_env(env: CatanEnv, space, steps: int):
+    for action in random_env_actions(env, space, steps):
+        env.step(action)
+
+#one random legal action per game of a batch, from its (games, actions) mask
+def random_batch_actions(random: np.random.Generator, masks: np.ndarray):
+    return np.array([random.choice(np.flatnonzero(mask)) for mask in masks])
+
+#in the main phase, rolled and with nothing queued
+def main_phase(game: Game):
+    return not game.starting and game.has_rolled and len(game.action_queue) == 0
 
 class TestCatanEnv(unittest.TestCase):
     def test_api(self):
@@ -28,5 +82,983 @@ class TestCatanEnv(unittest.TestCase):
         print(len(env.game_history))
 
 
+    def test_flat_actions(self):
+        api_test(CatanEnv(['a_0', 'b_1', 'c_2'], flat_actions=True))
+        env = CatanEnv(['a', 'b', 'c', 'd'], flat_actions=True)
+        env.reset(seed=1, options={'record_actions': True, 'checkpoint_every': None})
+        space = env.action_space('a')
+        space.seed(1)
+        for step, action in enumerate(random_env_actions(env, space, 3000)):
+            env.step(action)
+            #the history only records accepted actions, with an exact mask every sample is accepted
+            self.assertEqual(len(env.history), step + 1)
+
+    def test_auto_forced_info(self):
+        env = CatanEnv(['a', 'b'], flat_actions=True)
+        env.reset(seed=0, options={'auto_forced': True})
+        space = env.action_space('a')
+        space.seed(0)
+        forced = 0
+        for action in random_env_actions(env, space, 300):
+            env.step(action)
+            self.assertIs(env.infos['a']['forced_actions'], env.game.forced_actions)
+            forced += len(env.infos['b']['forced_actions'])
+        self.assertGreater(forced, 0)
+
+    #observe_into has to give exactly what gymnasium's flatten gives for the obs dicts
+    def test_observe_into_matches_flatten(self):
+        for names in (['a', 'b'], ['a', 'b', 'c'], ['a', 'b', 'c', 'd']):
+            env = CatanEnv(names)
+            env.reset(seed=len(names))
+            space = env.action_space('a')
+            space.seed(len(names))
+            buffer = np.full(env.observation_space('a').shape, 7.0)
+            for step, action in enumerate(random_env_actions(env, space, 1500)):
+                env.step(action)
+                if step % 10:
+                    continue
+                for i, agent in enumerate(names):
+                    expected = flatten(env._obs_space, env.game.get_obs(i))
+                    env.observe_into(buffer, agent)
+                    self.assertEqual(buffer.dtype, expected.dtype)
+                    self.assertEqual(buffer.tobytes(), expected.tobytes())
+
+
+class TestCatanVecEnv(unittest.TestCase):
+    def test_obs_layout_matches_catan_env(self):
+        names = ['a', 'b', 'c']
+        vec_env = CatanVecEnv(4, names, seed=2)
+        env = CatanEnv(names)
+        obs, mask = vec_env.reset(seed=2)
+        self.assertEqual(obs.shape, (4,) + env.observation_space('a').shape)
+        self.assertEqual(mask.shape, (4, vec_env.action_space().n))
+        random = np.random.default_rng(2)
+        for _ in range(300):
+            obs, mask, rewards, dones = vec_env.step(random_batch_actions(random, mask))
+            for i, game in enumerate(vec_env.batch.games):
+                env.game = game
+                np.testing.assert_array_equal(obs[i], flatten(env._obs_space, game.get_obs(game.get_cur_player().index)))
+
+    #given output arrays are written in place, like the rows of a pool's shared memory
+    def test_writes_into_out(self):
+        names = ['a', 'b', 'c']
+        plain = CatanVecEnv(4, names, seed=3)
+        n = plain.action_space().n
+        shared = {
+            'obs': np.full((6,) + plain.observation_space().shape, 7, dtype=plain.observation_space().dtype),
+            'mask': np.ones((6, n), dtype=bool),
+            'rewards': np.ones((6, 3), dtype=np.float32),
+            'dones': np.ones((6,), dtype=bool),
+        }
+        rows = slice(1, 5)
+        out = {name: array[rows] for name, array in shared.items()}
+        vec_env = CatanVecEnv(4, names, seed=3, out=out)
+        obs, mask = vec_env.obs, vec_env.batch.mask
+        self.assertTrue(np.shares_memory(obs, shared['obs']) and np.shares_memory(mask, shared['mask']))
+        np.testing.assert_array_equal(shared['obs'][rows], plain.obs)
+        np.testing.assert_array_equal(shared['mask'][rows], plain.batch.mask)
+        self.assertFalse(shared['dones'][rows].any())
+        random = np.random.default_rng(3)
+        for _ in range(200):
+            actions = random_batch_actions(random, shared['mask'][rows])
+            expected = plain.step(actions)
+            returned = vec_env.step(actions)
+            for name, expected_array, array in zip(('obs', 'mask', 'rewards', 'dones'), expected, returned):
+                self.assertIs(array, out[name])
+                np.testing.assert_array_equal(shared[name][rows], expected_array)
+        #the rows around are left alone
+        self.assertTrue((shared['obs'][[0, 5]] == 7).all() and shared['mask'][[0, 5]].all())
+
+        with self.assertRaises(ValueError):
+            CatanVecEnv(4, names, out={'mask': np.zeros((4, n), dtype=np.int8)})
+
+
+class TestCatanEnvPool(unittest.TestCase):
+    def test_workers_match_local_envs(self):
+        names = ['a', 'b', 'c']
+        seeds = np.random.SeedSequence(4).spawn(2)
+        envs = [CatanVecEnv(3, names, seed=seed.spawn(1)[0]) for seed in seeds]
+        with CatanEnvPool(names, num_workers=2, games_per_worker=3, seed=4) as pool:
+            obs, mask = pool.buffers['obs'], pool.buffers['mask']
+            random = np.random.default_rng(4)
+            for _ in range(100):
+                actions = random_batch_actions(random, mask)
+                obs, mask, rewards, dones = pool.step(actions)
+                for w, env in enumerate(envs):
+                    rows = slice(3 * w, 3 * w + 3)
+                    env_obs, env_mask, env_rewards, env_dones = env.step(actions[rows])
+                    np.testing.assert_array_equal(obs[rows], env_obs)
+                    np.testing.assert_array_equal(mask[rows], env_mask)
+                    np.testing.assert_array_equal(dones[rows], env_dones)
+            workers = pool.workers
+        self.assertTrue(all(not process.is_alive() for process in workers))
+
+
+class TestProfiler(unittest.TestCase):
+    def test_profiling(self):
+        game = Game(['a', 'b', 'c'], seed=0)
+        plain = Game(['a', 'b', 'c'], seed=0)
+        #nothing is shadowed until profiling is enabled
+        self.assertEqual(game.stats(), {'calls': {}, 'ns': {}, 'rejected': {}})
+        self.assertNotIn('step_main', game.__dict__)
+
+        game.enable_profiling()
+        self.assertFalse(game.step(EndTurnAction()))
+        rng = np.random.default_rng(0)
+        n_steps = 0
+        for action in random_actions(game, rng, 500):
+            self.assertTrue(game.step(action))
+            if action.type == ActionType.steal:
+                action = StealAction(plain.players[action.player.index])
+            plain.step(action)
+            n_steps += 1
+        self.assertFalse(game.step(MoveRobberAction(0)) if len(game.action_queue) == 0 else game.step(EndTurnAction()))
+        game.get_obs(0)
+        self.assertEqual(game.to_json_obj(), plain.to_json_obj())
+
+        stats = game.stats()
+        self.assertEqual(sum(stats['calls'][t.value] for t in ACTION_TYPES if t.value in stats['calls']), n_steps + 2)
+        self.assertEqual(stats['calls']['get_obs'], 1)
+        self.assertGreater(stats['calls']['gen_resources'], 0)
+        self.assertGreater(stats['ns']['roll'], 0)
+        #the road search inside the board is timed as well
+        self.assertEqual(stats['calls']['add_road'], int((game.board.edge_owner >= 0).sum()))
+        self.assertGreater(stats['ns']['add_road'], 0)
+        self.assertIn('split_roads', stats['calls'])
+        self.assertEqual(stats['rejected']['queue'], 1 + (len(game.action_queue) > 0))
+        self.assertEqual(sum(stats['rejected'].values()), 2)
+
+        #clones and pickles are not profiled
+        self.assertIsNone(game.clone().profiler)
+        self.assertNotIn('add_road', game.clone().board.__dict__)
+        self.assertIn('add_road', game.board.__dict__)
+        self.assertNotIn('step_main', pickle.loads(pickle.dumps(game)).__dict__)
+        self.assertNotIn('add_road', pickle.loads(pickle.dumps(game)).board.__dict__)
+
+        game.disable_profiling()
+        self.assertNotIn('step_main', game.__dict__)
+        self.assertNotIn('add_road', game.board.__dict__)
+        self.assertEqual(game.stats()['calls'], {})
+
+
+class TestPlay(unittest.TestCase):
+    def test_simulate(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'summary.json')
+            result = CliRunner().invoke(simulate, ['-n', '3', '--players', 'random,mask,greedy', '--seed', '5', '--output', output])
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open(output) as f:
+                data = json.load(f)
+        summary = data['summary']
+        self.assertEqual(summary['games'], 3)
+        self.assertEqual(summary['steps'], sum(game['steps'] for game in data['games']))
+        #only the mask agent can pick illegal actions
+        self.assertGreater(summary['rejected_share'], 0)
+        self.assertEqual(sum(summary['wins']) + summary['truncated'], 3)
+
+        #a run is reproducible from its options, also across processes
+        _, games = run(3, ['random', 'mask', 'greedy'], 5, 2, 100000)
+        self.assertEqual(games, data['games'])
+
+
+class TestBoard(unittest.TestCase):
+    def test_shared_topology(self):
+        a = Game(['a', 'b'], seed=0)
+        b = Game(['a', 'b'], seed=1)
+        self.assertIs(a.board.topology, b.board.topology)
+        self.assertIs(a.board.nodes, b.board.nodes)
+
+        a.step(SettlementAction(0))
+        self.assertEqual(a.board.node_owner[0], 0)
+        self.assertEqual(b.board.node_owner[0], -1)
+
+        a.board.reset(seed=0)
+        self.assertEqual(a.board.node_owner[0], -1)
+        self.assertTrue(a.board.node_available.all())
+
+    def test_obs_from_buffers(self):
+        g = Game(['a', 'b', 'c'], seed=0)
+        g.step(SettlementAction(0))
+        obs = g.board.get_obs(1, 3)
+        #owner 0 seen from player 1 is two seats ahead
+        self.assertEqual(obs['nodes'][0][2], 1)
+        self.assertEqual(obs['nodes'].sum(), 1)
+        self.assertEqual(obs['robber_tile'][g.board.robber], 1)
+        self.assertEqual(obs['tile_types'][g.board.robber][0], 1)
+
+
+class TestProduction(unittest.TestCase):
+    def setUp(self):
+        self.game = Game(['a', 'b'], seed=0)
+        board = self.game.board
+        #a tile with a number and the nodes around it
+        self.tile = next(i for i in range(19) if board.tile_number[i] > 0 and i != board.robber)
+        self.resource = board.tile_resource[self.tile]
+        self.roll = board.tile_number[self.tile]
+        nodes = board.topology.adj_tile_nodes[self.tile]
+        board.place_settlement(nodes[0], self.game.players[0], starting=True)
+        board.place_settlement(nodes[3], self.game.players[1], starting=True)
+
+    def test_players_view_game_tensors(self):
+        for game in [self.game, self.game.clone(), pickle.loads(pickle.dumps(self.game))]:
+            for i, player in enumerate(game.players):
+                self.assertTrue(np.shares_memory(player.resources_gen, game.resources_gen[i]))
+                self.assertTrue(np.shares_memory(player.get_obs(i)['resources_gen'], game.resources_gen))
+            self.assertTrue((game.resources_gen[:, ROLL_ROWS[self.roll], self.resource] > 0).all())
+
+    def test_bank_shortage(self):
+        game = self.game
+        game.resources[self.resource] = 1
+        game.gen_resources(self.roll)
+        #not enough for both, nobody gets any
+        self.assertEqual([player.resources[self.resource] for player in game.players], [0, 0])
+
+        game.resources_gen[1] = 0
+        game.gen_resources(self.roll)
+        #a single player gets what is left
+        self.assertEqual([player.resources[self.resource] for player in game.players], [1, 0])
+        self.assertEqual(game.resources[self.resource], 0)
+
+    def test_settling_next_to_robber_is_blocked(self):
+        game = self.game
+        board = game.board
+        board.move_robber(self.tile)
+        row = ROLL_ROWS[self.roll]
+        res = self.resource
+        self.assertEqual(list(game.resources_block[:, row, res]), [1, 1])
+        board.place_city(board.topology.adj_tile_nodes[self.tile][0], game.players[0])
+        self.assertEqual(list(game.resources_block[:, row, res]), [2, 1])
+        self.assertEqual(list(board.robber_impact()[self.tile] * 36), [2 * (6 - abs(7 - self.roll))] + [6 - abs(7 - self.roll)])
+
+    def test_tile_weights_match_board(self):
+        env = CatanEnv(['a', 'b', 'c'])
+        env.reset(seed=4)
+        space = env.action_space('a')
+        space.seed(4)
+        for action in random_env_actions(env, space, 2000):
+            env.step(action)
+            board = env.game.board
+            weights = np.zeros_like(board.tile_weights)
+            for tile in range(19):
+                for node in board.topology.adj_tile_nodes[tile]:
+                    if board.node_owner[node] >= 0:
+                        weights[tile, board.node_owner[node]] += board.node_level[node]
+            np.testing.assert_array_equal(board.tile_weights, weights)
+
+            #the robber blocks exactly its own tile
+            block = np.zeros_like(env.game.resources_block)
+            if board.tile_resource[board.robber] >= 0:
+                block[:, ROLL_ROWS[board.tile_number[board.robber]], board.tile_resource[board.robber]] = weights[board.robber]
+            np.testing.assert_array_equal(env.game.resources_block, block)
+
+
+class TestClone(unittest.TestCase):
+    def test_clone_evolves_identically(self):
+        env = CatanEnv(['a', 'b', 'c', 'd'])
+        env.reset(seed=3)
+        space = env.action_space('a')
+        space.seed(3)
+        play_env(env, space, 200)
+
+        clone = env.game.clone()
+        self.assertIs(clone.board.topology, env.game.board.topology)
+        for action in random_env_actions(env, space, 1000):
+            r = env.game.step(env.get_action(action))
+            #steal actions hold a player, map it to the clone's player
+            clone_action = env.get_action(action)
+            if clone_action.type == ActionType.steal:
+                clone_action.player = clone.players[clone_action.player.index]
+            self.assertEqual(clone.step(clone_action), r)
+            self.assertEqual(clone.to_json_obj(), env.game.to_json_obj())
+            self.assertEqual(str(clone.get_obs(0)), str(env.game.get_obs(0)))
+
+    def test_clone_is_independent(self):
+        g = Game(['a', 'b'], seed=0)
+        clone = g.clone()
+        clone.step(SettlementAction(0))
+        self.assertEqual(g.board.node_owner[0], -1)
+        self.assertEqual(g.players[0].rem_settlements, 5)
+        self.assertEqual(len(g.action_queue), 8)
+
+
+class TestUndo(unittest.TestCase):
+    def test_undo_restores_every_step(self):
+        env = CatanEnv(['a', 'b', 'c', 'd'])
+        for seed in range(2):
+            env.reset(seed=seed)
+            space = env.action_space('a')
+            space.seed(seed)
+            for action in random_env_actions(env, space, 1500):
+                action = env.get_action(action)
+                before = pickle.dumps(env.game)
+                r, record = env.game.step(action, record=True)
+                env.game.undo(record)
+                self.assertEqual(pickle.dumps(env.game), before)
+                self.assertEqual(env.game.step(action), r)
+
+    def test_undo_in_reverse_order(self):
+        env = CatanEnv(['a', 'b', 'c'])
+        env.reset(seed=5)
+        space = env.action_space('a')
+        space.seed(5)
+        start = pickle.dumps(env.game)
+        records = []
+        for action in random_env_actions(env, space, 400):
+            action = env.get_action(action)
+            records.append(env.game.step(action, record=True)[1])
+        for record in reversed(records):
+            env.game.undo(record)
+        self.assertEqual(pickle.dumps(env.game), start)
+
+
+class TestHistory(unittest.TestCase):
+    def test_replay_matches_game(self):
+        env = CatanEnv(['a', 'b', 'c', 'd'])
+        env.reset(seed=7, options={'record_actions': True, 'checkpoint_every': 25})
+        space = env.action_space('a')
+        space.seed(7)
+        states = [env.game.to_json_obj()]
+        for action in random_env_actions(env, space, 1500):
+            n = len(env.history)
+            env.step(action)
+            if len(env.history) > n:
+                states.append(env.game.to_json_obj())
+
+        self.assertEqual(len(states), len(env.history) + 1)
+        for k in [0, 1, 24, 25, 26, 60, len(env.history) // 2, len(env.history)]:
+            game = replay(env.history, upto=k)
+            self.assertEqual(game.to_json_obj(), states[k])
+        self.assertEqual(replay(env.history).get_obs(2).keys(), env.game.get_obs(2).keys())
+        self.assertEqual(str(replay(env.history).get_obs(2)), str(env.game.get_obs(2)))
+
+    def test_replay_without_checkpoints(self):
+        game = Game(['a', 'b'], seed=1)
+        history = GameHistory(game, checkpoint_every=None)
+        for action in [SettlementAction(0), RoadAction(0), SettlementAction(10)]:
+            if game.step(action):
+                history.record(game, action)
+        self.assertEqual(replay(history).to_json_obj(), game.to_json_obj())
+        self.assertLess(history.nbytes(), 64)
+
+
+class TestLegalActions(unittest.TestCase):
+    def test_legal_actions_are_exact(self):
+        for seed, n_players in [(0, 4), (1, 3), (2, 2)]:
+            game = Game(['a', 'b', 'c', 'd'][:n_players], seed=seed)
+            index = get_action_index(n_players)
+            rng = np.random.default_rng(seed)
+            for step, action in enumerate(random_actions(game, rng, 3000)):
+                legal = game.legal_actions()
+                self.assertGreater(len(legal), 0)
+                if step % 10 == 0:
+                    #every index is accepted exactly when it is listed
+                    for i in range(index.size):
+                        r, record = game.step(game.action_from_index(i), record=True)
+                        game.undo(record)
+                        self.assertEqual(bool(r), i in legal, (index.types[i], index.args[i]))
+                self.assertTrue(game.step(action))
+            if game.winner:
+                self.assertEqual(len(game.legal_actions()), 0)
+
+    #the enumerations have to hold exactly the trades, discards and inventions step accepts
+    def test_enumerations_are_exact(self):
+        def accepted(game, action):
+            r, record = game.step(action, record=True)
+            game.undo(record)
+            return bool(r)
+
+        def vectors(upper):
+            return [np.array(v) for v in itertools.product(*[range(int(u) + 1) for u in upper])]
+
+        def as_dict(vector):
+            return dict(zip(RESOURCE_TYPES_LIST, vector))
+
+        checked = set()
+        for seed in range(3):
+            game = Game(['a', 'b', 'c'], seed=seed)
+            rng = np.random.default_rng(seed)
+            brute_forced = 0
+            for action in random_actions(game, rng, 3000):
+                queued = game.action_queue[0] if len(game.action_queue) > 0 else None
+                if queued == ActionType.discard:
+                    discards = {tuple(v) for v in game.legal_discards()}
+                    player = game.to_discard[0]
+                    for v in vectors(player.resources):
+                        if v.sum() == game.discard_owed[0]:
+                            self.assertEqual(accepted(game, DiscardAction(as_dict(v))), tuple(v) in discards)
+                    checked.add(queued)
+                elif queued == ActionType.invention:
+                    inventions = {tuple(v) for v in game.legal_inventions()}
+                    for v in vectors([2] * 5):
+                        self.assertEqual(accepted(game, InventionAction(as_dict(v))), tuple(v) in inventions)
+                    checked.add(queued)
+                trade_in, trade_for = game.legal_bank_trades()
+                trades = {(tuple(a), tuple(b)) for a, b in zip(trade_in, trade_for)}
+                for a, b in list(trades)[:20]:
+                    self.assertTrue(accepted(game, BankTradeAction(as_dict(a), as_dict(b))))
+                units = (game.cur_player.resources // game.cur_player.bank_trade_rates).sum()
+                if queued is None and 0 < units <= 2 and game.has_rolled and game.cur_player.n_resources <= 9 and brute_forced < 3:
+                    brute_forced += 1
+                    #brute force every trade of up to the number of units the player can trade
+                    for a in vectors(game.cur_player.resources):
+                        for b in vectors(np.minimum(game.resources, units)):
+                            self.assertEqual(accepted(game, BankTradeAction(as_dict(a), as_dict(b))), (tuple(a), tuple(b)) in trades)
+                    checked.add(ActionType.bank_trade)
+                self.assertTrue(game.step(action))
+        self.assertEqual(checked, {ActionType.discard, ActionType.invention, ActionType.bank_trade})
+
+    def test_auto_forced(self):
+        names = ['a', 'b', 'c']
+        game = Game(names, seed=4, auto_forced=True)
+        plain = Game(names, seed=4)
+        history = GameHistory(game, checkpoint_every=None)
+        rng = np.random.default_rng(4)
+        n_forced = 0
+        for action in random_actions(game, rng, 1500):
+            #the agent only ever sees real choices
+            self.assertGreater(len(game.legal_actions()), 1)
+
+            before = pickle.dumps(game)
+            r, record = game.step(action, record=True)
+            game.undo(record)
+            self.assertEqual(pickle.dumps(game), before)
+
+            self.assertTrue(game.step(action))
+            history.record(game, action)
+            #the same game as playing the forced actions by hand
+            for played in [action] + game.forced_actions:
+                if played.type == ActionType.steal:
+                    played = StealAction(plain.players[played.player.index])
+                self.assertTrue(plain.step(played))
+            self.assertEqual(game.to_json_obj(), plain.to_json_obj())
+            n_forced += len(game.forced_actions)
+        self.assertGreater(n_forced, 0)
+        self.assertEqual(replay(history).to_json_obj(), game.to_json_obj())
+
+    #a forced action that step rejects would be forced again forever
+    def test_rejected_forced_action_raises(self):
+        game = Game(['a', 'b'], seed=0, auto_forced=True)
+        end_turn = get_action_index(2).offsets[ActionType.end_turn]
+        game.legal_actions = lambda: np.array([end_turn])
+        with self.assertRaises(RuntimeError):
+            game.resolve_forced()
+
+    def test_encode_decode(self):
+        game = Game(['a', 'b', 'c'], seed=0)
+        index = get_action_index(3)
+        for i in range(index.size):
+            self.assertEqual(index.encode(game.action_from_index(i), game), i)
+        self.assertEqual(index.encode(DiscardAction({Resource.ore: 2}), game), -1)
+        #bank trades only have an index at the player's rate and between two different resources
+        self.assertEqual(index.encode(BankTradeAction({Resource.wood: 3}, {Resource.ore: 1}), game), -1)
+        self.assertEqual(index.encode(BankTradeAction({Resource.wood: 8}, {Resource.ore: 2}), game), -1)
+        self.assertEqual(index.encode(BankTradeAction({Resource.wood: 4}, {Resource.wood: 1}), game), -1)
+        trade = BankTradeAction({Resource.wood: 4}, {Resource.ore: 1})
+        i = index.encode(trade, game)
+        self.assertGreaterEqual(i, 0)
+        decoded = index.decode(i, game)
+        nonzero = lambda counts: {resource: n for resource, n in counts.items() if n > 0}
+        self.assertEqual((nonzero(decoded.trade_in), nonzero(decoded.trade_for)), (trade.trade_in, trade.trade_for))
+
+    def test_partial_discard(self):
+        game = Game(['a', 'b'], seed=0)
+        #skip the setup
+        game.action_queue.clear()
+        game.step_fn = game.step_main
+        game.starting = False
+        player = game.players[1]
+        player.add_resources(np.full(5, 2))
+        game.has_rolled = True
+        game.handle_discards()
+        self.assertEqual(list(game.discard_owed), [5])
+        self.assertTrue(game.step(DiscardAction({Resource.brick: 2})))
+        self.assertFalse(game.step(DiscardAction({Resource.wood: 2, Resource.ore: 2})))
+        self.assertTrue(game.step(DiscardAction({Resource.wood: 2, Resource.ore: 1})))
+        self.assertEqual(len(game.to_discard), 0)
+        self.assertEqual(player.n_resources, 5)
+        self.assertEqual(player.resources.sum(), 5)
+
+
+#reference action mask, every buffer rebuilt from scratch
+def reference_action_mask(game):
+    fresh = ActionMask(len(game.players), game.board.robber)
+    if len(game.action_queue) > 0 and game.action_queue[0] == ActionType.steal:
+        for player in game.get_steal_candidates():
+            fresh.steal[player.index] = True
+    masks = fresh.get(game)
+    return [mask.copy() for mask in masks]
+
+
+class TestSteal(unittest.TestCase):
+    def test_rejects_foreign_players(self):
+        rng = np.random.default_rng(0)
+        for seed in itertools.count():
+            game = Game(['a', 'b', 'c'], seed=seed)
+            play_random(game, rng, until=lambda game: len(game.action_queue) > 0 and game.action_queue[0] == ActionType.steal)
+            if game.winner is None:
+                break
+
+        other = Game(['a', 'b', 'c', 'd', 'e'], seed=0)
+        before = pickle.dumps(game)
+        for action in [
+            create_action('steal', {'player': 'b'}),
+            StealAction(None),
+            StealAction(1),
+            StealAction(other.players[1]),
+            StealAction(other.players[4]),
+            StealAction(game.clone().players[1])
+        ]:
+            self.assertFalse(game.step(action))
+        self.assertEqual(pickle.dumps(game), before)
+
+
+class TestActionMask(unittest.TestCase):
+    #the masks are views of the game's own arrays, writing into them must not change the game
+    def test_mask_is_read_only(self):
+        game = Game(['a', 'b'], seed=0)
+        legal = game.legal_actions()
+        for starting in (True, False):
+            for mask in game.get_action_mask():
+                with self.assertRaises(ValueError):
+                    mask[:] = 0
+            np.testing.assert_array_equal(game.legal_actions(), legal)
+            rng = np.random.default_rng(0)
+            play_random(game, rng, until=lambda game: not game.starting)
+            legal = game.legal_actions()
+        self.assertEqual(pickle.loads(pickle.dumps(game)).get_action_mask()[0].flags.writeable, False)
+        self.assertEqual(game.clone().get_action_mask()[7].flags.writeable, False)
+
+    def test_incremental_mask_matches_rebuild(self):
+        env = CatanEnv(['a', 'b', 'c'])
+        env.reset(seed=2)
+        space = env.action_space('a')
+        space.seed(2)
+        for action in random_env_actions(env, space, 3000):
+            masks = env.game.get_action_mask()
+            for mask, expected in zip(masks, reference_action_mask(env.game)):
+                np.testing.assert_array_equal(mask, expected)
+
+            action = env.get_action(action)
+            before = [mask.copy() for mask in masks]
+            r, record = env.game.step(action, record=True)
+            env.game.get_action_mask()
+            env.game.undo(record)
+            for mask, expected in zip(env.game.get_action_mask(), before):
+                np.testing.assert_array_equal(mask, expected)
+            env.game.step(action)
+
+
+#reference longest road, every trail from every road
+def brute_longest_road(board, owner):
+    best = 0
+    def dfs(edge, node, used):
+        nonlocal best
+        best = max(best, len(used))
+        #cant continue through another player's settlement
+        if board.node_owner[node] >= 0 and board.node_owner[node] != owner:
+            return
+        for adj_edge in board.topology.adj_node_edges[node]:
+            if board.edge_owner[adj_edge] == owner and adj_edge not in used:
+                a, b = board.topology.adj_edge_nodes[adj_edge]
+                dfs(adj_edge, b if a == node else a, used | {adj_edge})
+    for edge in range(board.topology.n_edges):
+        if board.edge_owner[edge] == owner:
+            for node in board.topology.adj_edge_nodes[edge]:
+                dfs(edge, node, {edge})
+    return best
+
+
+class TestBatchGame(unittest.TestCase):
+    #the batch has to play exactly like separate games with the same seeds and actions
+    def test_matches_single_games(self):
+        names = ['a', 'b', 'c', 'd']
+        batch = BatchGame(6, names, seed=1)
+        games = [Game(names, seed=int(seed)) for seed in batch.seeds]
+        random = np.random.default_rng(1)
+        for _ in range(1500):
+            actions = random_batch_actions(random, batch.mask)
+            obs, mask, rewards, dones = batch.step(actions)
+            self.assertTrue(batch.accepted.all())
+            for i, game in enumerate(games):
+                self.assertTrue(game.step(game.action_from_index(actions[i])))
+                if dones[i]:
+                    self.assertEqual(rewards[i, game.winner.index], 1)
+                    games[i] = game = Game(names, seed=int(batch.seeds[i]))
+
+                np.testing.assert_array_equal(mask[i], game.legal_action_mask())
+                self.assertEqual(batch.games[i].to_json_obj(), game.to_json_obj())
+                for name in Board.STATE_BUFFERS:
+                    np.testing.assert_array_equal(obs[name][i], getattr(game.board, name))
+                for j, player in enumerate(game.players):
+                    np.testing.assert_array_equal(obs['resources'][i, j], player.resources)
+                    np.testing.assert_array_equal(obs['resources_gen'][i, j], player.resources_gen)
+                np.testing.assert_array_equal(obs['bank'][i], game.resources)
+                self.assertEqual(obs['cur_player'][i], game.get_cur_player().index)
+                #the numpy paths keep the per game counts and hashes up to date
+                self.assertEqual(batch.games[i].zobrist_hash(), game.zobrist_hash())
+                self.assertEqual([p.n_resources for p in batch.games[i].players], [p.n_resources for p in game.players])
+
+    def test_auto_reset(self):
+        batch = BatchGame(2, ['a', 'b'], seed=0)
+        seeds = batch.seeds.copy()
+        game = batch.games[1]
+        game.winner = game.players[1]
+        obs, mask, rewards, dones = batch.step(np.zeros(2, dtype=int))
+        np.testing.assert_array_equal(dones, [False, True])
+        np.testing.assert_array_equal(rewards, [[0, 0], [0, 1]])
+        self.assertEqual(batch.seeds[0], seeds[0])
+        self.assertNotEqual(batch.seeds[1], seeds[1])
+        #the new game writes straight into the stacks
+        new_game = batch.games[1]
+        self.assertIsNot(new_game, game)
+        self.assertTrue(new_game.step(SettlementAction(0)))
+        self.assertEqual(obs['node_owner'][1, 0], 0)
+        self.assertEqual(obs['node_owner'][0, 0], -1)
+
+
+class TestZobrist(unittest.TestCase):
+    def test_incremental_hash_matches_full_hash(self):
+        for seed, names in [(0, ['a', 'b', 'c', 'd']), (1, ['a', 'b'])]:
+            game = Game(names, seed=seed)
+            rng = np.random.default_rng(seed)
+            hashes = {game.zobrist_hash()}
+            for action in random_actions(game, rng, 2000):
+                before = game.zobrist_hash()
+                r, record = game.step(action, record=True)
+                self.assertEqual(game.zobrist_hash(), full_hash(game))
+                self.assertNotEqual(game.zobrist_hash(), before)
+                game.undo(record)
+                self.assertEqual(game.zobrist_hash(), before)
+                game.step(action)
+                hashes.add(game.zobrist_hash())
+            self.assertEqual(game.clone().zobrist_hash(), game.zobrist_hash())
+            self.assertEqual(pickle.loads(pickle.dumps(game)).zobrist_hash(), game.zobrist_hash())
+            self.assertGreater(len(hashes), 100)
+
+    #the hash only depends on the state, not on how it was reached
+    def test_transposition(self):
+        game = Game(['a', 'b'], seed=0)
+        rng = np.random.default_rng(0)
+        play_random(game, rng, until=main_phase)
+        hand = np.array([4, 4, 0, 0, 0]) - np.minimum(game.cur_player.resources, 4)
+        game.cur_player.add_resources(hand)
+        game.add_bank(-hand)
+
+        a = game.clone()
+        b = game.clone()
+        wood_for_ore = BankTradeAction({Resource.wood: 4}, {Resource.ore: 1})
+        brick_for_wheat = BankTradeAction({Resource.brick: 4}, {Resource.wheat: 1})
+        self.assertTrue(a.step(wood_for_ore) and a.step(brick_for_wheat))
+        self.assertNotEqual(a.zobrist_hash(), b.zobrist_hash())
+        self.assertTrue(b.step(brick_for_wheat) and b.step(wood_for_ore))
+        self.assertEqual(a.zobrist_hash(), b.zobrist_hash())
+        self.assertEqual(a.zobrist_hash(), full_hash(a))
+
+    #states that only differ in the turn and title bookkeeping play out differently, so they cant share a hash
+    def test_turn_state_is_hashed(self):
+        game = Game(['a', 'b'], seed=0)
+        rng = np.random.default_rng(0)
+        play_random(game, rng, until=main_phase)
+        a, b = game.players
+
+        changes = [
+            lambda game: game.players[0].add_dev_card_cur_turn(DEV_IDX[DevType.knight], 1),
+            lambda game: game.players[1].add_knight(),
+            lambda game: game.players[0].set_road_dev_count(2),
+        ]
+        hashes = {game.zobrist_hash()}
+        for change in changes:
+            changed = game.clone()
+            change(changed)
+            self.assertEqual(changed.zobrist_hash(), full_hash(changed))
+            hashes.add(changed.zobrist_hash())
+        self.assertEqual(len(hashes), len(changes) + 1)
+
+        fields = [
+            ('played_knight', True),
+            ('p_longest_road', a),
+            ('p_longest_road', b),
+            ('p_largest_army', a),
+            ('p_largest_army', b),
+        ]
+        hashes = {full_hash(game)}
+        for field, value in fields:
+            changed = game.clone()
+            setattr(changed, field, changed.players[value.index] if isinstance(value, Player) else value)
+            hashes.add(full_hash(changed))
+        self.assertEqual(len(hashes), len(fields) + 1)
+
+        #the mutators keep the incremental hash on the title, the knights and the knight flag
+        changed = game.clone()
+        changed.players[0].add_knight()
+        changed.players[0].longest_road_len = 5
+        changed.check_longest_road()
+        self.assertIs(changed.p_longest_road, changed.players[0])
+        self.assertEqual(changed.zobrist_hash(), full_hash(changed))
+        self.assertTrue(changed.step(EndTurnAction()))
+        self.assertEqual(changed.zobrist_hash(), full_hash(changed))
+
+class TestRandom(unittest.TestCase):
+    #the same seed gives the same layout, deck and rolls whatever the players do
+    def test_common_random_numbers(self):
+        rolls = []
+        for agent_seed in range(2):
+            game = Game(['a', 'b', 'c'], seed=7)
+            deck = list(game.dev_cards)
+            rng = np.random.default_rng(agent_seed)
+            seen = []
+            game.subscribe(lambda event: seen.append(event.roll) if isinstance(event, Roll) else None)
+            play_random(game, rng, 1500)
+            rolls.append(seen)
+        n = min(len(r) for r in rolls)
+        self.assertGreater(n, 20)
+        self.assertEqual(rolls[0][:n], rolls[1][:n])
+        self.assertEqual(deck, Game(['a', 'b', 'c'], seed=7).dev_cards)
+
+    def test_undo_refill(self):
+        game = Game(['a', 'b'], seed=0)
+        rng = np.random.default_rng(0)
+        play_random(game, rng, until=lambda game: not game.starting and game.can_roll())
+        game.random.roll_idx = len(game.random.rolls)
+        before = pickle.dumps(game)
+        r, record = game.step(RollAction(), record=True)
+        self.assertTrue(r)
+        rolled = game.random.rolls
+        game.undo(record)
+        self.assertEqual(pickle.dumps(game), before)
+        game.step(RollAction())
+        self.assertEqual(game.random.rolls, rolled)
+
+    #copies build their dice and steal generators on first use, from the state at the time of the copy
+    def test_copy_streams_are_independent(self):
+        random = GameRandom(5)
+        copies = [random.copy()]
+        copies.append(copies[0].copy())
+        self.assertIsNone(copies[1].dice)
+        expected = [random.roll(NULL_JOURNAL) for _ in range(600)]
+        for copy in copies:
+            self.assertEqual([copy.roll(NULL_JOURNAL) for _ in range(600)], expected)
+
+        game = Game(['a', 'b'], seed=0)
+        play_random(game, np.random.default_rng(0), until=lambda game: not game.starting and game.can_roll())
+        clone = game.clone()
+        clone.random.roll_idx = len(clone.random.rolls)
+        before = pickle.dumps(clone)
+        r, record = clone.step(RollAction(), record=True)
+        self.assertTrue(r)
+        self.assertIsNotNone(clone.random.dice)
+        clone.undo(record)
+        self.assertIsNone(clone.random.dice)
+        self.assertEqual(pickle.dumps(clone), before)
+
+    def test_roll_distribution(self):
+        random = GameRandom(0)
+        counts = np.bincount([random.roll(NULL_JOURNAL) for _ in range(36000)], minlength=13)
+        np.testing.assert_allclose(counts[2:] / 36000, ROLL_P[2:], atol=0.005)
+
+    def test_spawn_seeds(self):
+        seeds = spawn_seeds(3, 4)
+        self.assertEqual(seeds, spawn_seeds(3, 4))
+        self.assertEqual(len(set(seeds + spawn_seeds(4, 4))), 8)
+
+
+class TestEvents(unittest.TestCase):
+    def test_events_follow_the_game(self):
+        game = Game(['a', 'b', 'c'], seed=3)
+        self.assertIsNone(game.events)
+        self.assertEqual(game.info, [])
+
+        events = []
+        game.subscribe(events.append)
+        rng = np.random.default_rng(0)
+        for action in random_actions(game, rng, 3000):
+            game.step(action)
+            self.assertEqual(game.events.last_step, events[len(events) - len(game.events.last_step):])
+            self.assertEqual(len(game.info), len(game.events.last_step))
+        types = {type(event) for event in events}
+        self.assertTrue({Roll, Produce, Build, Robber, Victory} <= types)
+
+        #every built piece has an event
+        builds = [event for event in events if isinstance(event, Build)]
+        for player in game.players:
+            placed = [event.where for event in builds if event.player == player.index and event.what == 'road']
+            self.assertEqual(sorted(placed), list(np.flatnonzero(game.board.edge_owner == player.index)))
+        self.assertEqual(events[-1], Victory(game.winner.index))
+        self.assertEqual(game.to_json_obj()['events'][-1], {'type': 'victory', 'player': game.winner.index})
+
+        #subscribers are not copied or pickled
+        self.assertEqual(game.clone().events.subscribers, [])
+        self.assertEqual(pickle.loads(pickle.dumps(game)).events.subscribers, [])
+        game.unsubscribe(events.append)
+        self.assertIsNone(game.events)
+
+    def test_logging_formats_last_step(self):
+        game = Game(['a', 'b'], seed=0, logging=True)
+        game.step(SettlementAction(0))
+        self.assertEqual(game.info, ['a built a settlement'])
+        game.step(RoadAction(0))
+        self.assertEqual(game.info, ['a built a road'])
+        self.assertEqual(len(game.events.drain()), 2)
+
+
+class TestKnowledge(unittest.TestCase):
+    def test_determinize_is_consistent(self):
+        random = np.random.default_rng(9)
+        for seed in range(3):
+            game = Game(['a', 'b', 'c', 'd'], seed=seed)
+            knowledge = Knowledge(game)
+            rng = np.random.default_rng(seed)
+            uncertain = 0
+            for t, action in enumerate(random_actions(game, rng, 3000)):
+                game.step(action)
+                hands = np.array([player.resources for player in game.players])
+                for observer in range(4):
+                    for player in range(4):
+                        known, n_unknown = knowledge.hand(observer, player)
+                        self.assertTrue((known <= hands[player]).all())
+                        self.assertEqual(known.sum() + n_unknown, hands[player].sum())
+                        if player == observer:
+                            self.assertEqual(n_unknown, 0)
+                        uncertain += n_unknown
+                if t % 50:
+                    continue
+
+                for observer in range(4):
+                    determinized = knowledge.determinize(observer, random)
+                    players = determinized.players
+                    self.assertEqual(determinized.zobrist_hash(), full_hash(determinized))
+                    #the observer's own cards and everything public stay
+                    self.assertTrue((players[observer].resources == hands[observer]).all())
+                    self.assertTrue((players[observer].dev_cards == game.players[observer].dev_cards).all())
+                    self.assertTrue((determinized.resources == game.resources).all())
+                    for player, original in zip(players, game.players):
+                        self.assertEqual(player.n_resources, original.n_resources)
+                        self.assertEqual(player.n_dev_cards, original.n_dev_cards)
+                        self.assertEqual(player.dev_cards_cur_turn.sum(), original.dev_cards_cur_turn.sum())
+                        self.assertTrue((player.resources >= knowledge.hand(observer, player.index)[0]).all())
+                        self.assertTrue((player.resources <= knowledge.most[observer, player.index]).all())
+                        self.assertTrue((original.resources <= knowledge.most[observer, player.index]).all())
+                    #the cards the observer cant see are only moved around
+                    hidden = [
+                        np.array([g.dev_cards.count(dev_type) for dev_type in DEV_TYPES_LIST]) +
+                        sum(player.dev_cards for player in g.players if player.index != observer)
+                        for g in (game, determinized)
+                    ]
+                    self.assertTrue((hidden[0] == hidden[1]).all())
+                    self.assertEqual(len(determinized.dev_cards), len(game.dev_cards))
+                    #every card is somewhere
+                    self.assertTrue((sum(player.resources for player in players) + determinized.resources == 19).all())
+                    #and the game plays on
+                    for action in random_actions(determinized, random, 20):
+                        self.assertTrue(determinized.step(action))
+            self.assertGreater(uncertain, 0)
+
+    #the observer sees the game is not over, so no determinization may have a winner
+    def test_determinize_has_no_winner(self):
+        random = np.random.default_rng(1)
+        n = 0
+        for seed in range(6):
+            game = Game(['a', 'b', 'c', 'd'], seed=seed)
+            knowledge = Knowledge(game)
+            rng = np.random.default_rng(seed)
+            for t, action in enumerate(random_actions(game, rng, 5000)):
+                game.step(action)
+                if t % 5 or game.winner is not None or max(player.victory_points for player in game.players) < 6:
+                    continue
+                for observer in range(4):
+                    for _ in range(10):
+                        determinized = knowledge.determinize(observer, random)
+                        self.assertIsNone(determinized.winner)
+                        self.assertLess(max(player.victory_points for player in determinized.players), 10)
+                        n += 1
+        self.assertGreater(n, 1000)
+
+    def test_hidden_steal(self):
+        game = Game(['a', 'b', 'c'], seed=0)
+        knowledge = Knowledge(game)
+        a, b, c = game.players
+        b.add_resources(np.array([2, 1, 0, 0, 0]))
+        game.add_bank(-np.array([2, 1, 0, 0, 0]))
+        #a steals from b, c only sees that a card moved
+        b.add_resource(0, -1)
+        a.add_resource(0, 1)
+        knowledge.on_event(Steal(0, 1, 0))
+        for observer, player in [(0, 1), (1, 0)]:
+            known, n_unknown = knowledge.hand(observer, player)
+            self.assertEqual(n_unknown, 0)
+            self.assertTrue((known == game.players[player].resources).all())
+        known, n_unknown = knowledge.hand(2, 1)
+        self.assertEqual((list(known), n_unknown), ([1, 0, 0, 0, 0], 1))
+        known, n_unknown = knowledge.hand(2, 0)
+        self.assertEqual((list(known), n_unknown), ([0, 0, 0, 0, 0], 1))
+
+        #spending a brick shows that the card b kept was the brick
+        b.add_resource(1, -1)
+        game.add_bank(np.array([0, 1, 0, 0, 0]))
+        known, n_unknown = knowledge.hand(2, 1)
+        self.assertEqual((list(known), n_unknown), ([1, 0, 0, 0, 0], 0))
+
+    #after a monopoly the victims are known to have none of the resource, even once it is back in the unknown cards
+    def test_monopoly_rules_out_cards(self):
+        game = Game(['a', 'b', 'c', 'd'], seed=0)
+        knowledge = Knowledge(game)
+        a, b, c, d = game.players
+        for player, hand in [(a, [0, 2, 0, 0, 0]), (b, [0, 1, 1, 0, 0]), (c, [3, 1, 0, 0, 0])]:
+            player.add_resources(np.array(hand))
+            game.add_bank(-np.array(hand))
+        #a steals wheat from b, d doesnt see what
+        b.add_resource(2, -1)
+        a.add_resource(2, 1)
+        knowledge.on_event(Steal(0, 1, 2))
+        #c monopolizes wood, nobody else has any
+        knowledge.on_event(Monopoly(2, 0, 0))
+        #b steals wood from c, so one of the cards d cant see is a wood
+        c.add_resource(0, -1)
+        b.add_resource(0, 1)
+        knowledge.on_event(Steal(1, 2, 0))
+
+        self.assertEqual(list(knowledge.most[3, 0]), [0, 3, 1, 0, 0])
+        self.assertEqual(knowledge.hand(3, 0)[1], 1)
+        random = np.random.default_rng(0)
+        holders = np.zeros(4, dtype=np.int64)
+        for _ in range(200):
+            players = knowledge.determinize(3, random).players
+            self.assertEqual(players[0].resources[0], 0)
+            holders += [player.resources[0] for player in players]
+        #the wood is dealt to the hands that could hold it
+        self.assertEqual(holders[0], 0)
+        self.assertGreater(holders[1], 0)
+        self.assertGreater(holders[2], 0)
+
+
+class TestLongestRoad(unittest.TestCase):
+    def test_incremental_matches_brute_force(self):
+        env = CatanEnv(['a', 'b', 'c'])
+        for seed in range(3):
+            env.reset(seed=seed)
+            space = env.action_space('a')
+            space.seed(seed)
+            for action in random_env_actions(env, space, 2000):
+                env.step(action)
+                for player in env.game.players:
+                    self.assertEqual(player.longest_road_len, brute_longest_road(env.game.board, player.index))
+
+    def test_settlement_splits_road(self):
+        g = Game(['a', 'b'], seed=0)
+        board = g.board
+        a, b = g.players
+        #a straight line of 5 roads for a, then b settles in the middle
+        path = [0, 1, 2, 3, 4, 5]
+        edges = [board.topology.node_edges[u][list(board.topology.node_nodes[u]).index(v)] for u, v in zip(path, path[1:])]
+        board.place_settlement(0, a, starting=True)
+        for edge in edges:
+            self.assertTrue(board.place_road(edge, a))
+        self.assertEqual(a.longest_road_len, 5)
+
+        board.place_settlement(3, b, starting=True)
+        self.assertEqual(a.longest_road_len, 3)
+        self.assertEqual(len(board.road_components[a.index]), 2)
+
+
 if __name__ == '__main__':
     unittest.main()
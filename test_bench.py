@@ -0,0 +1,227 @@
+#benchmarks for the engine, env and server hot paths, every scenario is seeded
+#run with: python -m pytest test_bench.py (needs pytest-benchmark, see the dev extra)
+#save a run as json (in .benchmarks/): python -m pytest test_bench.py --benchmark-autosave
+#compare against the last saved run and fail on a regression:
+#    python -m pytest test_bench.py --benchmark-compare --benchmark-compare-fail=mean:10%
+
+from copy import deepcopy
+import timeit
+from functools import lru_cache
+import numpy as np
+import pytest
+from gymnasium.spaces.utils import flatten
+
+from actions import *
+
+from game import Game
+from caten_env import CatanEnv
+from batch import BatchGame
+from knowledge import Knowledge
+from topology import TOPOLOGY
+
+#a game some way in, with roads, settlements and cards in hand
+def mid_game(seed=0, steps=300):
+    env = CatanEnv(['a', 'b', 'c', 'd'])
+    env.reset(seed=seed)
+    space = env.action_space('a')
+    space.seed(seed)
+    for _ in range(steps):
+        env.step(space.sample(env.game.get_action_mask()))
+    return env.game
+
+#a seeded game played with uniformly random legal actions until someone wins
+def random_game(seed=2):
+    game = Game(['a', 'b', 'c', 'd'], seed=seed)
+    random = np.random.default_rng(seed)
+    while not game.winner:
+        game.step(game.action_from_index(random.choice(game.legal_actions())))
+    return game
+
+#for every action type, the first state of a seeded random game where it is legal, with that action
+@lru_cache(maxsize=None)
+def action_scenarios():
+    scenarios = dict()
+    for seed in range(10):
+        game = Game(['a', 'b', 'c', 'd'], seed=seed)
+        random = np.random.default_rng(seed)
+        while not game.winner:
+            legal = game.legal_actions()
+            for i in legal:
+                action = game.action_from_index(i)
+                if action.type not in scenarios:
+                    scenarios[action.type] = (game.clone(), i)
+            game.step(game.action_from_index(random.choice(legal)))
+    return scenarios
+
+#roads around the 3 mutually adjacent tiles 0, 1 and 2: 15 roads with 3 cycles,
+#the worst case for the longest road search with a full set of roads
+def worst_case_network():
+    edges = set()
+    for tile in (0, 1, 2):
+        nodes = set(TOPOLOGY.adj_tile_nodes[tile])
+        for edge in range(TOPOLOGY.n_edges):
+            if set(TOPOLOGY.adj_edge_nodes[edge]) <= nodes:
+                edges.add(edge)
+    return sorted(edges)
+
+def test_longest_road_worst_case_full(benchmark):
+    game = Game(['a', 'b'], seed=0)
+    player = game.players[0]
+    for edge in worst_case_network():
+        game.board.edge_owner[edge] = player.index
+        player.roads.append(edge)
+
+    benchmark(game.board.check_longest_road, player)
+    assert player.longest_road_len == 14
+
+def test_longest_road_worst_case_last_road(benchmark):
+    edges = worst_case_network()
+
+    def setup():
+        game = Game(['a', 'b'], seed=0)
+        player = game.players[0]
+        for edge in edges[:-1]:
+            player.available_roads[edge] = True
+            game.board.place_road(edge, player)
+        player.available_roads[edges[-1]] = True
+        return (game.board, edges[-1], player), {}
+
+    benchmark.pedantic(lambda board, edge, player: board.place_road(edge, player), setup=setup, rounds=50)
+
+#clone has to stay an order of magnitude cheaper than deepcopy
+#the two are timed in alternating rounds and compared by their medians, so a slow stretch of the machine hits both
+def test_clone_speedup():
+    game = mid_game()
+    clone_times, deepcopy_times = [], []
+    for _ in range(15):
+        clone_times.append(timeit.timeit(game.clone, number=100))
+        deepcopy_times.append(timeit.timeit(lambda: deepcopy(game), number=10) * 10)
+    assert np.median(deepcopy_times) / np.median(clone_times) >= 10
+
+def test_copy_deepcopy(benchmark):
+    benchmark.group = 'copy'
+    benchmark(deepcopy, mid_game())
+
+def test_copy_clone(benchmark):
+    benchmark.group = 'copy'
+    benchmark(mid_game().clone)
+
+def test_copy_step_undo(benchmark):
+    benchmark.group = 'copy'
+    game = mid_game()
+    action = EndTurnAction() if game.has_rolled else RollAction()
+
+    def step_undo():
+        r, record = game.step(action, record=True)
+        game.undo(record)
+
+    benchmark(step_undo)
+
+def test_action_mask_after_step(benchmark):
+    game = mid_game()
+    action = EndTurnAction() if game.has_rolled else RollAction()
+
+    def step_mask_undo():
+        r, record = game.step(action, record=True)
+        game.get_action_mask()
+        game.undo(record)
+
+    benchmark(step_mask_undo)
+
+def test_action_mask_cached(benchmark):
+    game = mid_game()
+    game.get_action_mask()
+    benchmark(game.get_action_mask)
+
+#uniformly random legal action for every row of masks, without a python loop over the rows
+def sample_masks(random, masks):
+    return np.argmax(np.where(masks, random.random(masks.shape), -1), axis=1)
+
+#one step of 64 games, batched against a plain loop over Game (compare the batch group)
+def test_batch_step(benchmark):
+    benchmark.group = 'batch'
+    batch = BatchGame(64, ['a', 'b', 'c', 'd'], seed=0)
+    random = np.random.default_rng(0)
+    benchmark(lambda: batch.step(sample_masks(random, batch.mask)))
+
+def test_batch_loop_step(benchmark):
+    benchmark.group = 'batch'
+    games = [Game(['a', 'b', 'c', 'd'], seed=i) for i in range(64)]
+    random = np.random.default_rng(0)
+
+    def step():
+        for i, game in enumerate(games):
+            game.step(game.action_from_index(sample_masks(random, game.legal_action_mask()[None])[0]))
+            if game.winner is not None:
+                games[i] = Game(['a', 'b', 'c', 'd'], seed=i)
+
+    benchmark(step)
+
+def test_observe_flatten(benchmark):
+    benchmark.group = 'observe'
+    env = CatanEnv(['a', 'b', 'c', 'd'])
+    env.reset(seed=0)
+    env.game = mid_game()
+    benchmark(lambda: flatten(env._obs_space, env.game.get_obs(0)))
+
+def test_observe_into(benchmark):
+    benchmark.group = 'observe'
+    env = CatanEnv(['a', 'b', 'c', 'd'])
+    env.reset(seed=0)
+    env.game = mid_game()
+    buffer = np.zeros(env.observation_space('a').shape)
+    benchmark(env.observe_into, buffer, 'a')
+
+def test_game_new(benchmark):
+    benchmark(Game, ['a', 'b', 'c', 'd'], seed=0)
+
+def test_env_reset(benchmark):
+    env = CatanEnv(['a', 'b', 'c', 'd'])
+    benchmark(env.reset, seed=0)
+
+def test_random_game(benchmark):
+    benchmark.pedantic(random_game, rounds=3)
+
+#step (and undo) of every action type, from a state where it is legal
+@pytest.mark.parametrize('action_type', [t for t in ACTION_TYPES if t != ActionType.player_trade], ids=lambda t: t.value)
+def test_step(benchmark, action_type):
+    benchmark.group = 'step'
+    game, i = action_scenarios()[action_type]
+    game = game.clone()
+    action = game.action_from_index(i)
+
+    def step_undo():
+        r, record = game.step(action, record=True)
+        game.undo(record)
+        return r
+
+    assert benchmark(step_undo)
+
+def test_get_obs(benchmark):
+    benchmark.group = 'observe'
+    benchmark(mid_game().get_obs, 0)
+
+def test_to_json_obj(benchmark):
+    benchmark(mid_game().to_json_obj)
+
+#what the server does per websocket message
+def test_server_step(benchmark):
+    game = mid_game()
+    message = {'action_type': 'end_turn' if game.has_rolled else 'roll', 'kwargs': {}}
+
+    def handle():
+        r, record = game.step(create_action(message['action_type'], message['kwargs']), record=True)
+        obj = game.to_json_obj()
+        game.undo(record)
+        return obj
+
+    benchmark(handle)
+
+#one determinization of a game some way in, an ismcts agent draws hundreds per decision
+def test_determinize(benchmark):
+    game = Game(['a', 'b', 'c', 'd'], seed=0)
+    knowledge = Knowledge(game)
+    random = np.random.default_rng(0)
+    for _ in range(400):
+        game.step(game.action_from_index(random.choice(game.legal_actions())))
+    benchmark(knowledge.determinize, 1, random)
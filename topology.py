@@ -0,0 +1,199 @@
+from globals import *
+from entities import *
+import numpy as np
+
+class Topology:
+    BOARD_SIZE = 3
+    TILE_OFFSETS = [
+        Direction.RS * 2,
+        Direction.NQR * 2,
+        Direction.SQ * 2,
+        Direction.NRS * 2,
+        Direction.QR * 2,
+        Direction.NSQ * 2,
+    ]
+    EDGE_OFFSETS = [
+        Direction.QR,
+        Direction.NSQ,
+        Direction.RS,
+        Direction.NQR,
+        Direction.SQ,
+        Direction.NRS
+    ]
+    NODE_OFFESTS = [
+        Direction.Q,
+        Direction.NS,
+        Direction.R,
+        Direction.NQ,
+        Direction.S,
+        Direction.NR
+    ]
+    PORT_DIRS = [
+        (Direction.NQ, Direction.R),
+        (Direction.S, Direction.NQ),
+        (Direction.NR, Direction.S),
+        (Direction.Q, Direction.NR),
+        (Direction.NS, Direction.Q),
+        (Direction.R, Direction.NS)
+    ]
+
+    #the board graph never changes between games, so it is built exactly once (see TOPOLOGY below)
+    #and shared by every Board. nothing in here may be mutated after construction
+    def __init__(self):
+        self.build_board()
+        self.build_dicts()
+        self.build_adj_lists()
+        self.build_adj_arrays()
+        self.build_port_slots()
+
+    #this method builds the board graph structure
+    #it does not set resources or numbers on tiles
+    def build_board(self):
+        #add initial tiles, edges and nodes
+        cur_tile_coords = np.array([0, 0, 0])
+
+        self.tiles = [ Tile(cur_tile_coords.copy(), 0) ]
+
+        self.edges = [
+            Edge(
+                cur_tile_coords + edge_offset,
+                idx,
+            ) for idx, edge_offset in enumerate(Topology.EDGE_OFFSETS)
+        ]
+        self.nodes: list[Node] = [
+            Node(cur_tile_coords + node_offset, idx) for idx, node_offset in enumerate(Topology.NODE_OFFESTS)
+        ]
+
+        tile_idx = len(self.tiles)
+        edge_idx = len(self.edges)
+        node_idx = len(self.nodes)
+
+        #add tiles, edges, and nodes in order, spiraling out from center
+        for rad in range(1, Topology.BOARD_SIZE):
+            cur_tile_coords += Direction.QR * 2
+            for i, tile_offset in enumerate(Topology.TILE_OFFSETS):
+                for j in range(rad):
+                    cur_tile_coords += tile_offset
+                    #place tile
+                    self.tiles.append(Tile(
+                        cur_tile_coords.copy(),
+                        tile_idx
+                    ))
+
+                    tile_idx += 1
+
+                    #place edges and nodes
+                    for k in range(i, i + (4 if j == rad - 1 else 3)):
+                        self.edges.append(Edge(
+                            cur_tile_coords + Topology.EDGE_OFFSETS[k % 6], edge_idx,
+                        ))
+                        edge_idx += 1
+                    for k in range(i, i + (3 if j == rad - 1 else 2)):
+                        self.nodes.append(Node(
+                            cur_tile_coords + Topology.NODE_OFFESTS[k % 6], node_idx,
+                        ))
+                        node_idx += 1
+        #end for
+
+    def build_dicts(self):
+        self.tile_dict = dict()
+        self.edge_dict = dict()
+        self.node_dict = dict()
+
+        for tile in self.tiles:
+            self.tile_dict[Topology.coords_hash(tile.coords)] = tile
+        for edge in self.edges:
+            self.edge_dict[Topology.coords_hash(edge.coords)] = edge
+        for node in self.nodes:
+            self.node_dict[Topology.coords_hash(node.coords)] = node
+
+    def build_adj_lists(self):
+        for edge in self.edges:
+            for node_coords in edge.adj_node_coords():
+                node: Node = self.node_dict[Topology.coords_hash(node_coords)]
+                for edge_coords in node.adj_edge_coords():
+                    adj_edge = self.edge_dict.get(Topology.coords_hash(edge_coords))
+                    if adj_edge and adj_edge != edge:
+                        edge.adj_edges.append(adj_edge)
+                        edge.adj_edges_via.append(node)
+                edge.adj_nodes.append(node)
+
+        for node in self.nodes:
+            for edge_coords, node_coords in zip(node.adj_edge_coords(), node.adj_node_coords()):
+                adj_edge = self.edge_dict.get(Topology.coords_hash(edge_coords))
+                adj_node = self.node_dict.get(Topology.coords_hash(node_coords))
+                if adj_edge and adj_node:
+                    node.adj_edges.append(adj_edge)
+                    node.adj_nodes.append(adj_node)
+            for tile_coords in node.adj_tile_coords():
+                adj_tile = self.tile_dict.get(Topology.coords_hash(tile_coords))
+                if adj_tile:
+                    node.adj_tiles.append(adj_tile)
+
+        for tile in self.tiles:
+            for node_coords in tile.adj_node_coords():
+                adj_node = self.node_dict.get(Topology.coords_hash(node_coords))
+                if adj_node:
+                    tile.adj_nodes.append(adj_node)
+
+    #index arrays, padded with -1 where an entity has fewer neighbours
+    #node_nodes[i][k] is connected through node_edges[i][k]
+    #edge_edges[i][k] is connected through edge_nodes[i][k // 2]
+    def build_adj_arrays(self):
+        def padded(lists, width):
+            arr = np.full((len(lists), width), -1, dtype=np.int32)
+            for i, entries in enumerate(lists):
+                arr[i, :len(entries)] = entries
+            return arr
+
+        self.node_nodes = padded([[n.index for n in node.adj_nodes] for node in self.nodes], 3)
+        self.node_edges = padded([[e.index for e in node.adj_edges] for node in self.nodes], 3)
+        self.node_tiles = padded([[t.index for t in node.adj_tiles] for node in self.nodes], 3)
+        self.edge_nodes = padded([[n.index for n in edge.adj_nodes] for edge in self.edges], 2)
+        self.tile_nodes = padded([[n.index for n in tile.adj_nodes] for tile in self.tiles], 6)
+
+        self.edge_edges = np.full((len(self.edges), 4), -1, dtype=np.int32)
+        for edge in self.edges:
+            for adj_edge, via in zip(edge.adj_edges, edge.adj_edges_via):
+                k = 2 * edge.adj_nodes.index(via)
+                if self.edge_edges[edge.index][k] != -1:
+                    k += 1
+                self.edge_edges[edge.index][k] = adj_edge.index
+
+        #plain tuples for the python loops in the rules, indexing numpy arrays one element at a time is slow
+        self.adj_nodes = tuple(tuple(n.index for n in node.adj_nodes) for node in self.nodes)
+        self.adj_node_edges = tuple(tuple(e.index for e in node.adj_edges) for node in self.nodes)
+        self.adj_node_tiles = tuple(tuple(t.index for t in node.adj_tiles) for node in self.nodes)
+        self.adj_edge_nodes = tuple(tuple(n.index for n in edge.adj_nodes) for edge in self.edges)
+        #(adj_edge, via_node) pairs
+        self.adj_edge_edges = tuple(
+            tuple((adj_edge.index, via.index) for adj_edge, via in zip(edge.adj_edges, edge.adj_edges_via))
+            for edge in self.edges
+        )
+        self.adj_tile_nodes = tuple(tuple(n.index for n in tile.adj_nodes) for tile in self.tiles)
+
+        self.n_nodes = len(self.nodes)
+        self.n_edges = len(self.edges)
+        self.n_tiles = len(self.tiles)
+
+    #a port can only ever sit at one of 18 positions (6 sides of the outer ring, 3 positions each)
+    #precompute the coordinates and the nodes each position touches so resetting only has to pick positions
+    def build_port_slots(self):
+        self.port_slots = dict()
+        cur_tile_coords = Direction.QR * 2 * 3
+        for i, tile_offset in enumerate(Topology.TILE_OFFSETS):
+            for port_pos in range(3):
+                coords = cur_tile_coords + tile_offset * port_pos
+                dirs = Topology.PORT_DIRS[i if port_pos != 2 else (i + 1) % 6]
+                node_idxs = []
+                for dir in dirs:
+                    node = self.node_dict.get(Topology.coords_hash(coords + dir))
+                    if node:
+                        node_idxs.append(node.index)
+                self.port_slots[(i, port_pos)] = (coords, dirs, tuple(node_idxs))
+
+    @staticmethod
+    def coords_hash(coords):
+        return coords[0] * 256 + coords[1]
+
+TOPOLOGY = Topology()
@@ -28,5 +28,7 @@ export interface game {
     expected_action?: string,
     board: board,
     players: { [key: string]: player },
-    info: string[]
+    info: string[],
+    //typed events of the last step, see events.py
+    events: ({ type: string, player: number } & { [key: string]: any })[]
 };
\ No newline at end of file
@@ -0,0 +1,113 @@
+import numpy as np
+
+from globals import *
+
+'''
+zobrist keys for hashing game state, see Game.zobrist_hash()
+the hash is the xor of one key per fact about the state (node 3 has a city of player 1, player 0 holds 2 ore, ...)
+so every change only xors out the key of the old fact and xors in the key of the new one
+counts are hashed as (what, count) facts, the key of a count of 0 is 0 so empty hands, boards etc. hash to 0
+
+the hash is kept in three parts, each updated by the mutators of its owner
+    Board.zobrist: node owners and levels, edge owners, the robber
+    Player.zobrist: the player's hand, dev cards, dev cards bought this turn, knights played and free roads left
+    Game.zobrist: the bank, what is left in the dev deck, the current player, has_rolled, has_played_dev, starting,
+        played_knight and the holders of longest road and largest army
+the action queue and the discard queue are a handful of entries and are hashed when the hash is read
+'''
+
+MAX_PLAYERS = 8
+#a real game never has more than 19 of a resource or 25 dev cards, but states set up by hand (tests, scenarios) can go over that
+MAX_COUNT = 64
+MAX_QUEUE = 64
+MAX_ACTION_TYPES = 16
+
+class ZobristKeys:
+    def __init__(self, seed: int):
+        random = np.random.default_rng(seed)
+
+        def keys(*shape, zero_count=False):
+            k = random.integers(0, 2 ** 64, size=shape, dtype=np.uint64)
+            if zero_count:
+                k[..., 0] = 0
+            #python ints xor much faster than numpy scalars
+            return k.tolist()
+
+        self.node = keys(54, MAX_PLAYERS, 3, zero_count=True)
+        self.edge = keys(72, MAX_PLAYERS)
+        self.robber = keys(19)
+        self.hand = keys(MAX_PLAYERS, 5, MAX_COUNT, zero_count=True)
+        self.dev = keys(MAX_PLAYERS, len(DEV_TYPES_LIST), MAX_COUNT, zero_count=True)
+        self.bank = keys(5, MAX_COUNT, zero_count=True)
+        self.deck = keys(len(DEV_TYPES_LIST), MAX_COUNT, zero_count=True)
+        self.cur_player = keys(MAX_PLAYERS)
+        self.has_rolled, self.has_played_dev, self.starting = keys(3)
+        self.queue = keys(MAX_QUEUE, MAX_ACTION_TYPES)
+        self.discard = keys(MAX_PLAYERS, MAX_PLAYERS, MAX_QUEUE)
+        #drawn after the keys above so those stay the same
+        self.cur_turn = keys(MAX_PLAYERS, len(DEV_TYPES_LIST), MAX_COUNT, zero_count=True)
+        self.knights = keys(MAX_PLAYERS, MAX_COUNT, zero_count=True)
+        #road_dev_count is 0, 1 or 2
+        self.road_dev = keys(MAX_PLAYERS, 3, zero_count=True)
+        self.longest_road = keys(MAX_PLAYERS)
+        self.largest_army = keys(MAX_PLAYERS)
+        self.played_knight = keys(1)[0]
+
+ZOBRIST = ZobristKeys(0x5EED)
+
+#the hash parts from scratch, the incremental parts have to match these
+def board_hash(board) -> int:
+    h = ZOBRIST.robber[board.robber]
+    for node in np.flatnonzero(board.node_owner >= 0):
+        h ^= ZOBRIST.node[node][board.node_owner[node]][board.node_level[node]]
+    for edge in np.flatnonzero(board.edge_owner >= 0):
+        h ^= ZOBRIST.edge[edge][board.edge_owner[edge]]
+    return h
+
+def player_hash(player) -> int:
+    h = 0
+    for resource, count in enumerate(player.resources):
+        h ^= ZOBRIST.hand[player.index][resource][count]
+    for dev_type, count in enumerate(player.dev_cards):
+        h ^= ZOBRIST.dev[player.index][dev_type][count]
+    for dev_type, count in enumerate(player.dev_cards_cur_turn):
+        h ^= ZOBRIST.cur_turn[player.index][dev_type][count]
+    h ^= ZOBRIST.knights[player.index][player.num_knights_played]
+    h ^= ZOBRIST.road_dev[player.index][player.road_dev_count]
+    return h
+
+def game_hash(game) -> int:
+    h = ZOBRIST.cur_player[game.cur_player.index]
+    for resource, count in enumerate(game.resources):
+        h ^= ZOBRIST.bank[resource][count]
+    for dev_type in DEV_TYPES_LIST:
+        h ^= ZOBRIST.deck[DEV_IDX[dev_type]][game.dev_cards.count(dev_type)]
+    if game.has_rolled:
+        h ^= ZOBRIST.has_rolled
+    if game.has_played_dev:
+        h ^= ZOBRIST.has_played_dev
+    if game.starting:
+        h ^= ZOBRIST.starting
+    if game.played_knight:
+        h ^= ZOBRIST.played_knight
+    if game.p_longest_road is not None:
+        h ^= ZOBRIST.longest_road[game.p_longest_road.index]
+    if game.p_largest_army is not None:
+        h ^= ZOBRIST.largest_army[game.p_largest_army.index]
+    return h
+
+def queue_hash(game) -> int:
+    #player (which the keys are imported by) is imported by actions
+    from actions import ACTION_TYPE_IDS
+    h = 0
+    for k, action_type in enumerate(game.action_queue):
+        h ^= ZOBRIST.queue[k][ACTION_TYPE_IDS[action_type]]
+    for k, (player, owed) in enumerate(zip(game.to_discard, game.discard_owed)):
+        h ^= ZOBRIST.discard[k][player.index][owed]
+    return h
+
+def full_hash(game) -> int:
+    h = game_hash(game) ^ board_hash(game.board) ^ queue_hash(game)
+    for player in game.players:
+        h ^= player_hash(player)
+    return h